@@ -10,6 +10,8 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 from helper.jwt_helper import get_roles
 
 from helper.db_helper import get_connection
+from helper import prepared_statements
+from extensions import membership_cache
 
 bcrypt = Bcrypt()
 committee_endpoints = Blueprint('committee', __name__)
@@ -29,13 +31,8 @@ def add_committee(event_id):
             return jsonify({"message": "You must be an admin to add committee members."}), 403
 
         # Verify the current user is the owner of the event
-        with get_connection() as connection:
-            with connection.cursor() as cursor:
-                cursor.execute("SELECT user_id FROM events WHERE id = %s", (event_id,))
-                result = cursor.fetchone()
-
-                if not result or result[0] != user_id:
-                    return jsonify({"message": "You are not authorized to manage this event."}), 403
+        if membership_cache.get_event_owner(event_id) != user_id:
+            return jsonify({"message": "You are not authorized to manage this event."}), 403
 
         # Get parameters from the request
         id_user = request.form.get('id_user')
@@ -52,6 +49,7 @@ def add_committee(event_id):
                 """
                 cursor.execute(insert_query, (id_user, event_id))
                 connection.commit()
+                membership_cache.invalidate_member(id_user, event_id)
 
                 if cursor.rowcount > 0:
                     return jsonify({"message": "Committee member added successfully."}), 201
@@ -73,8 +71,7 @@ def get_committees(event_id):
                     JOIN user u ON p.id_user = u.id
                     WHERE p.id_acara = %s
                 """
-                cursor.execute(query, (event_id,))
-                results = cursor.fetchall()
+                results = prepared_statements.execute(connection, cursor, query, (event_id,)).fetchall()
 
                 committees = [
                     {"id": row[0], "id_user": row[1], "username": row[2]} for row in results
@@ -104,8 +101,7 @@ def get_user_committees():
                     JOIN user u ON e.user_id = u.id
                     WHERE p.id_user = %s
                 """
-                cursor.execute(query, (user_id,))
-                results = cursor.fetchall()
+                results = prepared_statements.execute(connection, cursor, query, (user_id,)).fetchall()
 
                 events = [
                     {
@@ -140,12 +136,8 @@ def delete_committee(event_id):
         # Get committee_id from request
         committee_id = request.form.get('id_user')
 
-        # Ambil ID pemilik acara dari database
-        with get_connection() as connection:
-            with connection.cursor() as cursor:
-                cursor.execute("SELECT user_id FROM events WHERE id = %s", (event_id,))
-                result = cursor.fetchone()
-                event_owner_id = result[0] if result else None
+        # Ambil ID pemilik acara (di-cache)
+        event_owner_id = membership_cache.get_event_owner(event_id)
 
         # Cek apakah pengguna berhak menghapus:
         if str(user_id) == committee_id:  # Orang terkait sendiri
@@ -166,6 +158,7 @@ def delete_committee(event_id):
                 connection.commit()
 
                 if cursor.rowcount > 0:
+                    membership_cache.invalidate_member(committee_id, event_id)
                     return jsonify({"message": "Committee member deleted successfully."}), 200
                 else:
                     return jsonify({"message": "Committee member not found or deletion failed."}), 404
@@ -189,6 +182,7 @@ def quit_committee(event_id):
                 delete_query = "DELETE FROM panitia WHERE id_user = %s AND id_acara = %s"
                 cursor.execute(delete_query, (user_id, event_id))
                 connection.commit()
+                membership_cache.invalidate_member(user_id, event_id)
 
                 if cursor.rowcount > 0:
                     return jsonify({"message": "You have successfully quit the committee."}), 200
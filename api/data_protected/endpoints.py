@@ -1,7 +1,9 @@
 """Routes for module protected endpoints"""
-from flask import Blueprint, jsonify
+from flask import Blueprint, jsonify, request, Response
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from helper.jwt_helper import get_roles
+from helper.db_helper import db_pool, db_router
+from extensions import profiler
 
 
 protected_endpoints = Blueprint('data_protected', __name__)
@@ -20,3 +22,53 @@ def get_data():
                     # "user_logged": current_user['username'],
                     "user_logged": current_user,
                     "roles": roles}), 200
+
+
+@protected_endpoints.route('/pool', methods=['GET'])
+@jwt_required()
+def get_pool_stats():
+    """Usage of this worker's DB connection pools and read routing (admin only)"""
+    if 'admin' not in get_roles():
+        return jsonify({"message": "Access denied. Only admins can view pool stats."}), 403
+    return jsonify({"primary": db_pool.stats(), "routing": db_router.stats()}), 200
+
+
+@protected_endpoints.route('/profile', methods=['GET'])
+@jwt_required()
+def get_profile_stacks():
+    """
+    Aggregated profiler samples of this worker as collapsed stacks (admin only),
+    ready for flamegraph.pl or speedscope. `?route=GET /api/v1/...` keeps one route.
+    """
+    if 'admin' not in get_roles():
+        return jsonify({"message": "Access denied. Only admins can view profiles."}), 403
+    if not profiler.enabled:
+        return jsonify({"message": "Profiler is disabled (PROFILER_ENABLED)."}), 404
+    if request.args.get('format') == 'json':
+        return jsonify(profiler.stats()), 200
+    return Response(profiler.stacks(request.args.get('route')), mimetype="text/plain")
+
+
+@protected_endpoints.route('/profile/<profile_id>', methods=['GET'])
+@jwt_required()
+def get_request_profile(profile_id):
+    """
+    Profile of one request forced with X-Profile-Token, by its X-Profile-Id (admin only).
+    Any worker can answer it with PROFILER_DIR set; without it, use the X-Profile-Stacks header.
+    """
+    if 'admin' not in get_roles():
+        return jsonify({"message": "Access denied. Only admins can view profiles."}), 403
+    stacks = profiler.request_profile(profile_id)
+    if stacks is None:
+        return jsonify({"message": "Profile not found."}), 404
+    return Response(stacks, mimetype="text/plain")
+
+
+@protected_endpoints.route('/profile', methods=['DELETE'])
+@jwt_required()
+def reset_profile_stacks():
+    """Forget the aggregated profiler samples of this worker (admin only)"""
+    if 'admin' not in get_roles():
+        return jsonify({"message": "Access denied. Only admins can reset profiles."}), 403
+    profiler.reset()
+    return jsonify({"message": "Profile samples cleared."}), 200
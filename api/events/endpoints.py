@@ -10,27 +10,60 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 from helper.jwt_helper import get_roles
 
 from helper.db_helper import get_connection
+from helper.pagination import decode_cursor, keyset_condition, next_cursor, InvalidCursor
+from helper.count_cache import COUNT_MODES, EVENTS_SCOPE
+from helper.event_search import MATCH_EVENTS, boolean_query
+from helper.event_detail import parse_includes, detail_query, detail_payload, InvalidInclude
+from helper import signals
+from helper.response_cache import EVENTS_TAG, event_tag
+from extensions import membership_cache, count_cache, response_cache
 
 bcrypt = Bcrypt()
 events_endpoints = Blueprint('events', __name__)
 UPLOAD_FOLDER = "img/events"
 
+def ticket_holder_ids(cursor, event_id):
+    """Users holding tickets of the event, whose ticket listings filter on its name and date"""
+    cursor.execute("""
+        SELECT DISTINCT t.user_id FROM tickets t JOIN packages p ON t.package_id = p.id
+        WHERE p.id_acara = %s
+    """, (event_id,))
+    return [row[0] for row in cursor.fetchall()]
+
+def sort_key(row, search):
+    """Cursor values of an events listing row: (relevance,) tanggal, id"""
+    return (row[8], row[4], row[0]) if search else (row[4], row[0])
+
 @events_endpoints.route('/events', methods=['GET'])
+@response_cache.cached(lambda: [EVENTS_TAG])
 def get_all_events():
     """Endpoint to get paginated events data with user info"""
     try:
         page = int(request.args.get('page', 1))
         per_page = int(request.args.get('per_page', 10))
         search_query = request.args.get('search', '').strip()
+        after = request.args.get('after')  # Cursor dari halaman sebelumnya (keyset pagination)
+        count_mode = request.args.get('count', 'exact')  # exact, approx atau none
         offset = (page - 1) * per_page
 
-        # Debugging: Print nilai parameter
-        print(f"Request parameters - page: {page}, per_page: {per_page}, search_query: '{search_query}', offset: {offset}")
+        if count_mode not in COUNT_MODES:
+            return jsonify({"message": f"'count' must be one of: {', '.join(COUNT_MODES)}."}), 400
+
+        # Hasil pencarian diurutkan berdasarkan relevansi, sisanya berdasarkan tanggal
+        search = boolean_query(search_query)
+        sort_columns = ["relevance", "events.tanggal", "events.id"] if search else ["events.tanggal", "events.id"]
+
+        keyset_params = []
+        if after:
+            keyset_clause, keyset_params = keyset_condition(
+                sort_columns, decode_cursor(after, len(sort_columns)), descending=True)
 
         with get_connection() as connection:
             with connection.cursor() as cursor:
-                base_query = """
-                    SELECT events.id, events.gambar, events.nama, events.deskripsi, events.tanggal, events.lokasi, events.user_id, user.username
+                select_params = [search] if search else []
+                base_query = f"""
+                    SELECT events.id, events.gambar, events.nama, events.deskripsi, events.tanggal, events.lokasi, events.user_id, user.username,
+                           {MATCH_EVENTS if search else "NULL"} AS relevance
                     FROM events
                     LEFT JOIN user ON events.user_id = user.id
                 """
@@ -38,33 +71,35 @@ def get_all_events():
                 where_clause = ""
                 params = []
 
-                if search_query:
-                    where_clause = "WHERE events.nama LIKE %s OR events.deskripsi LIKE %s"
-                    params = [f"%{search_query}%", f"%{search_query}%"]
-                    # Debugging: Print query dan parameters pencarian
-                    print(f"Search query: '{search_query}' -> WHERE clause: {where_clause} with params {params}")
-
-                # Debugging: Print query count
-                print(f"Executing count query: {count_query} {where_clause} with params {params}")
-                if where_clause:
-                    cursor.execute(f"{count_query} {where_clause}", params)
-                else:
-                    cursor.execute(count_query)
-                total_events = cursor.fetchone()[0]
-
-                # Debugging: Print total events
-                print(f"Total events count: {total_events}")
+                if search:
+                    where_clause = f"WHERE {MATCH_EVENTS}"
+                    params = [search]
+
+                total_events, count_is_estimate = count_cache.count(
+                    cursor, EVENTS_SCOPE, f"{count_query} {where_clause}".strip(), params, count_mode)
+
+                # Dengan cursor, halaman dimulai tepat setelah baris terakhir tanpa OFFSET.
+                # Relevansi hanya ada sebagai alias di SELECT, jadi cursor-nya dicek di HAVING.
+                page_clause = where_clause
+                limit_clause = "LIMIT %s OFFSET %s"
+                page_params = select_params + params + [per_page + 1, offset]
+                if after:
+                    if search:
+                        page_clause = f"{where_clause} HAVING {keyset_clause}"
+                    else:
+                        page_clause = f"WHERE {keyset_clause}"
+                    limit_clause = "LIMIT %s"
+                    page_params = select_params + params + keyset_params + [per_page + 1]
 
                 query = f"""
                     {base_query}
-                    {where_clause}
-                    ORDER BY events.tanggal DESC
-                    LIMIT %s OFFSET %s
+                    {page_clause}
+                    ORDER BY {", ".join(f"{column} DESC" for column in sort_columns)}
+                    {limit_clause}
                 """
-                # Debugging: Print query untuk pengambilan data events
-                print(f"Executing query: {query} with params {params + [per_page, offset]}")
-                cursor.execute(query, params + [per_page, offset])
+                cursor.execute(query, page_params)
                 results = cursor.fetchall()
+                cursor_next = next_cursor(results, per_page, lambda row: sort_key(row, search))
 
                 events_list = []
                 for row in results:
@@ -79,22 +114,22 @@ def get_all_events():
                         "username": row[7]   # Nama pengguna yang memiliki event
                     })
 
-        total_pages = (total_events + per_page - 1) // per_page
-
-        # Debugging: Print hasil akhir
-        print(f"Returning response with {len(events_list)} events on page {page}")
+        total_pages = None if total_events is None else (total_events + per_page - 1) // per_page
 
         return jsonify({
             "current_page": page,
             "per_page": per_page,
             "total_events": total_events,
             "total_pages": total_pages,
+            "count_is_estimate": count_is_estimate,
+            "next_cursor": cursor_next,
             "events": events_list
         }), 200
 
+    except InvalidCursor as e:
+        return jsonify({"message": str(e)}), 400
     except Exception as e:
-        # Debugging: Print exception error
-        print(f"Unexpected error: {e}")
+        current_app.logger.error(f"Unexpected error: {e}")
         return jsonify({"message": "An unexpected error occurred.", "error": str(e)}), 500
 
 @events_endpoints.route('/manage', methods=['GET'])
@@ -114,15 +149,28 @@ def get_admin_events():
         page = int(request.args.get('page', 1))
         per_page = int(request.args.get('per_page', 10))
         search_query = request.args.get('search', '').strip()
+        after = request.args.get('after')  # Cursor dari halaman sebelumnya (keyset pagination)
+        count_mode = request.args.get('count', 'exact')  # exact, approx atau none
         offset = (page - 1) * per_page
 
-        # Debugging: Print admin info and parameters
-        print(f"Admin ID: {user_id}, Roles: {user_roles}, Page: {page}, Per Page: {per_page}, Search Query: '{search_query}'")
+        if count_mode not in COUNT_MODES:
+            return jsonify({"message": f"'count' must be one of: {', '.join(COUNT_MODES)}."}), 400
+
+        # Hasil pencarian diurutkan berdasarkan relevansi, sisanya berdasarkan tanggal
+        search = boolean_query(search_query)
+        sort_columns = ["relevance", "events.tanggal", "events.id"] if search else ["events.tanggal", "events.id"]
+
+        keyset_params = []
+        if after:
+            keyset_clause, keyset_params = keyset_condition(
+                sort_columns, decode_cursor(after, len(sort_columns)), descending=True)
 
         with get_connection() as connection:
             with connection.cursor() as cursor:
-                base_query = """
-                    SELECT events.id, events.gambar, events.nama, events.deskripsi, events.tanggal, events.lokasi, events.user_id, user.username
+                select_params = [search] if search else []
+                base_query = f"""
+                    SELECT events.id, events.gambar, events.nama, events.deskripsi, events.tanggal, events.lokasi, events.user_id, user.username,
+                           {MATCH_EVENTS if search else "NULL"} AS relevance
                     FROM events
                     LEFT JOIN user ON events.user_id = user.id
                     WHERE events.user_id = %s
@@ -131,30 +179,34 @@ def get_admin_events():
                 where_clause = ""
                 params = [user_id]
 
-                # Add search query filtering
-                if search_query:
-                    where_clause = "AND (events.nama LIKE %s OR events.deskripsi LIKE %s)"
-                    params.extend([f"%{search_query}%", f"%{search_query}%"])
-
-                # Debugging: Print query and parameters
-                print(f"Search Query: '{search_query}' -> WHERE Clause: {where_clause} with Params {params}")
+                # Add search query filtering (full-text, see helper/event_search.py)
+                if search:
+                    where_clause = f"AND {MATCH_EVENTS}"
+                    params.append(search)
+
+                # Count total events for pagination (cached, see helper/count_cache.py)
+                total_events, count_is_estimate = count_cache.count(
+                    cursor, EVENTS_SCOPE, f"{count_query} {where_clause}", params, count_mode)
+
+                # Fetch events data with pagination (keyset when a cursor is given;
+                # relevance is a SELECT alias, so its cursor goes into HAVING)
+                page_clause = where_clause
+                limit_clause = "LIMIT %s OFFSET %s"
+                page_params = select_params + params + [per_page + 1, offset]
+                if after:
+                    page_clause = f"{where_clause} {'HAVING' if search else 'AND'} {keyset_clause}"
+                    limit_clause = "LIMIT %s"
+                    page_params = select_params + params + keyset_params + [per_page + 1]
 
-                # Count total events for pagination
-                cursor.execute(f"{count_query} {where_clause}", params)
-                total_events = cursor.fetchone()[0]
-
-                # Debugging: Print total events count
-                print(f"Total events count: {total_events}")
-
-                # Fetch events data with pagination
                 query = f"""
                     {base_query}
-                    {where_clause}
-                    ORDER BY events.tanggal DESC
-                    LIMIT %s OFFSET %s
+                    {page_clause}
+                    ORDER BY {", ".join(f"{column} DESC" for column in sort_columns)}
+                    {limit_clause}
                 """
-                cursor.execute(query, params + [per_page, offset])
+                cursor.execute(query, page_params)
                 results = cursor.fetchall()
+                cursor_next = next_cursor(results, per_page, lambda row: sort_key(row, search))
 
                 events_list = []
                 for row in results:
@@ -169,26 +221,27 @@ def get_admin_events():
                         "username": row[7]   # Username of the event owner
                     })
 
-        total_pages = (total_events + per_page - 1) // per_page
-
-        # Debugging: Print final response data
-        print(f"Returning response with {len(events_list)} events for Admin ID {user_id} on Page {page}")
+        total_pages = None if total_events is None else (total_events + per_page - 1) // per_page
 
         return jsonify({
             "current_page": page,
             "per_page": per_page,
             "total_events": total_events,
             "total_pages": total_pages,
+            "count_is_estimate": count_is_estimate,
+            "next_cursor": cursor_next,
             "events": events_list
         }), 200
 
+    except InvalidCursor as e:
+        return jsonify({"message": str(e)}), 400
     except Exception as e:
-        # Debugging: Print exception error
-        print(f"Unexpected error: {e}")
+        current_app.logger.error(f"Unexpected error: {e}")
         return jsonify({"message": "An unexpected error occurred.", "error": str(e)}), 500
 
 # Get event by ID
 @events_endpoints.route('/events/<int:event_id>', methods=['GET'])
+@response_cache.cached(lambda event_id: [event_tag(event_id)])
 def get_event_by_id(event_id):
     """Endpoint to get a specific event by its ID"""
     try:
@@ -224,6 +277,30 @@ def get_event_by_id(event_id):
         current_app.logger.error(f"Unexpected error: {e}")
         return jsonify({"message": "An unexpected error occurred.", "error": str(e)}), 500
 
+# Event page: event, packages and committee in one request
+@events_endpoints.route('/detail/<int:event_id>', methods=['GET'])
+def get_event_detail(event_id):
+    """Endpoint to get an event together with its packages and committee (?include=packages,committees)"""
+    try:
+        sections = parse_includes(request.args.get('include'))
+
+        with get_connection() as connection:
+            with connection.cursor() as cursor:
+                # Satu query: bagian yang diminta diambil sebagai subquery JSON
+                cursor.execute(detail_query(sections), (event_id,))
+                result = cursor.fetchone()
+
+        if not result:
+            return jsonify({"message": "Event not found"}), 404
+
+        return jsonify(detail_payload(result, sections)), 200
+
+    except InvalidInclude as e:
+        return jsonify({"message": str(e)}), 400
+    except Exception as e:
+        current_app.logger.error(f"Unexpected error: {e}")
+        return jsonify({"message": "An unexpected error occurred.", "error": str(e)}), 500
+
 #Add Events
 @events_endpoints.route('/add', methods=['POST'])
 @jwt_required()
@@ -282,6 +359,7 @@ def add_event():
 
                 # Cek apakah data berhasil dimasukkan
                 if cursor.rowcount > 0:
+                    signals.event_changed.send(current_app._get_current_object(), event_id=cursor.lastrowid)
                     return jsonify({"message": "Event added successfully."}), 201
                 else:
                     return jsonify({"message": "Failed to add event."}), 500
@@ -306,12 +384,8 @@ def update_event(event_id):
             return jsonify({"message": "You must be an admin to update events."}), 403
 
         # Pastikan pengguna juga pemilik event
-        with get_connection() as connection:
-            with connection.cursor() as cursor:
-                cursor.execute("SELECT user_id FROM events WHERE id=%s", (event_id,))
-                result = cursor.fetchone()
-                if not result or result[0] != user_id:
-                    return jsonify({"message": "You are not authorized to edit this event."}), 403
+        if membership_cache.get_event_owner(event_id) != user_id:
+            return jsonify({"message": "You are not authorized to edit this event."}), 403
 
         # Ambil parameter form dari request
         nama = request.form.get('nama')
@@ -388,6 +462,8 @@ def update_event(event_id):
                     rows_affected = cursor.rowcount
 
                     if rows_affected > 0:
+                        signals.event_changed.send(current_app._get_current_object(), event_id=event_id,
+                                                   holder_ids=ticket_holder_ids(cursor, event_id))
                         return jsonify({"event_id": event_id, "message": "Event updated successfully."}), 200
                     else:
                         return jsonify({"message": "Event not found or update failed."}), 404
@@ -434,12 +510,18 @@ def delete_event(event_id):
                                 os.remove(file_path)
                                 current_app.logger.debug(f"Deleted event image at {file_path}")
 
+                        # Pemegang tiket dibaca sebelum DELETE, untuk invalidasi jumlah tiket mereka
+                        holder_ids = ticket_holder_ids(cursor, event_id)
+
                         # Hapus event dari database
                         cursor.execute("DELETE FROM events WHERE id = %s", (event_id,))
                         connection.commit()
+                        membership_cache.invalidate_event(event_id)
 
                         # Cek apakah event berhasil dihapus
                         if cursor.rowcount > 0:
+                            signals.event_changed.send(current_app._get_current_object(), event_id=event_id,
+                                                       holder_ids=holder_ids)
                             return jsonify({"message": "Event deleted successfully."}), 200
                         else:
                             return jsonify({"message": "Event not found."}), 404
@@ -11,11 +11,16 @@ from helper.jwt_helper import get_roles
 from helper.checker import validate_price
 
 from helper.db_helper import get_connection
+from helper import prepared_statements
+from helper import signals
+from helper.response_cache import packages_tag
+from extensions import membership_cache, response_cache
 
 bcrypt = Bcrypt()
 packages_endpoints = Blueprint('packages', __name__)
 
 @packages_endpoints.route('/get/<int:id_acara>', methods=['GET'])
+@response_cache.cached(lambda id_acara: [packages_tag(id_acara)])
 def get_packages_by_event(id_acara):
     """Endpoint to get all packages related to a specific event."""
     try:
@@ -33,8 +38,8 @@ def get_packages_by_event(id_acara):
                     FROM packages p
                     WHERE p.id_acara = %s
                 """
-                cursor.execute(query, (id_acara,))
-                results = cursor.fetchall()
+                # Prepared once per pooled connection, then only the ID is sent
+                results = prepared_statements.execute(connection, cursor, query, (id_acara,)).fetchall()
 
                 packages_list = []
                 for row in results:
@@ -70,13 +75,8 @@ def create_package(id_acara):
         if 'admin' not in user_roles:
             return jsonify({"message": "You do not have permission to create a package for this event."}), 403
 
-        with get_connection() as connection:
-            with connection.cursor() as cursor:
-                cursor.execute("SELECT user_id FROM events WHERE id = %s", (id_acara,))
-                event_owner = cursor.fetchone()
-
-                if not event_owner or event_owner[0] != user_id:
-                    return jsonify({"message": "You do not have permission to create a package for this event."}), 403
+        if membership_cache.get_event_owner(id_acara) != user_id:
+            return jsonify({"message": "You do not have permission to create a package for this event."}), 403
 
         # Ambil data dari form
         name = request.form.get('name')
@@ -105,6 +105,7 @@ def create_package(id_acara):
                 cursor.execute("SELECT LAST_INSERT_ID()")
                 new_id = cursor.fetchone()[0]
 
+        signals.packages_changed.send(current_app._get_current_object(), event_id=id_acara, package_id=new_id)
         return jsonify({"message": "Package created successfully.", "id": new_id}), 201
     
     except Exception as e:
@@ -128,11 +129,8 @@ def delete_package(id_acara, package_id):
         # Verifikasi apakah pengguna adalah pemilik event
         with get_connection() as connection:
             with connection.cursor() as cursor:
-                cursor.execute("SELECT user_id FROM events WHERE id = %s", (id_acara,))
-                event_owner = cursor.fetchone()
-
                 # Cek apakah pengguna adalah pemilik event
-                if not event_owner or event_owner[0] != user_id:
+                if membership_cache.get_event_owner(id_acara, cursor) != user_id:
                     return jsonify({"message": "You do not have permission to delete this package."}), 403
 
                 # Cek apakah package ada di event yang sesuai
@@ -146,6 +144,7 @@ def delete_package(id_acara, package_id):
                 cursor.execute("DELETE FROM packages WHERE id = %s", (package_id,))
                 connection.commit()
 
+        signals.packages_changed.send(current_app._get_current_object(), event_id=id_acara, package_id=package_id)
         return jsonify({"message": "Package deleted successfully."}), 200
 
     except Exception as e:
@@ -183,6 +182,12 @@ def update_package(package_id):
         if fields_to_update:
             with get_connection() as connection:
                 with connection.cursor() as cursor:
+                    # Event paket dibaca sebelum UPDATE, untuk sinyal invalidasi cache
+                    cursor.execute("SELECT id_acara FROM packages WHERE id = %s", (package_id,))
+                    package = cursor.fetchone()
+                    if not package:
+                        return jsonify({"message": "Package not found or update failed."}), 404
+
                     update_query = f"""
                         UPDATE packages
                         SET {', '.join(fields_to_update)}
@@ -193,6 +198,8 @@ def update_package(package_id):
                     connection.commit()
 
                     if cursor.rowcount > 0:
+                        signals.packages_changed.send(current_app._get_current_object(),
+                                                      event_id=package[0], package_id=package_id)
                         return jsonify({"message": "Package updated successfully.", "id": package_id}), 200
                     else:
                         return jsonify({"message": "Package not found or update failed."}), 404
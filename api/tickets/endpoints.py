@@ -1,6 +1,7 @@
-from flask import Blueprint, jsonify, request, current_app
+from flask import Blueprint, jsonify, request, current_app, Response, stream_with_context
 from flask_jwt_extended import create_access_token, decode_token
 from flask_bcrypt import Bcrypt
+import math
 import os
 import uuid
 from datetime import timedelta, datetime
@@ -8,13 +9,39 @@ from werkzeug.utils import secure_filename
 from flask import Blueprint, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from helper.jwt_helper import get_roles
-import traceback
+from functools import partial
 
 from helper.db_helper import get_connection
+from helper.ticket_purchase import purchase_ticket, purchase_tickets, PurchaseError
+from helper.ticket_holds import create_hold, confirm_hold
+from helper.idempotency import idempotent
+from helper.pagination import decode_cursor, keyset_condition, next_cursor, InvalidCursor
+from helper.count_cache import COUNT_MODES, event_tickets_scope, user_tickets_scope
+from helper.ticket_filters import user_ticket_filters, InvalidFilter
+from helper.ticket_export import EXPORT_FORMATS, stream_attendees
+from helper.sales_summary import record_validations, record_deletion, event_summary
+from helper import signals, prepared_statements, ticket_listing
+from helper.ticket_validation import validate_tickets
+from helper.ticket_code import event_key, sign_ticket, verify_ticket_code, InvalidTicketCode, MAC_SIZE
+from extensions import waiting_room, idempotency_store, membership_cache, count_cache, attendee_index, live_feed
 
 bcrypt = Bcrypt()
 tickets_endpoints = Blueprint('tickets', __name__)
 
+def admitted_by_waiting_room(event_id, user_id):
+    """True when the event has no open waiting room or the request carries an admitted X-Queue-Token."""
+    if not waiting_room.is_active(event_id):
+        return True
+    return waiting_room.is_admitted(event_id, request.headers.get('X-Queue-Token'), user_id)
+
+def send_validated(event_id, results):
+    """Notify subscribers about the tickets a batch validation actually marked as used."""
+    validated = [result for result in results if result["status"] == "ok"]
+    if validated:
+        signals.tickets_validated.send(current_app._get_current_object(), event_id=event_id,
+                                       ticket_ids=[result["ticket_id"] for result in validated],
+                                       owner_ids=[result["owner_id"] for result in validated])
+
 @tickets_endpoints.route('/tickets/<int:event_id>', methods=['GET'])
 def get_event_tickets(event_id):
     """Endpoint to retrieve all tickets for a specific event with filter and paging."""
@@ -24,92 +51,167 @@ def get_event_tickets(event_id):
         per_page = int(request.args.get('per_page', 10))  # Default 10 tiket per halaman
         search = request.args.get('search', '')  # Pencarian berdasarkan nama pengguna atau email
         status_filter = request.args.get('status', '')  # Filter status tiket, misalnya 'Terpakai' atau 'Belum terpakai'
+        after = request.args.get('after')  # Cursor dari halaman sebelumnya (keyset pagination)
+        count_mode = request.args.get('count', 'exact')  # exact, approx atau none
 
-        offset = (page - 1) * per_page  # Hitung offset berdasarkan halaman yang diminta
+        if count_mode not in COUNT_MODES:
+            return jsonify({"message": f"'count' must be one of: {', '.join(COUNT_MODES)}."}), 400
 
-        # Menyusun query dasar
-        query = """
-            SELECT 
-                t.id AS ticket_id,
-                t.user_id AS ticket_owner_id,
-                u.username AS ticket_owner_username,
-                u.email AS ticket_owner_email,
-                t.package_id,
-                p.name AS package_name,
-                p.price AS package_price,
-                t.purchase_date,
-                t.deleted_by,
-                t.deleted_at
-            FROM tickets t
-            JOIN packages p ON t.package_id = p.id
-            JOIN events e ON p.id_acara = e.id
-            JOIN user u ON t.user_id = u.id
-            WHERE e.id = %s
-        """
-        # Menambahkan pencarian berdasarkan nama pengguna atau email
-        if search:
-            query += f" AND (u.username LIKE %s OR u.email LIKE %s)"
-        
-        # Menambahkan filter status tiket (Terpakai atau Belum terpakai)
-        if status_filter:
-            if status_filter == 'Terpakai':
-                query += " AND t.deleted_at IS NOT NULL"
-            elif status_filter == 'Belum terpakai':
-                query += " AND t.deleted_at IS NULL"
+        # FROM dan filter dipakai bersama oleh query data dan query jumlah (helper/ticket_listing.py)
+        filter_clause = ticket_listing.FROM_CLAUSE
+        filter_params = [event_id]
 
-        # Menambahkan pagination dengan LIMIT dan OFFSET
-        query += " LIMIT %s OFFSET %s"
-
-        with get_connection() as connection:
+        # Listing berat: boleh dilayani replica, kecuali klien ini baru saja menulis
+        with get_connection(read_only=True) as connection:
             with connection.cursor() as cursor:
-                # Menyiapkan parameter query yang sesuai
-                params = [event_id]
+                # Pencarian nama pengguna atau email lewat indeks pemegang tiket (helper/attendee_index.py);
+                # pencarian yang terlalu luas tetap memakai LIKE
                 if search:
-                    params += ['%' + search + '%', '%' + search + '%']
-                params += [per_page, offset]
-
-                cursor.execute(query, tuple(params))
+                    holder_ids = attendee_index.search(cursor, event_id, search)
+                    if holder_ids is None:
+                        filter_clause += " AND (u.username LIKE %s OR u.email LIKE %s)"
+                        filter_params += ['%' + search + '%', '%' + search + '%']
+                    elif holder_ids:
+                        filter_clause += f" AND t.user_id IN ({', '.join(['%s'] * len(holder_ids))})"
+                        filter_params += holder_ids
+                    else:
+                        filter_clause += " AND FALSE"
+
+                # Menambahkan filter status tiket (Terpakai atau Belum terpakai)
+                filter_clause += ticket_listing.status_filter_clause(status_filter)
+
+                # Keyset pagination: lanjut setelah (purchase_date, id) terakhir tanpa OFFSET
+                query, params = ticket_listing.page_query(filter_clause, filter_params, page, per_page, after)
+                cursor.execute(query, params)
                 results = cursor.fetchall()
 
-                tickets = [
-                    {
-                        "ticket_id": row[0],
-                        "ticket_owner_id": row[1],
-                        "ticket_owner_username": row[2],
-                        "ticket_owner_email": row[3],
-                        "package_id": row[4],
-                        "package_name": row[5],
-                        "package_price": row[6],
-                        "purchase_date": row[7],
-                        "deleted_by": row[8],
-                        "deleted_at": row[9]
-                    }
-                    for row in results
-                ]
+                # Jumlah total tiket dengan filter yang sama (di-cache, lihat helper/count_cache.py)
+                total_count, count_is_estimate = count_cache.count(
+                    cursor, event_tickets_scope(event_id), "SELECT COUNT(*)" + filter_clause,
+                    filter_params, count_mode)
 
-                # Mengambil jumlah total tiket untuk event ini
-                count_query = """
-                    SELECT COUNT(*) 
-                    FROM tickets t
-                    JOIN packages p ON t.package_id = p.id
-                    JOIN events e ON p.id_acara = e.id
-                    WHERE e.id = %s
-                """
-                cursor.execute(count_query, (event_id,))
-                total_count = cursor.fetchone()[0]
+        return jsonify(ticket_listing.listing_payload(results, total_count, count_is_estimate, page, per_page)), 200
+
+    except InvalidCursor as e:
+        return jsonify({"message": str(e)}), 400
+    except Exception as e:
+        current_app.logger.error(f"Unexpected error: {e}")
+        return jsonify({"message": "An unexpected error occurred.", "error": str(e)}), 500
+
+@tickets_endpoints.route('/export/<int:event_id>', methods=['GET'])
+@jwt_required()
+def export_event_tickets(event_id):
+    """Endpoint for the event owner or committee to download the attendee list as CSV or NDJSON."""
+    try:
+        current_user = get_jwt_identity()
+        user_id = current_user['id']
+        export_format = request.args.get('format', 'csv').lower()  # csv atau ndjson
+
+        if export_format not in EXPORT_FORMATS:
+            return jsonify({"message": f"'format' must be one of: {', '.join(EXPORT_FORMATS)}."}), 400
+
+        owner_id = membership_cache.get_event_owner(event_id)
+        if owner_id is None:
+            return jsonify({"message": "Event not found."}), 404
+        if owner_id != user_id and not membership_cache.is_committee_member(user_id, event_id):
+            return jsonify({"message": "You are not authorized to export tickets of this event."}), 403
+
+        # Baris dikirim per batch langsung dari cursor, tanpa menampung seluruh daftar di memori
+        read_connection = partial(get_connection, read_only=True)
+        rows = stream_attendees(read_connection, event_id, export_format,
+                                current_app.config['EXPORT_BATCH_SIZE'])
+        return Response(stream_with_context(rows), mimetype=EXPORT_FORMATS[export_format], headers={
+            "Content-Disposition": f"attachment; filename=event_{event_id}_tickets.{export_format}"
+        })
+
+    except Exception as e:
+        current_app.logger.error(f"Unexpected error: {e}")
+        return jsonify({"message": "An unexpected error occurred.", "error": str(e)}), 500
+
+@tickets_endpoints.route('/sales/<int:event_id>', methods=['GET'])
+@jwt_required()
+def get_sales_summary(event_id):
+    """Endpoint for the event owner or committee to see sold, validated and remaining tickets and revenue."""
+    try:
+        current_user = get_jwt_identity()
+        user_id = current_user['id']
+
+        owner_id = membership_cache.get_event_owner(event_id)
+        if owner_id is None:
+            return jsonify({"message": "Event not found."}), 404
+        if owner_id != user_id and not membership_cache.is_committee_member(user_id, event_id):
+            return jsonify({"message": "You are not authorized to see the sales of this event."}), 403
+
+        # Dibaca dari penghitung package_sales, bukan COUNT(*) atas tickets
+        with get_connection(read_only=True) as connection:
+            with connection.cursor() as cursor:
+                summary = event_summary(cursor, event_id)
+
+        return jsonify(summary), 200
+
+    except Exception as e:
+        current_app.logger.error(f"Unexpected error: {e}")
+        return jsonify({"message": "An unexpected error occurred.", "error": str(e)}), 500
+
+@tickets_endpoints.route('/live/<int:event_id>/token', methods=['POST'])
+@jwt_required()
+def live_stream_token(event_id):
+    """Endpoint for the event owner or committee to get a short-lived token for the live stream."""
+    try:
+        current_user = get_jwt_identity()
+        user_id = current_user['id']
+
+        owner_id = membership_cache.get_event_owner(event_id)
+        if owner_id is None:
+            return jsonify({"message": "Event not found."}), 404
+        if owner_id != user_id and not membership_cache.is_committee_member(user_id, event_id):
+            return jsonify({"message": "You are not authorized to follow this event."}), 403
 
         return jsonify({
-            "tickets": tickets,
-            "total_count": total_count,
-            "page": page,
-            "per_page": per_page,
-            "total_pages": (total_count + per_page - 1) // per_page  # Menghitung total halaman
+            "token": live_feed.issue_token(user_id, event_id),
+            "expires_in": live_feed.token_ttl
         }), 200
 
     except Exception as e:
         current_app.logger.error(f"Unexpected error: {e}")
         return jsonify({"message": "An unexpected error occurred.", "error": str(e)}), 500
 
+@tickets_endpoints.route('/live/<int:event_id>', methods=['GET'])
+def stream_event_activity(event_id):
+    """Endpoint for the event owner or committee to follow sales and check-ins live (Server-Sent Events)."""
+    try:
+        # Token dari POST /live/<event_id>/token, bukan access token (query string masuk ke access log)
+        user_id = live_feed.read_token(request.args.get('token', ''), event_id)
+        if user_id is None:
+            return jsonify({"message": "Invalid or expired stream token."}), 401
+
+        # Dicek lagi saat terhubung, supaya panitia yang dikeluarkan tidak bisa memakai token lama
+        owner_id = membership_cache.get_event_owner(event_id)
+        if owner_id is None:
+            return jsonify({"message": "Event not found."}), 404
+        if owner_id != user_id and not membership_cache.is_committee_member(user_id, event_id):
+            return jsonify({"message": "You are not authorized to follow this event."}), 403
+
+        # Angka awal dibaca sekali; setelah itu hanya perubahan yang dikirim, tanpa query lagi
+        with get_connection() as connection:
+            with connection.cursor() as cursor:
+                snapshot = event_summary(cursor, event_id)
+
+        # Setiap stream memakai satu thread worker selama dashboard terbuka, jadi jumlahnya dibatasi
+        if not live_feed.acquire():
+            return jsonify({"message": "Too many live dashboards are open, try again later."}), 503, \
+                {"Retry-After": str(live_feed.heartbeat)}
+
+        response = Response(stream_with_context(live_feed.stream(event_id, snapshot)), mimetype="text/event-stream",
+                            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+        # Called by the server when the stream ends or the client goes away, even if it never started
+        response.call_on_close(live_feed.release)
+        return response
+
+    except Exception as e:
+        current_app.logger.error(f"Unexpected error: {e}")
+        return jsonify({"message": "An unexpected error occurred.", "error": str(e)}), 500
+
 @tickets_endpoints.route('/user_tickets', methods=['GET'])
 @jwt_required()
 def get_user_tickets():
@@ -120,6 +222,13 @@ def get_user_tickets():
         per_page = int(request.args.get('per_page', 10))  # Default 10 tiket per halaman
         search = request.args.get('search', '').strip()  # Pencarian berdasarkan event_name, event_description, atau event_date
         status_filter = request.args.get('status', '').strip()  # Filter status tiket
+        date_from = request.args.get('date_from', '').strip()  # Rentang tanggal acara (YYYY-MM-DD)
+        date_to = request.args.get('date_to', '').strip()
+        after = request.args.get('after')  # Cursor dari halaman sebelumnya (keyset pagination)
+        count_mode = request.args.get('count', 'exact')  # exact, approx atau none
+
+        if count_mode not in COUNT_MODES:
+            return jsonify({"message": f"'count' must be one of: {', '.join(COUNT_MODES)}."}), 400
         
         # Get data from JWT for user verification
         current_user = get_jwt_identity()
@@ -128,8 +237,8 @@ def get_user_tickets():
         if not user_id:
             return jsonify({"message": "User not found."}), 404
 
-        # Build query dynamically
-        query = """
+        # Build query dynamically; the FROM/filter part is shared with the count query
+        select_clause = """
             SELECT 
                 e.id AS event_id,
                 e.gambar AS event_image,
@@ -146,47 +255,44 @@ def get_user_tickets():
                 t.purchase_date AS ticket_purchase_date,
                 t.deleted_by AS ticket_deleted_by,
                 t.deleted_at AS ticket_deleted_at
+        """
+        filter_clause = """
             FROM tickets t
             JOIN packages p ON t.package_id = p.id
             JOIN events e ON p.id_acara = e.id
             WHERE t.user_id = %s
         """
 
-        # Parameters list
-        params = [user_id]
-
-        # Apply search filter (based on event_name, event_description, or event_date)
-        if search:
-            query += " AND (e.nama ILIKE %s OR e.deskripsi ILIKE %s OR e.tanggal::text ILIKE %s)"
-            params.extend([f"%{search}%", f"%{search}%", f"%{search}%"])
-
-        # Apply status filter
-        if status_filter:
-            if status_filter.lower() == "terpakai":
-                query += " AND t.deleted_at IS NOT NULL"
-            elif status_filter.lower() == "belum terpakai":
-                query += " AND t.deleted_at IS NULL"
-
-        # Pagination
-        query += " ORDER BY t.purchase_date DESC LIMIT %s OFFSET %s"
-        params.extend([per_page, (page - 1) * per_page])
-
-        with get_connection() as connection:
+        # Search, status and date range filters (see helper/ticket_filters.py)
+        conditions, condition_params = user_ticket_filters(search, status_filter, date_from, date_to)
+        filter_clause += conditions
+        filter_params = [user_id] + condition_params
+
+        query = select_clause + filter_clause
+        params = list(filter_params)
+
+        # Pagination: keyset bila ada cursor, selain itu LIMIT/OFFSET seperti biasa
+        if after:
+            keyset_clause, keyset_params = keyset_condition(
+                ["t.purchase_date", "t.id"], decode_cursor(after, 2), descending=True)
+            query += f" AND {keyset_clause} ORDER BY t.purchase_date DESC, t.id DESC LIMIT %s"
+            params.extend(keyset_params + [per_page + 1])
+        else:
+            query += " ORDER BY t.purchase_date DESC, t.id DESC LIMIT %s OFFSET %s"
+            params.extend([per_page + 1, (page - 1) * per_page])
+
+        # Read from a replica unless this client just bought or transferred tickets
+        with get_connection(read_only=True) as connection:
             with connection.cursor() as cursor:
-                # Get the total count of tickets for pagination
-                count_query = """
-                    SELECT COUNT(*)
-                    FROM tickets t
-                    JOIN packages p ON t.package_id = p.id
-                    JOIN events e ON p.id_acara = e.id
-                    WHERE t.user_id = %s
-                """
-                cursor.execute(count_query, (user_id,))
-                total_count = cursor.fetchone()[0]
+                # Get the total count of tickets for pagination, with the same filters
+                total_count, count_is_estimate = count_cache.count(
+                    cursor, user_tickets_scope(user_id), "SELECT COUNT(*)" + filter_clause,
+                    filter_params, count_mode)
 
                 # Execute the main query for tickets
                 cursor.execute(query, tuple(params))
                 results = cursor.fetchall()
+                cursor_next = next_cursor(results, per_page, lambda row: (row[12], row[11]))
 
                 tickets = [
                     {
@@ -213,15 +319,100 @@ def get_user_tickets():
             "tickets": tickets,
             "page": page,
             "per_page": per_page,
-            "total_count": total_count
+            "total_count": total_count,
+            "count_is_estimate": count_is_estimate,
+            "next_cursor": cursor_next
         }), 200
 
+    except (InvalidCursor, InvalidFilter) as e:
+        return jsonify({"message": str(e)}), 400
+    except Exception as e:
+        current_app.logger.error(f"Unexpected error: {e}")
+        return jsonify({"message": "An unexpected error occurred.", "error": str(e)}), 500
+
+@tickets_endpoints.route('/queue/<int:event_id>/open', methods=['POST'])
+@jwt_required()
+def open_waiting_room(event_id):
+    """Endpoint for the event owner to put purchases of an event behind the waiting room."""
+    try:
+        current_user = get_jwt_identity()
+        user_id = current_user['id']
+        user_roles = get_roles()
+
+        if 'admin' not in user_roles:
+            return jsonify({"message": "You must be an admin to manage the waiting room."}), 403
+
+        try:
+            rate = float(request.form.get('rate', ''))  # Jumlah pembeli yang diizinkan per detik
+        except ValueError:
+            return jsonify({"message": "'rate' must be a number of buyers per second."}), 400
+
+        if not math.isfinite(rate) or rate <= 0:
+            return jsonify({"message": "'rate' must be a finite number greater than 0."}), 400
+
+        if membership_cache.get_event_owner(event_id) != user_id:
+            return jsonify({"message": "You are not authorized to manage this event."}), 403
+
+        waiting_room.open(event_id, rate)
+        return jsonify({"message": "Waiting room opened.", "event_id": event_id, "rate": rate}), 200
+
     except Exception as e:
         current_app.logger.error(f"Unexpected error: {e}")
         return jsonify({"message": "An unexpected error occurred.", "error": str(e)}), 500
 
+@tickets_endpoints.route('/queue/<int:event_id>', methods=['DELETE'])
+@jwt_required()
+def close_waiting_room(event_id):
+    """Endpoint for the event owner to let purchases through without queueing again."""
+    try:
+        current_user = get_jwt_identity()
+        user_id = current_user['id']
+        user_roles = get_roles()
+
+        if 'admin' not in user_roles:
+            return jsonify({"message": "You must be an admin to manage the waiting room."}), 403
+
+        if membership_cache.get_event_owner(event_id) != user_id:
+            return jsonify({"message": "You are not authorized to manage this event."}), 403
+
+        if not waiting_room.close(event_id):
+            return jsonify({"message": "This event has no open waiting room."}), 404
+
+        return jsonify({"message": "Waiting room closed."}), 200
+
+    except Exception as e:
+        current_app.logger.error(f"Unexpected error: {e}")
+        return jsonify({"message": "An unexpected error occurred.", "error": str(e)}), 500
+
+@tickets_endpoints.route('/queue/<int:event_id>/join', methods=['POST'])
+@jwt_required()
+def join_waiting_room(event_id):
+    """Endpoint to take a place in the waiting room of an event."""
+    current_user = get_jwt_identity()
+
+    if not waiting_room.is_active(event_id):
+        return jsonify({"message": "This event has no waiting room, you can buy right away.", "admitted": True}), 200
+
+    return jsonify(waiting_room.join(event_id, current_user['id'])), 200
+
+@tickets_endpoints.route('/queue/<int:event_id>/status', methods=['GET'])
+@jwt_required()
+def waiting_room_status(event_id):
+    """Endpoint to poll the queue position of a waiting room token."""
+    if not waiting_room.is_active(event_id):
+        return jsonify({"message": "This event has no waiting room, you can buy right away.", "admitted": True}), 200
+
+    token = request.args.get('token', '')
+    status = waiting_room.status(event_id, token)
+
+    if not status:
+        return jsonify({"message": "Queue token not found or expired, please join again."}), 404
+
+    return jsonify(status), 200
+
 @tickets_endpoints.route('/buy-ticket/<int:event_id>', methods=['POST'])
 @jwt_required()
+@idempotent(idempotency_store)
 def buy_ticket(event_id):
     """Endpoint for users to buy a ticket for an event."""
     try:
@@ -232,48 +423,146 @@ def buy_ticket(event_id):
         if not package_id:
             return jsonify({"message": "You haven't specified the package you want to buy."}), 400
 
-        purchase_date = datetime.now()
+        # Saat waiting room aktif, hanya token yang sudah diizinkan boleh membeli
+        if not admitted_by_waiting_room(event_id, user_id):
+            return jsonify({"message": "Please wait for your turn in the waiting room."}), 429
 
         with get_connection() as connection:
-            with connection.cursor() as cursor:
-                # Ambil jumlah tiket yang tersedia untuk paket ini
-                cursor.execute("SELECT total_tickets_available FROM packages WHERE id = %s", (package_id,))
-                package = cursor.fetchone()
+            ticket_id = purchase_ticket(connection, user_id, event_id, package_id)
 
-                if not package:
-                    return jsonify({"message": "Package not found."}), 404
+        signals.tickets_purchased.send(current_app._get_current_object(), event_id=event_id,
+                                       user_id=user_id, ticket_ids=[ticket_id])
 
-                total_tickets_available = package[0]
-                
-                if total_tickets_available < 1:
-                    return jsonify({"message": "No tickets available."}), 400
+        return jsonify({"message": "Successfully purchased 1 ticket.", "ticket_id": ticket_id}), 201
 
-                # Masukkan satu tiket ke dalam tabel
-                insert_query = """
-                    INSERT INTO tickets (user_id, package_id, purchase_date)
-                    VALUES (%s, %s, %s)
-                """
-                cursor.execute(insert_query, (user_id, package_id, purchase_date))
+    except PurchaseError as e:
+        return jsonify({"message": e.message}), e.status_code
+    except Exception as e:
+        current_app.logger.exception(f"Error purchasing ticket: {e}")  # Termasuk traceback lengkap
+        return jsonify({"error": str(e)}), 500
 
-                # Kurangi total_tickets_available hanya 1
-                update_query = """
-                    UPDATE packages 
-                    SET total_tickets_available = total_tickets_available - 1
-                    WHERE id = %s
-                """
-                cursor.execute(update_query, (package_id,))
+@tickets_endpoints.route('/buy-tickets/<int:event_id>', methods=['POST'])
+@jwt_required()
+@idempotent(idempotency_store)
+def buy_tickets(event_id):
+    """Endpoint to buy several tickets (of one or more packages) in a single request."""
+    try:
+        current_user = get_jwt_identity()
+        user_id = current_user['id']
+        # Form berisi pasangan package_id dan quantity yang diulang, urutannya harus sama
+        package_ids = request.form.getlist('package_id')
+        quantities = request.form.getlist('quantity')
 
-                connection.commit()
+        if not package_ids:
+            return jsonify({"message": "You haven't specified the packages you want to buy."}), 400
+
+        if len(package_ids) != len(quantities):
+            return jsonify({"message": "Every package_id needs a matching quantity."}), 400
+
+        try:
+            items = [(int(package_id), int(quantity)) for package_id, quantity in zip(package_ids, quantities)]
+        except ValueError:
+            return jsonify({"message": "package_id and quantity must be numbers."}), 400
+
+        if any(quantity < 1 for _, quantity in items):
+            return jsonify({"message": "'quantity' must be at least 1."}), 400
 
-                return jsonify({"message": "Successfully purchased 1 ticket."}), 201
+        if not admitted_by_waiting_room(event_id, user_id):
+            return jsonify({"message": "Please wait for your turn in the waiting room."}), 429
 
+        with get_connection() as connection:
+            tickets = purchase_tickets(connection, user_id, event_id, items)
+
+        signals.tickets_purchased.send(current_app._get_current_object(), event_id=event_id, user_id=user_id,
+                                       ticket_ids=[ticket_id for ids in tickets.values() for ticket_id in ids])
+
+        total = sum(len(ticket_ids) for ticket_ids in tickets.values())
+        return jsonify({
+            "message": f"Successfully purchased {total} ticket(s).",
+            "tickets": [
+                {"package_id": package_id, "ticket_ids": ticket_ids}
+                for package_id, ticket_ids in tickets.items()
+            ]
+        }), 201
+
+    except PurchaseError as e:
+        return jsonify({"message": e.message}), e.status_code
     except Exception as e:
-        print("Error purchasing ticket:", str(e))
-        traceback.print_exc()  # Cetak traceback lengkap ke konsol
-        return jsonify({"error": str(e)}), 500
+        current_app.logger.error(f"Unexpected error: {e}")
+        return jsonify({"message": "An unexpected error occurred.", "error": str(e)}), 500
+
+@tickets_endpoints.route('/hold/<int:event_id>', methods=['POST'])
+@jwt_required()
+@idempotent(idempotency_store)
+def hold_tickets(event_id):
+    """Endpoint to reserve tickets of a package for a short time before checkout."""
+    try:
+        current_user = get_jwt_identity()
+        user_id = current_user['id']
+        package_id = request.form.get('package_id')
+
+        if not package_id:
+            return jsonify({"message": "You haven't specified the package you want to buy."}), 400
+
+        try:
+            quantity = int(request.form.get('quantity', 1))
+        except ValueError:
+            return jsonify({"message": "'quantity' must be a number."}), 400
+
+        if quantity < 1:
+            return jsonify({"message": "'quantity' must be at least 1."}), 400
+
+        if not admitted_by_waiting_room(event_id, user_id):
+            return jsonify({"message": "Please wait for your turn in the waiting room."}), 429
+
+        ttl = current_app.config['HOLD_TTL']
+        with get_connection() as connection:
+            hold_id, expires_at = create_hold(connection, user_id, event_id, package_id, quantity, ttl,
+                                              max_holds=current_app.config['HOLD_MAX_PER_USER'])
+
+        signals.packages_changed.send(current_app._get_current_object(), event_id=event_id, package_id=int(package_id))
+
+        return jsonify({
+            "message": f"{quantity} ticket(s) held for {ttl} seconds.",
+            "hold_id": hold_id,
+            "expires_at": expires_at
+        }), 201
+
+    except PurchaseError as e:
+        return jsonify({"message": e.message}), e.status_code
+    except Exception as e:
+        current_app.logger.error(f"Unexpected error: {e}")
+        return jsonify({"message": "An unexpected error occurred.", "error": str(e)}), 500
+
+@tickets_endpoints.route('/confirm-hold/<int:hold_id>', methods=['POST'])
+@jwt_required()
+@idempotent(idempotency_store)
+def confirm_ticket_hold(hold_id):
+    """Endpoint to turn a live hold into tickets."""
+    try:
+        current_user = get_jwt_identity()
+        user_id = current_user['id']
+
+        with get_connection() as connection:
+            event_id, ticket_ids = confirm_hold(connection, user_id, hold_id)
+
+        signals.tickets_purchased.send(current_app._get_current_object(), event_id=event_id,
+                                       user_id=user_id, ticket_ids=ticket_ids)
+
+        return jsonify({
+            "message": f"Successfully purchased {len(ticket_ids)} ticket(s).",
+            "ticket_ids": ticket_ids
+        }), 201
+
+    except PurchaseError as e:
+        return jsonify({"message": e.message}), e.status_code
+    except Exception as e:
+        current_app.logger.error(f"Unexpected error: {e}")
+        return jsonify({"message": "An unexpected error occurred.", "error": str(e)}), 500
 
 @tickets_endpoints.route('/validate-ticket', methods=['POST'])
 @jwt_required()
+@idempotent(idempotency_store)
 def validate_ticket():
     """Endpoint for event organizers (panitia) to validate a ticket."""
     try:
@@ -288,50 +577,235 @@ def validate_ticket():
             with connection.cursor() as cursor:
                 # Periksa apakah tiket sudah divalidasi sebelumnya
                 check_ticket_query = """
-                    SELECT p.id_acara, t.deleted_at
+                    SELECT p.id_acara, t.deleted_at, t.user_id, t.package_id
                     FROM tickets t
                     JOIN packages p ON t.package_id = p.id
                     WHERE t.id = %s
                 """
-                cursor.execute(check_ticket_query, (ticket_id,))
-                ticket_result = cursor.fetchone()
+                rows = prepared_statements.execute(connection, cursor, check_ticket_query, (ticket_id,)).fetchall()
+                ticket_result = rows[0] if rows else None
 
                 if not ticket_result:
                     return jsonify({"message": "Ticket not found."}), 404
 
-                event_id, deleted_at = ticket_result  # Ambil ID acara dan status validasi tiket
+                event_id, deleted_at, ticket_owner_id, package_id = ticket_result  # Ambil ID acara, status validasi, pemilik dan paket tiket
 
                 # Jika tiket sudah divalidasi, tolak permintaan
                 if deleted_at is not None:
                     return jsonify({"message": "This ticket has already been validated."}), 400
 
-                # Periksa apakah user adalah panitia dari acara ini
-                panitia_query = "SELECT 1 FROM panitia WHERE id_user = %s AND id_acara = %s"
-                cursor.execute(panitia_query, (user_id, event_id))
-                is_panitia = cursor.fetchone()
-
-                if not is_panitia:
+                # Periksa apakah user adalah panitia dari acara ini (di-cache per user dan acara)
+                if not membership_cache.is_committee_member(user_id, event_id, connection=connection):
                     return jsonify({"message": "You are not authorized to validate this ticket."}), 403
 
-                # Jika user adalah panitia, validasi tiket dengan menambahkan deleted_by dan deleted_at
+                # Jika user adalah panitia, validasi tiket dengan menambahkan deleted_by dan deleted_at.
+                # Hanya tiket yang belum terpakai yang diubah, dan penghitung penjualan ikut di transaksi yang sama
                 update_query = """
                     UPDATE tickets 
                     SET deleted_by = %s, deleted_at = %s
-                    WHERE id = %s
+                    WHERE id = %s AND deleted_at IS NULL
                 """
-                cursor.execute(update_query, (user_id, datetime.now(), ticket_id))
-                connection.commit()
-
-                if cursor.rowcount > 0:
+                connection.start_transaction()
+                try:
+                    result = prepared_statements.execute(connection, cursor, update_query,
+                                                         (user_id, datetime.now(), ticket_id))
+                    validated = result.rowcount > 0
+                    if validated:
+                        record_validations(cursor, event_id, [package_id], connection)
+                    connection.commit()
+                except Exception:
+                    connection.rollback()
+                    raise
+
+                if validated:
+                    signals.tickets_validated.send(current_app._get_current_object(), event_id=event_id,
+                                                   ticket_ids=[int(ticket_id)], owner_ids=[ticket_owner_id])
                     return jsonify({"message": "Ticket successfully validated."}), 200
                 else:
-                    return jsonify({"message": "Failed to validate ticket."}), 500
+                    return jsonify({"message": "This ticket has already been validated."}), 400
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@tickets_endpoints.route('/validate-tickets/<int:event_id>', methods=['POST'])
+@jwt_required()
+@idempotent(idempotency_store)
+def validate_tickets_batch(event_id):
+    """Endpoint for gate scanners to validate a batch of tickets of one event."""
+    try:
+        current_user = get_jwt_identity()
+        user_id = current_user['id']
+        # ticket_id dikirim berulang, satu per hasil scan
+        raw_ticket_ids = request.form.getlist('ticket_id')
+
+        if not raw_ticket_ids:
+            return jsonify({"message": "You must provide at least one ticket_id."}), 400
+
+        limit = current_app.config['VALIDATE_BATCH_LIMIT']
+        if len(raw_ticket_ids) > limit:
+            return jsonify({"message": f"At most {limit} tickets can be validated per request."}), 400
+
+        try:
+            ticket_ids = [int(ticket_id) for ticket_id in raw_ticket_ids]
+        except ValueError:
+            return jsonify({"message": "Every ticket_id must be a number."}), 400
+
+        # Hak panitia cukup dicek sekali untuk seluruh batch
+        if not membership_cache.is_committee_member(user_id, event_id):
+            return jsonify({"message": "You are not authorized to validate tickets of this event."}), 403
+
+        with get_connection() as connection:
+            results = validate_tickets(connection, user_id, event_id, ticket_ids)
+
+        send_validated(event_id, results)
+
+        validated = sum(1 for result in results if result["status"] == "ok")
+        return jsonify({
+            "message": f"{validated} of {len(results)} ticket(s) validated.",
+            "results": results
+        }), 200
+
+    except Exception as e:
+        current_app.logger.error(f"Unexpected error: {e}")
+        return jsonify({"message": "An unexpected error occurred.", "error": str(e)}), 500
+
+@tickets_endpoints.route('/code/<int:ticket_id>', methods=['GET'])
+@jwt_required()
+def get_ticket_code(ticket_id):
+    """Endpoint for a ticket owner to get the signed code shown in the ticket's QR."""
+    try:
+        current_user = get_jwt_identity()
+        user_id = current_user['id']
+
+        with get_connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute("""
+                    SELECT t.user_id, t.package_id, p.id_acara
+                    FROM tickets t
+                    JOIN packages p ON t.package_id = p.id
+                    WHERE t.id = %s
+                """, (ticket_id,))
+                result = cursor.fetchone()
+
+        if not result:
+            return jsonify({"message": "Ticket not found."}), 404
+
+        ticket_owner_id, package_id, event_id = result
+        if ticket_owner_id != user_id:
+            return jsonify({"message": "You are not the owner of this ticket."}), 403
+
+        key = event_key(current_app.config['TICKET_CODE_SECRET'], event_id)
+        return jsonify({
+            "ticket_id": ticket_id,
+            "event_id": event_id,
+            "package_id": package_id,
+            "code": sign_ticket(key, ticket_id, event_id, package_id)
+        }), 200
+
+    except Exception as e:
+        current_app.logger.error(f"Unexpected error: {e}")
+        return jsonify({"message": "An unexpected error occurred.", "error": str(e)}), 500
+
+@tickets_endpoints.route('/scanner-key/<int:event_id>', methods=['GET'])
+@jwt_required()
+def get_scanner_key(event_id):
+    """Endpoint for committee members to download the key that verifies ticket codes offline."""
+    try:
+        current_user = get_jwt_identity()
+        user_id = current_user['id']
+
+        if not membership_cache.is_committee_member(user_id, event_id):
+            return jsonify({"message": "You are not a committee member of this event."}), 403
+
+        key = event_key(current_app.config['TICKET_CODE_SECRET'], event_id)
+        return jsonify({
+            "event_id": event_id,
+            "algorithm": "HMAC-SHA256",
+            "mac_bytes": MAC_SIZE,
+            "key": key.hex()
+        }), 200
+
+    except Exception as e:
+        current_app.logger.error(f"Unexpected error: {e}")
+        return jsonify({"message": "An unexpected error occurred.", "error": str(e)}), 500
+
+@tickets_endpoints.route('/sync-checkins/<int:event_id>', methods=['POST'])
+@jwt_required()
+@idempotent(idempotency_store)
+def sync_checkins(event_id):
+    """Endpoint for scanners to upload check-ins that were recorded offline."""
+    try:
+        current_user = get_jwt_identity()
+        user_id = current_user['id']
+        # code dan scanned_at dikirim berpasangan, satu pasang per scan offline
+        codes = request.form.getlist('code')
+        scanned_times = request.form.getlist('scanned_at')
+
+        if not codes:
+            return jsonify({"message": "You must provide at least one code."}), 400
+
+        if scanned_times and len(scanned_times) != len(codes):
+            return jsonify({"message": "Every code needs a matching scanned_at."}), 400
+
+        limit = current_app.config['VALIDATE_BATCH_LIMIT']
+        if len(codes) > limit:
+            return jsonify({"message": f"At most {limit} check-ins can be synced per request."}), 400
+
+        now = datetime.now()
+        key = event_key(current_app.config['TICKET_CODE_SECRET'], event_id)
+        rejected = {}
+        ticket_ids = []
+        scanned_at = {}
+
+        for index, code in enumerate(codes):
+            try:
+                ticket_id, _, _ = verify_ticket_code(key, code)
+            except InvalidTicketCode:
+                rejected[index] = {"code": code, "ticket_id": None, "status": "invalid_code", "validated_at": None}
+                continue
+
+            try:
+                scanned = datetime.fromisoformat(scanned_times[index]) if scanned_times else now
+            except ValueError:
+                return jsonify({"message": f"Invalid scanned_at: {scanned_times[index]}"}), 400
+            if scanned.tzinfo is not None:
+                # Converted, not cut off: stored times are the server's local time (datetime.now())
+                scanned = scanned.astimezone().replace(tzinfo=None)
+
+            ticket_ids.append(ticket_id)
+            # Scan pertama yang menang; waktu di masa depan dipotong ke sekarang
+            scanned_at.setdefault(ticket_id, min(scanned, now))
+
+        if not membership_cache.is_committee_member(user_id, event_id):
+            return jsonify({"message": "You are not authorized to validate tickets of this event."}), 403
+
+        with get_connection() as connection:
+            validated = validate_tickets(connection, user_id, event_id, ticket_ids, scanned_at) if ticket_ids else []
+
+        send_validated(event_id, validated)
+
+        # Gabungkan kembali hasil sesuai urutan upload
+        results = []
+        validated = iter(validated)
+        for index, code in enumerate(codes):
+            if index in rejected:
+                results.append(rejected[index])
+            else:
+                results.append(dict(next(validated), code=code))
+
+        return jsonify({
+            "synced": sum(1 for result in results if result["status"] == "ok"),
+            "double_scans": [result for result in results if result["status"] == "already_used"],
+            "results": results
+        }), 200
+
+    except Exception as e:
+        current_app.logger.error(f"Unexpected error: {e}")
+        return jsonify({"message": "An unexpected error occurred.", "error": str(e)}), 500
+
 @tickets_endpoints.route('/transfer_ticket', methods=['POST'])
 @jwt_required()
+@idempotent(idempotency_store)
 def transfer_ticket():
     """Endpoint to transfer a ticket from one user to another."""
     try:
@@ -350,16 +824,17 @@ def transfer_ticket():
         with get_connection() as connection:
             with connection.cursor() as cursor:
                 cursor.execute("""
-                    SELECT user_id, deleted_at 
-                    FROM tickets 
-                    WHERE id = %s
+                    SELECT t.user_id, t.deleted_at, p.id_acara
+                    FROM tickets t
+                    JOIN packages p ON t.package_id = p.id
+                    WHERE t.id = %s
                 """, (ticket_id,))
                 result = cursor.fetchone()
 
                 if not result:
                     return jsonify({"message": "Ticket not found."}), 404
 
-                ticket_owner_id, deleted_at = result
+                ticket_owner_id, deleted_at, event_id = result
                 
                 if ticket_owner_id != current_user_id:
                     return jsonify({"message": "You are not the owner of this ticket."}), 403
@@ -382,6 +857,8 @@ def transfer_ticket():
                 """, (new_user_id, ticket_id))
                 connection.commit()
 
+        signals.ticket_transferred.send(current_app._get_current_object(), event_id=event_id, ticket_id=int(ticket_id),
+                                        from_user_id=current_user_id, to_user_id=new_user_result[0])
         return jsonify({"message": "Ticket transferred successfully."}), 200
 
     except Exception as e:
@@ -406,23 +883,38 @@ def delete_ticket():
         with get_connection() as connection:
             with connection.cursor() as cursor:
                 # Cek apakah tiket ada dan milik pengguna saat ini
-                cursor.execute("""
-                    SELECT user_id FROM tickets WHERE id = %s
-                """, (ticket_id,))
-                result = cursor.fetchone()
-
-                if not result:
-                    return jsonify({"message": "Ticket not found."}), 404
-
-                ticket_owner_id = result[0]
-
-                if ticket_owner_id != current_user_id:
-                    return jsonify({"message": "You are not the owner of this ticket."}), 403
-
-                # Hapus tiket secara permanen dari database
-                cursor.execute("DELETE FROM tickets WHERE id = %s", (ticket_id,))
-                connection.commit()
-
+                # Baris tiket dikunci sampai commit, supaya status terpakai yang dihitung tidak berubah
+                connection.start_transaction()
+                try:
+                    cursor.execute("""
+                        SELECT t.user_id, p.id_acara, t.package_id, t.deleted_at, t.price
+                        FROM tickets t
+                        JOIN packages p ON t.package_id = p.id
+                        WHERE t.id = %s
+                        FOR UPDATE
+                    """, (ticket_id,))
+                    result = cursor.fetchone()
+
+                    if not result:
+                        connection.rollback()
+                        return jsonify({"message": "Ticket not found."}), 404
+
+                    ticket_owner_id, event_id, package_id, deleted_at, price = result
+
+                    if ticket_owner_id != current_user_id:
+                        connection.rollback()
+                        return jsonify({"message": "You are not the owner of this ticket."}), 403
+
+                    # Hapus tiket secara permanen dari database
+                    cursor.execute("DELETE FROM tickets WHERE id = %s", (ticket_id,))
+                    record_deletion(cursor, event_id, package_id, deleted_at is not None, price)
+                    connection.commit()
+                except Exception:
+                    connection.rollback()
+                    raise
+
+        signals.ticket_deleted.send(current_app._get_current_object(), event_id=event_id,
+                                    ticket_id=int(ticket_id), user_id=current_user_id)
         return jsonify({"message": "Ticket deleted permanently."}), 200
 
     except Exception as e:
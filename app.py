@@ -3,7 +3,8 @@
 from flask import Flask
 from flask_cors import CORS
 from dotenv import load_dotenv
-from extensions import jwt
+from extensions import (jwt, waiting_room, hold_sweeper, idempotency_store, membership_cache, count_cache,
+                        attendee_index, response_cache, live_feed, db_instrumentation, metrics, profiler)
 # from api.books.endpoints import books_endpoints
 from LATIHAN.authors.endpoints import authors_endpoints
 from api.auth.endpoints import auth_endpoints
@@ -15,6 +16,9 @@ from api.committee.endpoints import committee_endpoints
 from api.data_protected.endpoints import protected_endpoints
 from config import Config
 from static.static_file_server import static_file_server
+from helper.sales_summary import sales_cli
+from helper.db_helper import db_router
+from helper.ticket_code import require_secret
 
 
 # Load environment variables from the .env file
@@ -22,10 +26,23 @@ load_dotenv()
 
 app = Flask(__name__)
 app.config.from_object(Config)
+require_secret(app)
 CORS(app)
 
 
 jwt.init_app(app)
+waiting_room.init_app(app)
+hold_sweeper.init_app(app)
+idempotency_store.init_app(app)
+membership_cache.init_app(app)
+count_cache.init_app(app)
+attendee_index.init_app(app)
+response_cache.init_app(app)
+live_feed.init_app(app)
+db_router.init_app(app)
+db_instrumentation.init_app(app)
+metrics.init_app(app)
+profiler.init_app(app)
 
 # register the blueprint
 app.register_blueprint(auth_endpoints, url_prefix='/api/v1/auth')
@@ -40,5 +57,8 @@ app.register_blueprint(tickets_endpoints, url_prefix='/api/v1/tickets')
 app.register_blueprint(committee_endpoints, url_prefix='/api/v1/committee')
 app.register_blueprint(static_file_server, url_prefix='/static/')
 
+# flask sales rebuild [--event ID]
+app.cli.add_command(sales_cli)
+
 if __name__ == '__main__':
     app.run(debug=True)
@@ -0,0 +1,37 @@
+"""Optional asyncio serving mode
+
+The public read endpoints listed in helper/async_reads.py run on an async
+MySQL pool (aiomysql); everything else is the regular Flask app. Needs:
+
+    pip install aiomysql asgiref uvicorn
+    uvicorn asgi:application --workers 2
+"""
+import os
+
+import aiomysql
+from asgiref.wsgi import WsgiToAsgi
+from flask_cors.core import get_cors_options
+
+from app import app
+from extensions import response_cache, db_instrumentation, metrics, count_cache
+from helper.async_reads import AsyncReadApp
+
+
+async def create_pool():
+    """Async connection pool, configured like the sync one"""
+    return await aiomysql.create_pool(
+        host=os.environ.get('DB_HOST', 'localhost'),
+        user=os.environ.get('DB_USER'),
+        password=os.environ.get('DB_PASSWORD', ''),
+        db=os.environ.get('DB_NAME'),
+        minsize=1,
+        maxsize=app.config['ASYNC_POOL_SIZE'],
+        autocommit=True
+    )
+
+
+# The async routes bypass Flask, so they get the app's cache, instrumentation,
+# metrics and CORS settings (CORS(app) in app.py) handed over here
+application = AsyncReadApp(create_pool, WsgiToAsgi(app), response_cache=response_cache,
+                           instrumentation=db_instrumentation, metrics=metrics,
+                           cors_options=get_cors_options(app), count_cache=count_cache)
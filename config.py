@@ -11,3 +11,80 @@ class Config:
     JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY', 'supersecretjwtkey')
     JWT_ACCESS_TOKEN_EXPIRES = os.getenv(
         'JWT_ACCESS_TOKEN_EXPIRES', timedelta(seconds=int(3600)))
+    # Seconds an admitted waiting-room token may be used to buy tickets
+    WAITING_ROOM_ADMISSION_TTL = int(os.getenv('WAITING_ROOM_ADMISSION_TTL', '300'))
+    # Where queues live: 'mysql' (shared by all workers, stuff/migrations/007_waiting_rooms.sql)
+    # or 'memory' (single worker process only; other workers would not gate purchases)
+    WAITING_ROOM_STORE = os.getenv('WAITING_ROOM_STORE', 'mysql')
+    # Ticket holds: how long a hold lives, live holds allowed per user and package,
+    # and how the expiry sweeper runs (it starts with the first request served)
+    HOLD_TTL = int(os.getenv('HOLD_TTL', '600'))
+    HOLD_MAX_PER_USER = int(os.getenv('HOLD_MAX_PER_USER', '2'))
+    HOLD_SWEEP_INTERVAL = int(os.getenv('HOLD_SWEEP_INTERVAL', '30'))
+    HOLD_SWEEP_BATCH = int(os.getenv('HOLD_SWEEP_BATCH', '500'))
+    HOLD_SWEEPER_ENABLED = os.getenv('HOLD_SWEEPER_ENABLED', '1') == '1'
+    # Stored responses for Idempotency-Key replays
+    IDEMPOTENCY_TTL = int(os.getenv('IDEMPOTENCY_TTL', '86400'))
+    IDEMPOTENCY_MAX_KEYS = int(os.getenv('IDEMPOTENCY_MAX_KEYS', '10000'))
+    # Maximum number of scans accepted by one batch validation request
+    VALIDATE_BATCH_LIMIT = int(os.getenv('VALIDATE_BATCH_LIMIT', '500'))
+    # Secret behind the per-event keys that sign ticket QR codes; required
+    # outside debug mode (see helper.ticket_code.require_secret)
+    TICKET_CODE_SECRET = os.getenv('TICKET_CODE_SECRET', '')
+    # Seconds committee membership / event owner lookups stay cached
+    MEMBERSHIP_CACHE_TTL = int(os.getenv('MEMBERSHIP_CACHE_TTL', '60'))
+    # Listing totals: how long an exact count is reused, and how old a count
+    # may be when served as an estimate (?count=approx)
+    COUNT_CACHE_TTL = int(os.getenv('COUNT_CACHE_TTL', '300'))
+    COUNT_CACHE_STALE_TTL = int(os.getenv('COUNT_CACHE_STALE_TTL', '3600'))
+    # Set to 1 when the app runs as a single process: cached counts are then
+    # reported as exact, since every change invalidates them (see helper/count_cache.py)
+    COUNT_CACHE_SINGLE_PROCESS = os.getenv('COUNT_CACHE_SINGLE_PROCESS', '0') == '1'
+    # Per-event attendee search index: lifetime, events kept in memory, and the
+    # number of matching users above which the search falls back to LIKE
+    ATTENDEE_INDEX_TTL = int(os.getenv('ATTENDEE_INDEX_TTL', '600'))
+    ATTENDEE_INDEX_MAX_EVENTS = int(os.getenv('ATTENDEE_INDEX_MAX_EVENTS', '100'))
+    ATTENDEE_INDEX_MAX_MATCHES = int(os.getenv('ATTENDEE_INDEX_MAX_MATCHES', '1000'))
+    # Rows fetched per round trip by the streaming attendee export
+    EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', '1000'))
+    # Cached public GET responses (events, event detail, packages): on/off,
+    # entries kept, their lifetime, and the max-age sent to clients
+    RESPONSE_CACHE_ENABLED = os.getenv('RESPONSE_CACHE_ENABLED', '1') == '1'
+    RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', '2000'))
+    RESPONSE_CACHE_TTL = int(os.getenv('RESPONSE_CACHE_TTL', '300'))
+    RESPONSE_CACHE_MAX_AGE = int(os.getenv('RESPONSE_CACHE_MAX_AGE', '0'))
+    # Where tag versions live: 'mysql' (shared by all workers, stuff/migrations/008_cache_versions.sql)
+    # or 'memory' (single worker process only; other workers would serve outdated responses)
+    RESPONSE_CACHE_STORE = os.getenv('RESPONSE_CACHE_STORE', 'mysql')
+    # Live dashboards (SSE): seconds between keep-alive comments, and messages
+    # buffered per listener before a slow one is disconnected
+    LIVE_FEED_HEARTBEAT = int(os.getenv('LIVE_FEED_HEARTBEAT', '15'))
+    LIVE_FEED_QUEUE_SIZE = int(os.getenv('LIVE_FEED_QUEUE_SIZE', '100'))
+    # Every open dashboard holds a worker thread for as long as it is open: keep
+    # this well below the threads per worker so purchases are never starved
+    LIVE_FEED_MAX_STREAMS = int(os.getenv('LIVE_FEED_MAX_STREAMS', '8'))
+    # Seconds a stream token (POST /tickets/live/<event_id>/token) can be used to connect
+    LIVE_FEED_TOKEN_TTL = int(os.getenv('LIVE_FEED_TOKEN_TTL', '60'))
+    # Connections of the async pool used by asgi.py (one request in flight per connection)
+    ASYNC_POOL_SIZE = int(os.getenv('ASYNC_POOL_SIZE', '20'))
+    # Query count / DB time per request (Server-Timing header) and the slow-query log threshold
+    DB_INSTRUMENTATION_ENABLED = os.getenv('DB_INSTRUMENTATION_ENABLED', '1') == '1'
+    DB_SLOW_QUERY_MS = float(os.getenv('DB_SLOW_QUERY_MS', '200'))
+    # Prometheus metrics on /metrics. With several worker processes set METRICS_DIR to a
+    # directory shared by them (emptied on each deploy). /metrics is only served once
+    # METRICS_TOKEN is set, and scrapers must send it as a bearer token: the metrics show
+    # every route, error rates and ticket sales, so they must not be public
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', '1') == '1'
+    METRICS_DIR = os.getenv('METRICS_DIR', '')
+    METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', '5'))
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+    # Sampling profiler (opt-in): share of requests sampled, sampling interval, token for the
+    # X-Profile-Token header that forces one request to be profiled, optional output directory.
+    # Distinct stacks kept in memory (further new ones are dropped), seconds between writes to the directory
+    PROFILER_ENABLED = os.getenv('PROFILER_ENABLED', '0') == '1'
+    PROFILER_SAMPLE_RATE = float(os.getenv('PROFILER_SAMPLE_RATE', '0.01'))
+    PROFILER_INTERVAL_MS = float(os.getenv('PROFILER_INTERVAL_MS', '5'))
+    PROFILER_TOKEN = os.getenv('PROFILER_TOKEN', '')
+    PROFILER_DIR = os.getenv('PROFILER_DIR', '')
+    PROFILER_MAX_STACKS = int(os.getenv('PROFILER_MAX_STACKS', '20000'))
+    PROFILER_WRITE_INTERVAL = float(os.getenv('PROFILER_WRITE_INTERVAL', '60'))
@@ -1,4 +1,26 @@
 """Add jwt extension"""
 from flask_jwt_extended import JWTManager
+from helper.waiting_room import WaitingRoom
+from helper.ticket_holds import HoldSweeper
+from helper.idempotency import InMemoryIdempotencyStore
+from helper.membership_cache import MembershipCache
+from helper.count_cache import CountCache
+from helper.attendee_index import AttendeeIndex
+from helper.response_cache import ResponseCache
+from helper.live_feed import LiveFeed
+from helper.db_instrumentation import QueryInstrumentation
+from helper.metrics import Metrics
+from helper.profiler import RequestProfiler
 
 jwt = JWTManager()
+waiting_room = WaitingRoom()
+hold_sweeper = HoldSweeper()
+idempotency_store = InMemoryIdempotencyStore()
+membership_cache = MembershipCache()
+count_cache = CountCache()
+attendee_index = AttendeeIndex()
+response_cache = ResponseCache()
+live_feed = LiveFeed()
+db_instrumentation = QueryInstrumentation()
+metrics = Metrics()
+profiler = RequestProfiler()
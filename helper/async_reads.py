@@ -0,0 +1,350 @@
+"""Async handlers for the public read endpoints, served by the ASGI entry point (asgi.py)"""
+import asyncio
+import dataclasses
+import json
+import logging
+import re
+import time
+from contextlib import asynccontextmanager
+from datetime import date
+from decimal import Decimal
+from typing import Callable, Optional, Tuple
+from urllib.parse import parse_qsl
+
+from werkzeug.datastructures import Headers
+from werkzeug.http import http_date
+
+from helper import ticket_listing
+from helper.count_cache import COUNT_MODES, CountCache, estimate_from_plan, event_tickets_scope
+from helper.event_detail import InvalidInclude, detail_payload, detail_query, parse_includes
+from helper.pagination import InvalidCursor
+from helper.response_cache import event_tag, packages_tag
+
+logger = logging.getLogger(__name__)
+
+
+def _json_default(value):
+    # Same conversions as Flask's jsonify, so both paths return the same body
+    if isinstance(value, date):
+        return http_date(value)
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def json_response(body, status=200):
+    """(status, headers, body bytes) of a JSON response, encoded like Flask's jsonify"""
+    payload = (json.dumps(body, default=_json_default, sort_keys=True, separators=(",", ":")) + "\n").encode()
+    return status, [(b"content-type", b"application/json"), (b"content-length", str(len(payload)).encode())], payload
+
+
+class _TimedCursor:
+    """aiomysql cursor reporting every execute() to the QueryInstrumentation"""
+
+    def __init__(self, cursor, instrumentation):
+        self._cursor = cursor
+        self._instrumentation = instrumentation
+
+    async def execute(self, query, params=None):
+        started = time.perf_counter()
+        try:
+            return await self._cursor.execute(query, params)
+        finally:
+            if self._instrumentation is not None:
+                self._instrumentation.record_query(query, params, time.perf_counter() - started)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+async def fetch_one(reads, query, params):
+    """First row of a query, on a connection of the async pool"""
+    async with reads.cursor() as cursor:
+        await cursor.execute(query, params)
+        return await cursor.fetchone()
+
+
+async def count(count_cache, cursor, scope, count_query, params, mode="exact"):
+    """`CountCache.count` on an async cursor; same cache, same modes"""
+    if mode == "none":
+        return None, False
+    hit = count_cache.cached(scope, count_query, params, mode)
+    if hit is not None:
+        return hit
+    if mode == "approx":
+        await cursor.execute(f"EXPLAIN {count_query}", tuple(params))
+        estimate = estimate_from_plan(cursor.description, await cursor.fetchall())
+        if estimate is not None:
+            return estimate, True
+    await cursor.execute(count_query, tuple(params))
+    total = (await cursor.fetchone())[0]
+    count_cache.remember(scope, count_query, params, total)
+    return total, False
+
+
+async def get_event(reads, query_string, event_id):
+    """Async twin of GET /events/events/<event_id>"""
+    row = await fetch_one(reads, detail_query([]), (event_id,))
+    if not row:
+        return json_response({"message": "Event not found"}, 404)
+    return json_response(detail_payload(row, []))
+
+
+async def get_event_detail(reads, query_string, event_id):
+    """Async twin of GET /events/detail/<event_id>"""
+    try:
+        sections = parse_includes(query_string.get("include"))
+    except InvalidInclude as e:
+        return json_response({"message": str(e)}, 400)
+    row = await fetch_one(reads, detail_query(sections), (event_id,))
+    if not row:
+        return json_response({"message": "Event not found"}, 404)
+    return json_response(detail_payload(row, sections))
+
+
+async def get_packages(reads, query_string, event_id):
+    """Async twin of GET /packages/get/<id_acara>"""
+    row = await fetch_one(reads, detail_query(["packages"]), (event_id,))
+    packages = detail_payload(row, ["packages"])["packages"] if row else []
+    return json_response({"event_id": event_id, "packages": packages})
+
+
+async def get_committees(reads, query_string, event_id):
+    """Async twin of GET /committee/list/<event_id>"""
+    row = await fetch_one(reads, detail_query(["committees"]), (event_id,))
+    committees = detail_payload(row, ["committees"])["committees"] if row else []
+    return json_response({"committees": committees})
+
+
+async def get_event_tickets(reads, query_string, event_id):
+    """Async twin of GET /tickets/tickets/<event_id>, without `search` (that one stays on Flask)"""
+    page = int(query_string.get("page", 1))
+    per_page = int(query_string.get("per_page", 10))
+    count_mode = query_string.get("count", "exact")
+    if count_mode not in COUNT_MODES:
+        return json_response({"message": f"'count' must be one of: {', '.join(COUNT_MODES)}."}, 400)
+
+    filter_clause = ticket_listing.FROM_CLAUSE + ticket_listing.status_filter_clause(query_string.get("status", ""))
+    filter_params = [event_id]
+    try:
+        query, params = ticket_listing.page_query(filter_clause, filter_params, page, per_page,
+                                                  query_string.get("after"))
+    except InvalidCursor as e:
+        return json_response({"message": str(e)}, 400)
+
+    async with reads.cursor() as cursor:
+        await cursor.execute(query, params)
+        results = await cursor.fetchall()
+        total_count, count_is_estimate = await count(
+            reads.count_cache, cursor, event_tickets_scope(event_id), "SELECT COUNT(*)" + filter_clause,
+            filter_params, count_mode)
+    return json_response(ticket_listing.listing_payload(results, total_count, count_is_estimate, page, per_page))
+
+
+@dataclasses.dataclass(frozen=True)
+class AsyncRoute:
+    """
+    A Flask route answered by an async handler.
+
+    `blueprint` and `rule` are the Flask blueprint and URL rule, so metrics
+    land in the same series; `tags` are the response cache tags of the
+    Flask view (None when it is not cached); a request carrying one of the
+    `sync_params` is left to Flask.
+    """
+    pattern: "re.Pattern"
+    handler: Callable
+    blueprint: str
+    rule: str
+    tags: Optional[Callable] = None
+    sync_params: Tuple[str, ...] = ()
+
+
+ROUTES = [
+    AsyncRoute(re.compile(r"^/api/v1/events/events/(\d+)$"), get_event, "events",
+               "/api/v1/events/events/<int:event_id>", lambda event_id: [event_tag(event_id)]),
+    AsyncRoute(re.compile(r"^/api/v1/events/detail/(\d+)$"), get_event_detail, "events",
+               "/api/v1/events/detail/<int:event_id>"),
+    AsyncRoute(re.compile(r"^/api/v1/packages/get/(\d+)$"), get_packages, "packages",
+               "/api/v1/packages/get/<int:id_acara>", lambda event_id: [packages_tag(event_id)]),
+    AsyncRoute(re.compile(r"^/api/v1/committee/list/(\d+)$"), get_committees, "committee",
+               "/api/v1/committee/list/<int:event_id>"),
+    # Search goes through the in-process attendee index, which uses a sync connection
+    AsyncRoute(re.compile(r"^/api/v1/tickets/tickets/(\d+)$"), get_event_tickets, "tickets",
+               "/api/v1/tickets/tickets/<int:event_id>", sync_params=("search",)),
+]
+
+
+def match_route(method, path):
+    """(AsyncRoute, event_id) for an async route, or None"""
+    if method != "GET":
+        return None
+    for route in ROUTES:
+        match = route.pattern.match(path)
+        if match:
+            return route, int(match.group(1))
+    return None
+
+
+def _query_string(scope):
+    return dict(parse_qsl(scope.get("query_string", b"").decode("latin-1"), keep_blank_values=True))
+
+
+def _encode_headers(headers):
+    return [(name.lower().encode("latin-1"), str(value).encode("latin-1")) for name, value in headers]
+
+
+class AsyncReadApp:
+    """
+    ASGI app answering the routes in ROUTES on an async DB pool.
+
+    A request on one of them waits on MySQL without holding a thread, so a
+    single worker keeps many of them in flight. Every other request, and
+    every non-GET, goes to `fallback` (the Flask app wrapped for ASGI).
+
+    These requests never reach Flask, so the app applies what Flask would
+    have added itself: the response cache with its ETag and Cache-Control,
+    CORS headers, the Server-Timing of the queries and the request metrics,
+    using the same objects as the Flask app.
+
+    Args:
+        create_pool: Coroutine function returning the async pool; called on
+            lifespan startup, or on the first request without lifespan.
+        fallback: ASGI app for everything else.
+        response_cache: ResponseCache of the Flask app.
+        instrumentation: QueryInstrumentation of the Flask app.
+        metrics: Metrics of the Flask app.
+        cors_options: flask_cors options of the Flask app
+            (`flask_cors.core.get_cors_options(app)`); None for no CORS headers.
+        count_cache: CountCache of the Flask app, so both paths share counts
+            and their invalidation.
+    """
+
+    def __init__(self, create_pool, fallback, response_cache=None, instrumentation=None, metrics=None,
+                 cors_options=None, count_cache=None):
+        self.create_pool = create_pool
+        self.fallback = fallback
+        self.response_cache = response_cache
+        self.instrumentation = instrumentation
+        self.metrics = metrics
+        self.cors_options = cors_options
+        self.count_cache = count_cache or CountCache()
+        self.pool = None
+        self._pool_lock = None
+
+    async def get_pool(self):
+        """The async pool, created once even when the first requests arrive together"""
+        if self.pool is None:
+            # Created here rather than in __init__ so it belongs to the running loop;
+            # nothing is awaited between the check and the assignment
+            if self._pool_lock is None:
+                self._pool_lock = asyncio.Lock()
+            async with self._pool_lock:
+                if self.pool is None:
+                    self.pool = await self.create_pool()
+        return self.pool
+
+    @asynccontextmanager
+    async def cursor(self):
+        """Cursor on a connection of the async pool; the checkout wait counts as db-pool time"""
+        pool = await self.get_pool()
+        instrumentation = self._instrumentation()
+        started = time.perf_counter()
+        async with pool.acquire() as connection:
+            if instrumentation is not None:
+                instrumentation.record_checkout(time.perf_counter() - started)
+            async with connection.cursor() as cursor:
+                yield _TimedCursor(cursor, instrumentation)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self._lifespan(receive, send)
+
+        matched = match_route(scope.get("method"), scope.get("path", "")) if scope["type"] == "http" else None
+        query_string = _query_string(scope) if matched else {}
+        if matched is None or any(query_string.get(name) for name in matched[0].sync_params):
+            return await self.fallback(scope, receive, send)
+
+        route, event_id = matched
+        request_headers = Headers([(name.decode("latin-1"), value.decode("latin-1"))
+                                   for name, value in scope.get("headers", [])])
+        metrics = self.metrics if self.metrics is not None and self.metrics.enabled else None
+        instrumentation = self._instrumentation()
+        started = time.perf_counter()
+        if metrics is not None:
+            metrics.in_flight.inc(blueprint=route.blueprint)
+        token = instrumentation.begin_async(scope["method"], scope["path"]) if instrumentation else None
+        try:
+            status, headers, body = await self._respond(route, event_id, scope, query_string, request_headers)
+        except Exception as e:
+            logger.error(f"Unexpected error: {e}")
+            status, headers, body = json_response({"message": "An unexpected error occurred.", "error": str(e)}, 500)
+        finally:
+            server_timing = instrumentation.end_async(token) if instrumentation else None
+            if metrics is not None:
+                metrics.in_flight.dec(blueprint=route.blueprint)
+
+        if server_timing:
+            headers.append((b"server-timing", server_timing.encode("latin-1")))
+        if self.cors_options is not None:
+            # Imported here so the handlers can be used without flask_cors
+            from flask_cors.core import get_cors_headers
+            headers += _encode_headers(get_cors_headers(self.cors_options, request_headers, "GET").items(multi=True))
+        if metrics is not None:
+            metrics.observe_request(route.blueprint, route.rule, "GET", status, time.perf_counter() - started)
+
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+
+    async def _respond(self, route, event_id, scope, query_string, request_headers):
+        cache = self.response_cache
+        if route.tags is None or cache is None or not cache.enabled:
+            return await route.handler(self, query_string, event_id)
+
+        # Same key as ResponseCache.cached, so Flask and the async path share entries
+        full_path = f"{scope['path']}?{scope.get('query_string', b'').decode('latin-1')}"
+        tags = route.tags(event_id)
+        key = cache.key(full_path, tags, await self._versions(cache.store, tags))
+        entry = cache.store.get(key)
+        if entry is None:
+            status, headers, body = await route.handler(self, query_string, event_id)
+            if status != 200:
+                return status, headers, body
+            entry = cache.remember(key, body, "application/json")
+
+        if cache.not_modified(entry, request_headers.get("If-None-Match")):
+            status, body, headers = 304, b"", []
+        else:
+            status, body = 200, entry["body"]
+            headers = [("Content-Type", entry["mimetype"]), ("Content-Length", len(body))]
+        return status, _encode_headers(headers + list(cache.headers(entry).items())), body
+
+    async def _versions(self, store, tags):
+        # A shared store (MySQLResponseStore) is read on the async pool, not on a blocking connection
+        if not hasattr(store, "versions_query"):
+            return store.versions(tags)
+        query, params = store.versions_query(tags)
+        async with self.cursor() as cursor:
+            await cursor.execute(query, params)
+            return store.versions_from_rows(tags, await cursor.fetchall())
+
+    def _instrumentation(self):
+        if self.instrumentation is not None and self.instrumentation.enabled:
+            return self.instrumentation
+        return None
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                try:
+                    await self.get_pool()
+                except Exception as e:
+                    await send({"type": "lifespan.startup.failed", "message": str(e)})
+                    return
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                if self.pool is not None:
+                    self.pool.close()
+                    await self.pool.wait_closed()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
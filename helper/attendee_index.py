@@ -0,0 +1,182 @@
+"""In-process lookup of an event's ticket holders by username or email"""
+import threading
+from collections import defaultdict
+
+from helper import signals
+from helper.ttl_cache import TTLCache
+
+GRAM_SIZE = 3
+
+HOLDERS_QUERY = """
+    SELECT t.user_id, u.username, u.email, COUNT(*)
+    FROM tickets t
+    JOIN packages p ON t.package_id = p.id
+    JOIN user u ON t.user_id = u.id
+    WHERE p.id_acara = %s
+    GROUP BY t.user_id, u.username, u.email
+"""
+
+
+def grams(text):
+    """Every substring of `text` up to GRAM_SIZE characters long"""
+    return {text[start:start + size]
+            for size in range(1, GRAM_SIZE + 1)
+            for start in range(len(text) - size + 1)}
+
+
+class EventAttendees:
+    """
+    Ticket holders of one event with an n-gram index over username and email.
+
+    Every 1, 2 and 3 character substring points to the users containing it,
+    so a search intersects the postings of the query's grams and only checks
+    the few users left. Holders bought or received through a transfer after
+    the build are kept as pending IDs until their name is looked up.
+    """
+
+    def __init__(self, rows):
+        self.tickets = {}  # user_id -> number of tickets held
+        self.names = {}  # user_id -> "username email" (lowercase)
+        self.postings = defaultdict(set)  # gram -> user_ids
+        self.pending = set()
+        self.lock = threading.Lock()
+        for user_id, username, email, count in rows:
+            self.tickets[user_id] = count
+            self._index(user_id, username, email)
+
+    def _index(self, user_id, username, email):
+        self.names[user_id] = f"{username or ''} {email or ''}".lower()
+        for gram in grams((username or "").lower()) | grams((email or "").lower()):
+            self.postings[gram].add(user_id)
+
+    def add_tickets(self, user_id, count):
+        """Count tickets received by a user; unknown users are resolved on the next search"""
+        with self.lock:
+            self.tickets[user_id] = self.tickets.get(user_id, 0) + count
+            if user_id not in self.names:
+                self.pending.add(user_id)
+
+    def remove_tickets(self, user_id, count):
+        """Count tickets that left a user; users without tickets drop out of the results"""
+        with self.lock:
+            if user_id in self.tickets:
+                self.tickets[user_id] -= count
+                if self.tickets[user_id] <= 0:
+                    del self.tickets[user_id]
+
+    def resolve_pending(self, cursor):
+        """Look up username and email of the users added since the last search"""
+        with self.lock:
+            pending = list(self.pending)
+        if not pending:
+            return
+        placeholders = ", ".join(["%s"] * len(pending))
+        cursor.execute(f"SELECT id, username, email FROM user WHERE id IN ({placeholders})", pending)
+        rows = cursor.fetchall()
+        with self.lock:
+            for user_id, username, email in rows:
+                if user_id not in self.names:
+                    self._index(user_id, username, email)
+            self.pending.difference_update(pending)
+
+    def search(self, text):
+        """IDs of current holders whose username or email contains `text` (case-insensitive)"""
+        text = text.lower()
+        with self.lock:
+            query_grams = grams(text) if len(text) <= GRAM_SIZE else {
+                text[start:start + GRAM_SIZE] for start in range(len(text) - GRAM_SIZE + 1)}
+            candidates = None
+            for gram in sorted(query_grams, key=lambda gram: len(self.postings.get(gram, ()))):
+                posting = self.postings.get(gram)
+                if not posting:
+                    return []
+                candidates = set(posting) if candidates is None else candidates & posting
+                if not candidates:
+                    return []
+            return sorted(user_id for user_id in candidates or ()
+                          if user_id in self.tickets and text in self.names[user_id])
+
+
+class AttendeeIndex:
+    """
+    Per-event attendee indexes, built on the first search of an event.
+
+    Purchases, transfers and deletes sent through helper.signals keep the
+    built indexes current; deleted or changed events are dropped. Indexes
+    expire after `ttl` seconds, which bounds how stale another worker
+    process can be, and at most `maxsize` events are kept in memory.
+
+    Each event is built under its own lock, so concurrent first searches of
+    one event run the holder query once while other events' builds proceed.
+    """
+
+    def __init__(self, ttl=600, maxsize=100, max_matches=1000):
+        self._events = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._build_locks = {}  # event_id -> lock of the build in progress
+        self._build_locks_lock = threading.Lock()
+        self.max_matches = max_matches
+
+    def init_app(self, app):
+        """Read the index settings and subscribe to the ticket signals"""
+        self._events.ttl = int(app.config.get('ATTENDEE_INDEX_TTL', self._events.ttl))
+        self._events.maxsize = int(app.config.get('ATTENDEE_INDEX_MAX_EVENTS', self._events.maxsize))
+        self.max_matches = int(app.config.get('ATTENDEE_INDEX_MAX_MATCHES', self.max_matches))
+        signals.tickets_purchased.connect(self._on_purchase, weak=False)
+        signals.ticket_transferred.connect(self._on_transfer, weak=False)
+        signals.ticket_deleted.connect(self._on_delete, weak=False)
+        signals.event_changed.connect(self._on_event_changed, weak=False)
+
+    def search(self, cursor, event_id, text):
+        """
+        User IDs of the event's ticket holders matching `text`.
+
+        Returns None when more than `max_matches` users match; such a broad
+        search is cheaper as a plain SQL filter than as a long IN list.
+        """
+        attendees = self._events.get(int(event_id))
+        if attendees is None:
+            attendees = self._build(cursor, int(event_id))
+        attendees.resolve_pending(cursor)
+
+        user_ids = attendees.search(text)
+        return None if len(user_ids) > self.max_matches else user_ids
+
+    def _build(self, cursor, event_id):
+        with self._build_locks_lock:
+            build_lock = self._build_locks.setdefault(event_id, threading.Lock())
+        try:
+            with build_lock:
+                attendees = self._events.get(event_id)
+                if attendees is None:
+                    cursor.execute(HOLDERS_QUERY, (event_id,))
+                    attendees = EventAttendees(cursor.fetchall())
+                    self._events.set(event_id, attendees)
+                return attendees
+        finally:
+            # Searches still waiting hold the lock object and find the index once they get it
+            with self._build_locks_lock:
+                if self._build_locks.get(event_id) is build_lock:
+                    del self._build_locks[event_id]
+
+    def invalidate(self, event_id):
+        """Drop the index of an event; it is rebuilt on the next search"""
+        self._events.delete(int(event_id))
+
+    def _on_purchase(self, sender, event_id, user_id, ticket_ids, **_):
+        attendees = self._events.get(int(event_id))
+        if attendees is not None:
+            attendees.add_tickets(user_id, len(ticket_ids))
+
+    def _on_transfer(self, sender, event_id, from_user_id, to_user_id, **_):
+        attendees = self._events.get(int(event_id))
+        if attendees is not None:
+            attendees.remove_tickets(from_user_id, 1)
+            attendees.add_tickets(to_user_id, 1)
+
+    def _on_delete(self, sender, event_id, user_id, **_):
+        attendees = self._events.get(int(event_id))
+        if attendees is not None:
+            attendees.remove_tickets(user_id, 1)
+
+    def _on_event_changed(self, sender, event_id, **_):
+        self.invalidate(event_id)
@@ -0,0 +1,165 @@
+"""Cached and approximate total counts for paginated listings"""
+import itertools
+import threading
+
+from helper import signals
+from helper.ttl_cache import TTLCache
+
+COUNT_MODES = ("exact", "approx", "none")
+
+
+def event_tickets_scope(event_id):
+    """Scope of the counts over one event's tickets"""
+    return f"event_tickets:{event_id}"
+
+
+def user_tickets_scope(user_id):
+    """Scope of the counts over one user's tickets"""
+    return f"user_tickets:{user_id}"
+
+
+EVENTS_SCOPE = "events"
+
+
+def estimate_from_plan(description, plan_rows):
+    """
+    Row estimate of a query from its EXPLAIN output.
+
+    For a nested-loop join the optimizer expects rows * filtered% rows out of
+    each table for every row of the previous one, so the estimate is the
+    product over all tables. Returns None when the plan has no estimate.
+    """
+    columns = [column[0].lower() for column in description]
+    rows_index = columns.index("rows")
+    filtered_index = columns.index("filtered") if "filtered" in columns else None
+
+    estimate = None
+    for plan_row in plan_rows:
+        rows = plan_row[rows_index]
+        if rows is None:
+            continue
+        filtered = float(plan_row[filtered_index]) if filtered_index is not None and plan_row[filtered_index] else 100.0
+        estimate = (estimate or 1.0) * float(rows) * filtered / 100.0
+    return None if estimate is None else int(round(estimate))
+
+
+class CountCache:
+    """
+    Total counts of listings, cached per scope and filter.
+
+    Every count belongs to a scope (an event's tickets, a user's tickets, the
+    events table). Purchase, validation, transfer, delete and event changes
+    give the scopes they touch a new generation, so a cached count is reused
+    only while nothing in its scope changed. Generations are unique numbers
+    kept as long as the counts, so a forgotten one can never match an old
+    count.
+
+    Those changes are only seen by the worker process that made them; in
+    another worker a cached count can be up to `ttl` seconds old. Unless
+    `single_process` is set, a count served from the cache is therefore
+    reported as an estimate, and only a fresh COUNT(*) as exact. Modes:
+
+    - exact: the cached value if still current, otherwise COUNT(*).
+    - approx: the last known value even if outdated, otherwise the
+      optimizer's estimate from EXPLAIN; never scans the listing.
+    - none: no count at all.
+    """
+
+    def __init__(self, ttl=300, stale_ttl=3600, maxsize=10000, single_process=False):
+        self.single_process = single_process
+        self._exact = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._last = TTLCache(maxsize=maxsize, ttl=stale_ttl)
+        self._generations = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._next_generation = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """Read cache lifetimes and subscribe to the change signals"""
+        self._exact.ttl = int(app.config.get('COUNT_CACHE_TTL', self._exact.ttl))
+        self._generations.ttl = self._exact.ttl
+        self._last.ttl = int(app.config.get('COUNT_CACHE_STALE_TTL', self._last.ttl))
+        self.single_process = app.config.get('COUNT_CACHE_SINGLE_PROCESS', self.single_process)
+        signals.tickets_purchased.connect(self._on_purchase, weak=False)
+        signals.tickets_validated.connect(self._on_validate, weak=False)
+        signals.ticket_transferred.connect(self._on_transfer, weak=False)
+        signals.ticket_deleted.connect(self._on_delete, weak=False)
+        signals.event_changed.connect(self._on_event_changed, weak=False)
+
+    def count(self, cursor, scope, count_query, params, mode="exact"):
+        """
+        Total for a listing.
+
+        Args:
+            count_query (str): SELECT COUNT(*) with exactly the filters of the listing.
+            mode (str): One of COUNT_MODES.
+
+        Returns:
+            tuple: (total or None, is_estimate)
+        """
+        if mode == "none":
+            return None, False
+
+        hit = self.cached(scope, count_query, params, mode)
+        if hit is not None:
+            return hit
+        if mode == "approx":
+            cursor.execute(f"EXPLAIN {count_query}", params)
+            estimate = estimate_from_plan(cursor.description, cursor.fetchall())
+            if estimate is not None:
+                return estimate, True
+
+        cursor.execute(count_query, params)
+        total = cursor.fetchone()[0]
+        self.remember(scope, count_query, params, total)
+        return total, False
+
+    def cached(self, scope, count_query, params, mode="exact"):
+        """
+        (total, is_estimate) from the cache alone, or None when the query has
+        to run. For callers with their own cursor type (helper.async_reads):
+        on a miss, EXPLAIN (approx) or COUNT(*) and `remember` the total.
+        """
+        filters = (count_query, tuple(params))
+        if mode == "approx":
+            last = self._last.get((scope, filters))
+            return None if last is None else (last, True)
+        total = self._exact.get((scope, self._generation(scope), filters))
+        return None if total is None else (total, not self.single_process)
+
+    def remember(self, scope, count_query, params, total):
+        """Keep a fresh COUNT(*) result"""
+        filters = (count_query, tuple(params))
+        self._exact.set((scope, self._generation(scope), filters), total)
+        self._last.set((scope, filters), total)
+
+    def invalidate(self, *scopes):
+        """Mark every exact count of these scopes as outdated"""
+        with self._lock:
+            for scope in scopes:
+                self._generations.set(scope, next(self._next_generation))
+
+    def _generation(self, scope):
+        with self._lock:
+            generation = self._generations.get(scope)
+            if generation is None:
+                generation = next(self._next_generation)
+                self._generations.set(scope, generation)
+            return generation
+
+    def _on_purchase(self, sender, event_id, user_id, **_):
+        self.invalidate(event_tickets_scope(event_id), user_tickets_scope(user_id))
+
+    def _on_validate(self, sender, event_id, owner_ids=(), **_):
+        self.invalidate(event_tickets_scope(event_id), *[user_tickets_scope(owner) for owner in set(owner_ids)])
+
+    def _on_transfer(self, sender, event_id, from_user_id, to_user_id, **_):
+        self.invalidate(event_tickets_scope(event_id), user_tickets_scope(from_user_id),
+                        user_tickets_scope(to_user_id))
+
+    def _on_delete(self, sender, event_id, user_id, **_):
+        self.invalidate(event_tickets_scope(event_id), user_tickets_scope(user_id))
+
+    def _on_event_changed(self, sender, event_id, holder_ids=(), **_):
+        # Ticket listings of the holders filter on the event's name and date
+        self.invalidate(EVENTS_SCOPE, event_tickets_scope(event_id),
+                        *[user_tickets_scope(holder) for holder in set(holder_ids)])
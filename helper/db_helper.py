@@ -1,28 +1,80 @@
 """DB Helper"""
 import os
-from mysql.connector.pooling import MySQLConnectionPool
+from functools import partial
+import mysql.connector
+
+from helper.db_pool import ConnectionPool
+from helper.db_routing import ReplicaRouter
 
 DB_HOST = os.environ.get('DB_HOST')
 DB_NAME = os.environ.get('DB_NAME')
 DB_USER = os.environ.get('DB_USER')
 DB_PASSWORD = os.environ.get('DB_PASSWORD')
 DB_POOLNAME = os.environ.get('DB_POOLNAME')
-POOL_SIZE = int(os.environ.get('POOL_SIZE'))
-
-db_pool = MySQLConnectionPool(
-    host="localhost",
-    user=DB_USER,
-    password=DB_PASSWORD,
-    database=DB_NAME,
-    pool_size=POOL_SIZE,  # define pool size connection
-    pool_name=DB_POOLNAME
+POOL_SIZE = int(os.environ.get('POOL_SIZE', '5'))
+# Extra connections during bursts, and how long a request then waits for one
+POOL_MAX_OVERFLOW = int(os.environ.get('POOL_MAX_OVERFLOW', '10'))
+POOL_TIMEOUT = float(os.environ.get('POOL_TIMEOUT', '10'))
+# Replace connections older than this; ping those idle longer than this
+POOL_RECYCLE = int(os.environ.get('POOL_RECYCLE', '3600'))
+POOL_PING_AFTER = int(os.environ.get('POOL_PING_AFTER', '30'))
+# Log checkouts held longer than this many seconds (0 = off)
+POOL_LEAK_TIMEOUT = int(os.environ.get('POOL_LEAK_TIMEOUT', '60'))
+# Server-side prepared statements kept open per connection (hot queries)
+POOL_STATEMENT_CACHE_SIZE = int(os.environ.get('POOL_STATEMENT_CACHE_SIZE', '64'))
+# Read replicas (comma separated host or host:port); empty = everything on DB_HOST
+DB_REPLICA_HOSTS = [host.strip() for host in os.environ.get('DB_REPLICA_HOSTS', '').split(',') if host.strip()]
+# Replicas further behind than this are skipped; lag is measured at most this often
+REPLICA_MAX_LAG = float(os.environ.get('REPLICA_MAX_LAG', '5'))
+REPLICA_LAG_CHECK_INTERVAL = float(os.environ.get('REPLICA_LAG_CHECK_INTERVAL', '5'))
+# After a purchase/transfer the writing client's reads stay on the primary this long
+# (the client carries the write time in the last_write cookie or X-Last-Write header)
+REPLICA_STICKY_SECONDS = float(os.environ.get('REPLICA_STICKY_SECONDS', '10'))
+
+
+def connect(host=None):
+    """Open a new connection to the database (host:port, default DB_HOST)"""
+    host, _, port = (host or DB_HOST or "localhost").partition(":")
+    return mysql.connector.connect(
+        host=host,
+        port=int(port or 3306),
+        user=DB_USER,
+        password=DB_PASSWORD,
+        database=DB_NAME,
+        autocommit=True
+    )
+
+
+# Nothing is opened until the first request needs a connection
+db_pool = ConnectionPool(
+    connect,
+    size=POOL_SIZE,  # define pool size connection
+    max_overflow=POOL_MAX_OVERFLOW,
+    timeout=POOL_TIMEOUT,
+    recycle=POOL_RECYCLE,
+    ping_after=POOL_PING_AFTER,
+    leak_timeout=POOL_LEAK_TIMEOUT,
+    statement_cache_size=POOL_STATEMENT_CACHE_SIZE
+)
+
+db_router = ReplicaRouter(
+    db_pool,
+    {host: ConnectionPool(partial(connect, host), size=POOL_SIZE, max_overflow=POOL_MAX_OVERFLOW,
+                          timeout=POOL_TIMEOUT, recycle=POOL_RECYCLE, ping_after=POOL_PING_AFTER,
+                          leak_timeout=POOL_LEAK_TIMEOUT, statement_cache_size=POOL_STATEMENT_CACHE_SIZE)
+     for host in DB_REPLICA_HOSTS},
+    max_lag=REPLICA_MAX_LAG,
+    check_interval=REPLICA_LAG_CHECK_INTERVAL,
+    sticky_seconds=REPLICA_STICKY_SECONDS
 )
 
 
-def get_connection():
+def get_connection(read_only=False):
     """
     Get connection db connection from db pool
+
+    Reads that can tolerate a few seconds of replica lag pass `read_only=True`
+    and may be served by a replica, unless the client wrote just before (see
+    helper.db_routing); everything else goes to the primary.
     """
-    connection = db_pool.get_connection()
-    connection.autocommit = True
-    return connection
+    return db_router.get_connection(read_only)
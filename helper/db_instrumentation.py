@@ -0,0 +1,151 @@
+"""Per-request query count and DB time, Server-Timing headers and the slow-query log"""
+import contextvars
+import logging
+import re
+import time
+
+from flask import g, has_request_context, request
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+
+# ("METHOD /path", totals) of the async request running in this task (helper.async_reads)
+_async_request = contextvars.ContextVar("db_async_request", default=None)
+
+
+def redact(params):
+    """Parameters reduced to their types, so values never reach the logs"""
+    if params is None:
+        return "()"
+    if isinstance(params, dict):
+        return "{" + ", ".join(f"{key}: <{type(value).__name__}>" for key, value in params.items()) + "}"
+    return "(" + ", ".join(f"<{type(value).__name__}>" for value in params) + ")"
+
+
+def one_line(statement, limit=1000):
+    """Statement on one line, cut at `limit` characters"""
+    text = _WHITESPACE.sub(" ", str(statement)).strip()
+    return text if len(text) <= limit else text[:limit] + "..."
+
+
+class InstrumentedCursor:
+    """Cursor timing its execute()/executemany() calls; everything else is passed through"""
+
+    def __init__(self, cursor, instrumentation):
+        self._cursor = cursor
+        self._instrumentation = instrumentation
+
+    def execute(self, operation, params=None, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return self._cursor.execute(operation, params, *args, **kwargs)
+        finally:
+            self._instrumentation.record_query(operation, params, time.perf_counter() - started)
+
+    def executemany(self, operation, seq_params, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return self._cursor.executemany(operation, seq_params, *args, **kwargs)
+        finally:
+            first = seq_params[0] if isinstance(seq_params, (list, tuple)) and seq_params else None
+            self._instrumentation.record_query(operation, first, time.perf_counter() - started)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._cursor.close()
+
+
+class QueryInstrumentation:
+    """
+    Counts and times the queries of each request.
+
+    Pools attached to it wrap the cursors they hand out, and report how long
+    each checkout waited for a connection. At the end of a request the
+    totals go into a `Server-Timing` header (db, db-pool), which browser dev
+    tools show next to the request. Any statement slower than
+    `slow_query_ms` is logged with its parameters redacted.
+    """
+
+    def __init__(self, slow_query_ms=200, enabled=True):
+        self.slow_query_ms = slow_query_ms
+        self.enabled = enabled
+
+    def init_app(self, app):
+        """Read the settings, attach to the app's DB pools and add the header hook"""
+        self.slow_query_ms = float(app.config.get('DB_SLOW_QUERY_MS', self.slow_query_ms))
+        self.enabled = app.config.get('DB_INSTRUMENTATION_ENABLED', self.enabled)
+        if not self.enabled:
+            return
+        # Imported here so the instrumentation itself does not need a configured database
+        from helper.db_helper import db_router
+        self.attach(db_router.primary)
+        for replica in db_router.replicas:
+            self.attach(replica.pool)
+        app.after_request(self._add_server_timing)
+
+    def attach(self, pool):
+        """Instrument the connections handed out by a ConnectionPool"""
+        pool.observer = self
+
+    def wrap_cursor(self, cursor):
+        return InstrumentedCursor(cursor, self)
+
+    def current(self):
+        """Totals of the running request: {"queries", "db_seconds", "pool_wait_seconds"}"""
+        if not has_request_context():
+            running = _async_request.get()
+            return None if running is None else running[1]
+        stats = g.get("_db_stats")
+        if stats is None:
+            stats = g._db_stats = {"queries": 0, "db_seconds": 0.0, "pool_wait_seconds": 0.0}
+        return stats
+
+    def begin_async(self, method, path):
+        """Count the queries of an async request from here on; returns the token for `end_async`"""
+        return _async_request.set((f"{method} {path}", {"queries": 0, "db_seconds": 0.0, "pool_wait_seconds": 0.0}))
+
+    def end_async(self, token):
+        """Stop counting for the async request and return its Server-Timing value (or None)"""
+        running = _async_request.get()
+        _async_request.reset(token)
+        return None if running is None else self.server_timing(running[1])
+
+    @staticmethod
+    def server_timing(stats):
+        """Server-Timing header value of a request's totals"""
+        return (f'db;dur={stats["db_seconds"] * 1000:.1f};desc="{stats["queries"]} queries", '
+                f'db-pool;dur={stats["pool_wait_seconds"] * 1000:.1f}')
+
+    def record_query(self, statement, params, seconds):
+        stats = self.current()
+        if stats is not None:
+            stats["queries"] += 1
+            stats["db_seconds"] += seconds
+        if seconds * 1000 >= self.slow_query_ms:
+            if has_request_context():
+                where = f" [{request.method} {request.path}]"
+            else:
+                running = _async_request.get()
+                where = f" [{running[0]}]" if running is not None else ""
+            logger.warning("Slow query (%.1f ms)%s: %s params=%s",
+                           seconds * 1000, where, one_line(statement), redact(params))
+
+    def record_checkout(self, seconds):
+        stats = self.current()
+        if stats is not None:
+            stats["pool_wait_seconds"] += seconds
+
+    def _add_server_timing(self, response):
+        stats = g.get("_db_stats")
+        if stats is not None:
+            response.headers.add("Server-Timing", self.server_timing(stats))
+        return response
@@ -0,0 +1,303 @@
+"""Connection pool with overflow, a fair wait queue, health checks and usage stats"""
+import logging
+import threading
+import time
+import traceback
+from collections import deque
+
+from mysql.connector.errors import PoolError
+
+from helper.prepared_statements import PreparedStatements
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeout(PoolError):
+    """No connection became free within the pool timeout"""
+
+
+class _Entry:
+    """A raw connection, its ages and its prepared statements"""
+
+    def __init__(self, connection, now, statement_cache_size=64):
+        self.connection = connection
+        self.created_at = now
+        self.released_at = now
+        self.statements = PreparedStatements(statement_cache_size)
+
+
+class _Waiter:
+    """One caller queued for a connection; woken with an entry or leave to open one"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.entry = None
+        self.may_open = False
+
+
+class PooledConnection:
+    """
+    A checked-out connection. Behaves like the raw connection; `close()` (or
+    leaving a `with` block) gives it back to the pool instead of closing it.
+    """
+
+    def __init__(self, pool, entry, stack=None):
+        object.__setattr__(self, "_pool", pool)
+        object.__setattr__(self, "_entry", entry)
+        object.__setattr__(self, "checked_out_at", time.monotonic())
+        object.__setattr__(self, "stack", stack)
+        object.__setattr__(self, "leak_reported", False)
+
+    def __getattr__(self, name):
+        entry = self._entry
+        if entry is None:
+            raise PoolError("Connection was already returned to the pool")
+        return getattr(entry.connection, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._entry.connection, name, value)
+
+    def cursor(self, *args, **kwargs):
+        """Cursor of the raw connection, instrumented when the pool has an observer"""
+        entry = self._entry
+        if entry is None:
+            raise PoolError("Connection was already returned to the pool")
+        cursor = entry.connection.cursor(*args, **kwargs)
+        observer = self._pool.observer
+        return observer.wrap_cursor(cursor) if observer is not None else cursor
+
+    def execute_prepared(self, query, params=()):
+        """Run `query` as a server-side prepared statement kept with this connection"""
+        entry = self._entry
+        if entry is None:
+            raise PoolError("Connection was already returned to the pool")
+        observer = self._pool.observer
+        if observer is None:
+            return entry.statements.execute(entry.connection, query, params)
+        started = time.perf_counter()
+        try:
+            return entry.statements.execute(entry.connection, query, params)
+        finally:
+            observer.record_query(query, params, time.perf_counter() - started)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """Return the connection to the pool"""
+        entry = self._entry
+        if entry is not None:
+            object.__setattr__(self, "_entry", None)
+            self._pool._release(entry, self)
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of MySQL connections, opened lazily.
+
+    Up to `size` connections are kept open; when all are busy up to
+    `max_overflow` more are opened and closed again once returned. Past that,
+    callers queue in arrival order and are handed connections as they come
+    back, giving up with PoolTimeout after `timeout` seconds.
+
+    A connection idle for more than `ping_after` seconds is pinged before it
+    is handed out, and one older than `recycle` seconds is replaced, so
+    connections dropped by the server (wait_timeout, restarts) are never
+    given to a request. A checkout held longer than `leak_timeout` seconds is
+    logged with the stack that took it.
+
+    Args:
+        connect: Callable opening a new raw connection.
+        size: Connections kept open.
+        max_overflow: Extra connections allowed during bursts.
+        timeout: Seconds a caller waits for a connection.
+        recycle: Maximum age of a connection in seconds (0 = never).
+        ping_after: Idle seconds after which a connection is pinged (0 = always).
+        leak_timeout: Seconds after which a checkout is reported as a leak (0 = off).
+        statement_cache_size: Prepared statements kept open per connection.
+
+    `observer` (e.g. helper.db_instrumentation.QueryInstrumentation), when
+    set, wraps the cursors handed out and is told how long each checkout took.
+    """
+
+    def __init__(self, connect, size=5, max_overflow=10, timeout=30, recycle=3600, ping_after=30,
+                 leak_timeout=60, statement_cache_size=64):
+        self.connect = connect
+        self.size = size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.recycle = recycle
+        self.ping_after = ping_after
+        self.leak_timeout = leak_timeout
+        self.statement_cache_size = statement_cache_size
+        self.observer = None
+        self._lock = threading.Lock()
+        self._idle = deque()
+        self._waiters = deque()
+        self._checked_out = set()
+        self._open = 0
+        self._stats = {"checkouts": 0, "waits": 0, "timeouts": 0, "wait_seconds": 0.0, "max_wait_seconds": 0.0,
+                       "recycled": 0, "ping_failures": 0, "leaks": 0}
+
+    def get_connection(self):
+        """Check out a connection, waiting up to `timeout` seconds for one"""
+        started = time.perf_counter()
+        waiter = None
+        entry = None
+        with self._lock:
+            if self._idle and not self._waiters:
+                entry = self._idle.pop()
+            elif self._open < self.size + self.max_overflow and not self._waiters:
+                self._open += 1
+            else:
+                waiter = _Waiter()
+                self._waiters.append(waiter)
+
+        if waiter is not None:
+            entry = self._wait(waiter)
+
+        try:
+            entry = self._checked(entry)
+        except Exception:
+            self._discard()
+            raise
+
+        stack = traceback.format_stack(limit=8)[:-1] if self.leak_timeout else None
+        connection = PooledConnection(self, entry, stack)
+        with self._lock:
+            self._checked_out.add(connection)
+            self._stats["checkouts"] += 1
+        if self.observer is not None:
+            self.observer.record_checkout(time.perf_counter() - started)
+        return connection
+
+    def _wait(self, waiter):
+        started = time.monotonic()
+        self._report_leaks()
+        woken = waiter.event.wait(self.timeout)
+        waited = time.monotonic() - started
+        with self._lock:
+            self._stats["waits"] += 1
+            self._stats["wait_seconds"] += waited
+            self._stats["max_wait_seconds"] = max(self._stats["max_wait_seconds"], waited)
+            # A hand-off can land right as the wait times out; take it then
+            if not woken and waiter.entry is None and not waiter.may_open:
+                self._waiters.remove(waiter)
+                self._stats["timeouts"] += 1
+                raise PoolTimeout(f"No connection free after {self.timeout}s "
+                                  f"({self._open} open, {len(self._waiters)} waiting)")
+        return waiter.entry
+
+    def _checked(self, entry):
+        """A healthy entry: `entry` if still usable, else a newly opened one"""
+        now = time.monotonic()
+        if entry is not None and self.recycle and now - entry.created_at > self.recycle:
+            self._count("recycled")
+            self._close_quietly(entry.connection)
+            entry = None
+        elif entry is not None and now - entry.released_at >= self.ping_after:
+            try:
+                entry.connection.ping(reconnect=False)
+            except Exception:
+                self._count("ping_failures")
+                self._close_quietly(entry.connection)
+                entry = None
+        if entry is None:
+            entry = _Entry(self.connect(), time.monotonic(), self.statement_cache_size)
+        return entry
+
+    def _release(self, entry, pooled):
+        held = time.monotonic() - pooled.checked_out_at
+        if self.leak_timeout and held > self.leak_timeout:
+            logger.warning("Connection held for %.1fs, checked out at:\n%s", held, "".join(pooled.stack or ()))
+
+        try:
+            # Leave nothing behind for the next user
+            if entry.connection.unread_result:
+                entry.connection.consume_results()
+            if entry.connection.in_transaction:
+                entry.connection.rollback()
+        except Exception:
+            self._close_quietly(entry.connection)
+            with self._lock:
+                self._checked_out.discard(pooled)
+            self._discard()
+            return
+
+        entry.released_at = time.monotonic()
+        close = False
+        with self._lock:
+            self._checked_out.discard(pooled)
+            if self._waiters:
+                waiter = self._waiters.popleft()
+                waiter.entry = entry
+                waiter.event.set()
+            elif self._open > self.size:
+                self._open -= 1
+                close = True
+            else:
+                self._idle.append(entry)
+        if close:
+            self._close_quietly(entry.connection)
+
+    def _discard(self):
+        """Give up the slot of a connection that is gone"""
+        with self._lock:
+            if self._waiters:
+                # The first waiter opens a connection in its place
+                waiter = self._waiters.popleft()
+                waiter.may_open = True
+                waiter.event.set()
+            else:
+                self._open -= 1
+
+    def _report_leaks(self):
+        if not self.leak_timeout:
+            return
+        now = time.monotonic()
+        with self._lock:
+            leaked = [c for c in self._checked_out
+                      if now - c.checked_out_at > self.leak_timeout and not c.leak_reported]
+            self._stats["leaks"] += len(leaked)
+        for connection in leaked:
+            object.__setattr__(connection, "leak_reported", True)
+            logger.warning("Connection checked out %.1fs ago and not returned, taken at:\n%s",
+                           now - connection.checked_out_at, "".join(connection.stack or ()))
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    @staticmethod
+    def _close_quietly(connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def stats(self):
+        """Current usage and counters since start"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({
+                "size": self.size,
+                "max_overflow": self.max_overflow,
+                "open": self._open,
+                "idle": len(self._idle),
+                "in_use": len(self._checked_out),
+                "waiting": len(self._waiters),
+            })
+        stats["avg_wait_seconds"] = stats["wait_seconds"] / stats["waits"] if stats["waits"] else 0.0
+        return stats
+
+    def dispose(self):
+        """Close every idle connection (checked-out ones close when returned)"""
+        with self._lock:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._open -= len(idle)
+        for entry in idle:
+            self._close_quietly(entry.connection)
@@ -0,0 +1,212 @@
+"""Routing of read-only queries to replicas, with lag checks and read-your-writes stickiness"""
+import itertools
+import logging
+import math
+import threading
+import time
+
+from flask import g, has_request_context, request
+
+from helper import signals
+
+logger = logging.getLogger(__name__)
+
+LAG_COLUMNS = ("Seconds_Behind_Source", "Seconds_Behind_Master")
+
+# Where clients carry the time of their last write (see ReplicaRouter)
+LAST_WRITE_COOKIE = "last_write"
+LAST_WRITE_HEADER = "X-Last-Write"
+
+
+def replica_lag(connection):
+    """Seconds the replica is behind its source, or None when it is not replicating"""
+    with connection.cursor() as cursor:
+        try:
+            cursor.execute("SHOW REPLICA STATUS")
+        except Exception:
+            # MySQL before 8.0.22
+            cursor.execute("SHOW SLAVE STATUS")
+        row = cursor.fetchone()
+        if not row:
+            return None
+        columns = [column[0] for column in cursor.description]
+        for name in LAG_COLUMNS:
+            if name in columns:
+                lag = row[columns.index(name)]
+                return None if lag is None else float(lag)
+    return None
+
+
+class Replica:
+    """A replica pool and the last lag measured on it"""
+
+    def __init__(self, name, pool):
+        self.name = name
+        self.pool = pool
+        self.lag = None
+        self.checked_at = None
+
+
+class ReplicaRouter:
+    """
+    Picks the pool for a query: the primary for writes, a replica for reads.
+
+    A replica is used only while its measured lag is within `max_lag`
+    seconds. Lag is measured every `check_interval` seconds by a background
+    thread, never on the request path; a replica that can not be reached is
+    skipped until the next check. Reads fall back to the primary when no
+    replica qualifies.
+
+    Read-your-writes: a request that purchased, transferred, checked in or
+    deleted tickets (the signals in helper.signals) gets the time of the
+    write back in the `last_write` cookie and the X-Last-Write header. Reads
+    of a client sending either one within `sticky_seconds` of that time go
+    to the primary, whichever worker or server answers them. Only the
+    client that wrote is affected; other users of the same event keep
+    reading from the replicas. A client can only move its own reads to the
+    primary with a forged value, and not for longer than `sticky_seconds`.
+
+    Args:
+        primary: Pool for writes and fallback reads.
+        replicas: Dict of name -> pool for each replica.
+        clock: Wall clock of the last-write times, which are compared across
+            processes.
+    """
+
+    def __init__(self, primary, replicas=None, max_lag=5, check_interval=5, sticky_seconds=10,
+                 clock=time.time):
+        self.primary = primary
+        self.replicas = [Replica(name, pool) for name, pool in (replicas or {}).items()]
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.sticky_seconds = sticky_seconds
+        self.clock = clock
+        self._next = itertools.count()
+        self._stats = {"primary_reads": 0, "replica_reads": 0, "sticky_reads": 0}
+        self._stats_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._thread_lock = threading.Lock()
+
+    def init_app(self, app):
+        """Follow the ticket signals, send last-write times to clients and start the lag checks"""
+        signals.tickets_purchased.connect(self._on_write, weak=False)
+        signals.tickets_validated.connect(self._on_write, weak=False)
+        signals.ticket_transferred.connect(self._on_write, weak=False)
+        signals.ticket_deleted.connect(self._on_write, weak=False)
+        app.after_request(self._send_last_write)
+        if self.replicas:
+            self.start()
+
+    def get_connection(self, read_only=False):
+        """
+        Connection for a query.
+
+        Args:
+            read_only: True when the caller only reads; writes always go to
+                the primary.
+        """
+        if not read_only or not self.replicas:
+            return self.primary.get_connection()
+
+        if self.is_sticky():
+            self._count("sticky_reads")
+            return self.primary.get_connection()
+
+        for replica in self._healthy():
+            try:
+                connection = replica.pool.get_connection()
+            except Exception as e:
+                logger.warning("Replica %s unavailable: %s", replica.name, e)
+                replica.lag = None
+                continue
+            self._count("replica_reads")
+            return connection
+
+        self._count("primary_reads")
+        return self.primary.get_connection()
+
+    def mark_written(self):
+        """Keep the reads of the client of the current request on the primary for a while"""
+        if has_request_context():
+            g._db_written_at = self.clock()
+
+    def is_sticky(self):
+        """True if the client of the current request wrote recently"""
+        if not has_request_context():
+            return False
+        written_at = g.get("_db_written_at")
+        if written_at is None:
+            value = request.headers.get(LAST_WRITE_HEADER) or request.cookies.get(LAST_WRITE_COOKIE)
+            try:
+                written_at = float(value)
+            except (TypeError, ValueError):
+                return False
+        # Both ways, so a time from the future (clock skew or forged) also ends
+        return abs(self.clock() - written_at) < self.sticky_seconds
+
+    def check_lag(self):
+        """Measure the lag of every replica once"""
+        for replica in self.replicas:
+            try:
+                with replica.pool.get_connection() as connection:
+                    replica.lag = replica_lag(connection)
+            except Exception as e:
+                logger.warning("Lag check on replica %s failed: %s", replica.name, e)
+                replica.lag = None
+            replica.checked_at = time.monotonic()
+
+    def start(self):
+        """Start the lag checking thread (no-op if it already runs)"""
+        with self._thread_lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="replica-lag", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Ask the lag checking thread to finish"""
+        self._stop.set()
+
+    def _run(self):
+        while True:
+            self.check_lag()
+            if self._stop.wait(self.check_interval):
+                return
+
+    def _healthy(self):
+        """Replicas within the lag limit, rotated so reads spread across them"""
+        if self._thread is not None and not self._thread.is_alive() and not self._stop.is_set():
+            # Threads do not survive a fork; restart it in every worker process
+            self.start()
+        start = next(self._next)
+        count = len(self.replicas)
+        for i in range(count):
+            replica = self.replicas[(start + i) % count]
+            if replica.lag is not None and replica.lag <= self.max_lag:
+                yield replica
+
+    def _count(self, name):
+        with self._stats_lock:
+            self._stats[name] += 1
+
+    def stats(self):
+        """Reads per destination and the last lag of each replica"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["replicas"] = {replica.name: {"lag": replica.lag, "pool": replica.pool.stats()}
+                             for replica in self.replicas}
+        return stats
+
+    def _on_write(self, sender, **_):
+        self.mark_written()
+
+    def _send_last_write(self, response):
+        written_at = g.get("_db_written_at")
+        if written_at is not None:
+            value = f"{written_at:.3f}"
+            response.headers[LAST_WRITE_HEADER] = value
+            response.set_cookie(LAST_WRITE_COOKIE, value, max_age=math.ceil(self.sticky_seconds),
+                                httponly=True, samesite="Lax")
+        return response
@@ -0,0 +1,74 @@
+"""Event detail with its packages and committee in a single query"""
+import json
+
+DETAIL_SECTIONS = ("packages", "committees")
+
+# Subquery per section; each returns a JSON array (NULL when empty) so the
+# whole page is one row from one round trip
+SECTION_QUERIES = {
+    "packages": """
+        (SELECT JSON_ARRAYAGG(JSON_OBJECT(
+            'id', p.id, 'id_acara', p.id_acara, 'name', p.name,
+            'tickets_per_package', p.tickets_per_package,
+            'total_tickets_available', p.total_tickets_available, 'price', p.price))
+         FROM packages p WHERE p.id_acara = e.id)
+    """,
+    "committees": """
+        (SELECT JSON_ARRAYAGG(JSON_OBJECT('id', pa.id, 'id_user', pa.id_user, 'username', cu.username))
+         FROM panitia pa JOIN user cu ON pa.id_user = cu.id WHERE pa.id_acara = e.id)
+    """,
+}
+
+
+class InvalidInclude(ValueError):
+    """`include` names a section that does not exist"""
+
+
+def parse_includes(value):
+    """
+    Sections asked for in `include` (comma separated), in DETAIL_SECTIONS
+    order. Every section when the parameter is missing, none when empty.
+    """
+    if value is None:
+        return list(DETAIL_SECTIONS)
+    names = {name.strip().lower() for name in value.split(",") if name.strip()}
+    unknown = names - set(DETAIL_SECTIONS)
+    if unknown:
+        raise InvalidInclude(f"Unknown include: {', '.join(sorted(unknown))}. "
+                             f"Use any of: {', '.join(DETAIL_SECTIONS)}.")
+    return [section for section in DETAIL_SECTIONS if section in names]
+
+
+def detail_query(sections):
+    """SELECT of one event (plus owner username) and the JSON of the sections"""
+    columns = "".join(f", {SECTION_QUERIES[section]} AS {section}" for section in sections)
+    return f"""
+        SELECT e.id, e.gambar, e.nama, e.deskripsi, e.tanggal, e.lokasi, e.user_id, u.username{columns}
+        FROM events e
+        LEFT JOIN user u ON e.user_id = u.id
+        WHERE e.id = %s
+    """
+
+
+def detail_payload(row, sections):
+    """Response body of a `detail_query` row"""
+    payload = {
+        "event": {
+            "id": row[0],
+            "gambar": row[1],
+            "nama": row[2],
+            "deskripsi": row[3],
+            "tanggal": row[4].strftime('%Y-%m-%d'),
+            "lokasi": row[5],
+            "user_id": row[6],
+            "username": row[7]
+        }
+    }
+    for section, value in zip(sections, row[8:]):
+        items = json.loads(value) if value else []
+        if section == "packages":
+            # Sama seperti /packages/get: harga sebagai float
+            for item in items:
+                item["price"] = float(item["price"])
+        payload[section] = items
+    return payload
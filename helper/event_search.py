@@ -0,0 +1,34 @@
+"""Full-text search over event names and descriptions"""
+import re
+
+MAX_TERMS = 8
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def match_events(table="events"):
+    """MATCH over the FULLTEXT index on (nama, deskripsi) of `table` (the table name or its alias)"""
+    return f"MATCH({table}.nama, {table}.deskripsi) AGAINST (%s IN BOOLEAN MODE)"
+
+
+# Needs the FULLTEXT index from stuff/migrations/003_events_fulltext.sql
+MATCH_EVENTS = match_events()
+
+
+def boolean_query(search):
+    """
+    Turn the text of the search box into a BOOLEAN MODE query.
+
+    Every word is required and matched as a prefix (`+jaz*` finds "jazz"
+    while the user is still typing). With several words the whole phrase
+    is added as an optional term, so events containing it rank first.
+    Operators typed by the user are dropped. Returns None when nothing
+    searchable is left.
+    """
+    words = [word.lower() for word in _WORD.findall(search or "")][:MAX_TERMS]
+    if not words:
+        return None
+
+    terms = [f"+{word}*" for word in words]
+    if len(words) > 1:
+        terms.append('"' + " ".join(words) + '"')
+    return " ".join(terms)
@@ -0,0 +1,132 @@
+"""Idempotency-Key support so retried POSTs replay the first response"""
+import hashlib
+from functools import wraps
+
+from flask import request, jsonify, make_response, current_app
+from flask_jwt_extended import get_jwt_identity
+
+from helper.ttl_cache import TTLCache
+
+IN_PROGRESS = "in-progress"
+
+# Client errors that say "try again later" rather than "this request is wrong",
+# e.g. 429 from the waiting room; they are not stored so a retry runs again
+RETRYABLE_STATUSES = frozenset({408, 409, 425, 429})
+
+
+def is_replayable(status):
+    """True for responses a retry should get back: 2xx and deterministic 4xx"""
+    if 200 <= status < 300:
+        return True
+    return 400 <= status < 500 and status not in RETRYABLE_STATUSES
+
+
+class InMemoryIdempotencyStore:
+    """
+    Stored responses kept in this process, bounded in size and age.
+
+    A shared backend only needs the same three methods, with `begin` being an
+    atomic "set if absent".
+    """
+
+    def __init__(self, maxsize=10000, ttl=86400, lock_ttl=60):
+        self.lock_ttl = lock_ttl
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def init_app(self, app):
+        """Read size and lifetime of stored responses from the app config"""
+        self._cache.maxsize = int(app.config.get('IDEMPOTENCY_MAX_KEYS', self._cache.maxsize))
+        self._cache.ttl = int(app.config.get('IDEMPOTENCY_TTL', self._cache.ttl))
+
+    def begin(self, key, fingerprint):
+        """
+        Claim a key for a new request.
+
+        Returns None when the caller now owns the key, otherwise the record
+        already stored for it (possibly still in progress).
+        """
+        claim = {"state": IN_PROGRESS, "fingerprint": fingerprint}
+        # The claim expires quickly so a crashed request does not block the key forever
+        if self._cache.add(key, claim, ttl=self.lock_ttl):
+            return None
+        return self._cache.get(key) or self.begin(key, fingerprint)
+
+    def complete(self, key, fingerprint, status, body, mimetype):
+        """Store the final response for a key"""
+        self._cache.set(key, {
+            "state": "done",
+            "fingerprint": fingerprint,
+            "status": status,
+            "body": body,
+            "mimetype": mimetype,
+        })
+
+    def release(self, key):
+        """Forget a key so the request can be retried, e.g. after a server error"""
+        self._cache.delete(key)
+
+
+def _request_fingerprint():
+    """Hash of what the client sent, to catch a key reused for another request"""
+    digest = hashlib.sha256(request.path.encode())
+    for field, value in sorted(request.form.items(multi=True)):
+        digest.update(f"\0{field}={value}".encode())
+    return digest.hexdigest()
+
+
+def _current_identity():
+    try:
+        identity = get_jwt_identity()
+    except RuntimeError:
+        return None
+    return identity.get('id') if isinstance(identity, dict) else identity
+
+
+def idempotent(store):
+    """
+    Decorator for POST endpoints that honour an `Idempotency-Key` header.
+
+    The first request with a key runs normally and its response, if it is a
+    2xx or a 4xx that a retry would get again, is stored per user and
+    endpoint; after anything else (5xx, 429, ...) the key is released. Retries with the same key get the
+    stored response back without running the endpoint again. Place it below
+    `@jwt_required()` so the key is scoped to the caller.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            key = request.headers.get('Idempotency-Key')
+            if not key:
+                return view(*args, **kwargs)
+
+            if len(key) > 255:
+                return jsonify({"message": "Idempotency-Key is too long."}), 400
+
+            scoped_key = f"{_current_identity()}:{request.endpoint}:{key}"
+            fingerprint = _request_fingerprint()
+            record = store.begin(scoped_key, fingerprint)
+
+            if record is not None:
+                if record["fingerprint"] != fingerprint:
+                    return jsonify({"message": "This Idempotency-Key was used for a different request."}), 422
+                if record["state"] == IN_PROGRESS:
+                    return jsonify({"message": "A request with this Idempotency-Key is still being processed."}), 409
+                response = current_app.response_class(
+                    record["body"], status=record["status"], mimetype=record["mimetype"])
+                response.headers['Idempotent-Replayed'] = 'true'
+                return response
+
+            try:
+                response = make_response(view(*args, **kwargs))
+            except Exception:
+                store.release(scoped_key)
+                raise
+
+            if is_replayable(response.status_code):
+                store.complete(scoped_key, fingerprint, response.status_code,
+                               response.get_data(), response.mimetype)
+            else:
+                store.release(scoped_key)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,179 @@
+"""Live sale and check-in updates per event, fanned out to Server-Sent Events streams"""
+import json
+import queue
+import threading
+
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+
+from helper import signals
+
+
+class Subscription:
+    """Messages of one channel for one listener, in a bounded queue"""
+
+    def __init__(self, broker, channel, maxsize):
+        self.broker = broker
+        self.channel = channel
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.dropped = False
+
+    def put(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except queue.Full:
+            # Listener too slow: it is dropped and has to reconnect
+            self.dropped = True
+
+    def get(self, timeout):
+        """Next message, or None after `timeout` seconds without one"""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        """Stop receiving messages"""
+        self.broker.unsubscribe(self)
+
+
+class InMemoryBroker:
+    """
+    Publish/subscribe inside this process.
+
+    Every published message is put on the queue of each subscriber of its
+    channel. A shared broker (e.g. Redis pub/sub) only needs the same
+    `subscribe`/`unsubscribe`/`publish` methods to be swapped in, so updates
+    from other workers reach these listeners too.
+    """
+
+    def __init__(self, queue_size=100):
+        self.queue_size = queue_size
+        self._channels = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, channel):
+        """New Subscription to a channel"""
+        subscription = Subscription(self, channel, self.queue_size)
+        with self._lock:
+            self._channels.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """Remove a Subscription"""
+        with self._lock:
+            listeners = self._channels.get(subscription.channel)
+            if listeners:
+                listeners.discard(subscription)
+                if not listeners:
+                    del self._channels[subscription.channel]
+
+    def publish(self, channel, message):
+        """Send a message to every subscriber of a channel. Returns the number reached."""
+        with self._lock:
+            listeners = list(self._channels.get(channel, ()))
+        for subscription in listeners:
+            subscription.put(message)
+        return len(listeners)
+
+
+def sse_message(event, data, event_id=None):
+    """One Server-Sent Events message"""
+    lines = [f"event: {event}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append("data: " + json.dumps(data, separators=(",", ":"), default=str))
+    return "\n".join(lines) + "\n\n"
+
+
+class LiveFeed:
+    """
+    Per-event stream of sales and check-ins.
+
+    Purchases and validations are published once, after their transaction
+    committed (see helper.signals), and the broker copies them to every open
+    dashboard of the event, so watching costs no database reads.
+
+    An open stream keeps one worker thread busy for as long as the dashboard
+    is open, so at most `max_streams` run at once per process; the rest of
+    the threads stay free for purchases. EventSource can not send headers,
+    so a dashboard connects with a short-lived stream token (`issue_token`)
+    bound to one user and event, instead of the access token, which would
+    end up in access logs.
+    """
+
+    def __init__(self, broker=None, heartbeat=15, max_streams=8, token_ttl=60):
+        self.broker = broker or InMemoryBroker()
+        self.heartbeat = heartbeat
+        self.max_streams = max_streams
+        self.token_ttl = token_ttl
+        self._serializer = None
+        self._open = 0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """Read the feed settings and subscribe to the ticket signals"""
+        self.heartbeat = int(app.config.get('LIVE_FEED_HEARTBEAT', self.heartbeat))
+        self.max_streams = int(app.config.get('LIVE_FEED_MAX_STREAMS', self.max_streams))
+        self.token_ttl = int(app.config.get('LIVE_FEED_TOKEN_TTL', self.token_ttl))
+        self._serializer = URLSafeTimedSerializer(app.config['SECRET_KEY'], salt="live-feed")
+        if isinstance(self.broker, InMemoryBroker):
+            self.broker.queue_size = int(app.config.get('LIVE_FEED_QUEUE_SIZE', self.broker.queue_size))
+        signals.tickets_purchased.connect(self._on_purchase, weak=False)
+        signals.tickets_validated.connect(self._on_validate, weak=False)
+
+    def issue_token(self, user_id, event_id):
+        """Stream token letting `user_id` open the feed of `event_id` for `token_ttl` seconds"""
+        return self._serializer.dumps([user_id, event_id])
+
+    def read_token(self, token, event_id):
+        """User ID of a valid, unexpired token for `event_id`, otherwise None"""
+        try:
+            user_id, token_event_id = self._serializer.loads(token, max_age=self.token_ttl)
+        except (BadSignature, TypeError, ValueError):
+            return None
+        return user_id if token_event_id == event_id else None
+
+    def acquire(self):
+        """Take one of the `max_streams` stream slots. Returns False when all are in use."""
+        with self._lock:
+            if self._open >= self.max_streams:
+                return False
+            self._open += 1
+            return True
+
+    def release(self):
+        """Give a stream slot back (when its response is closed)"""
+        with self._lock:
+            self._open -= 1
+
+    def stream(self, event_id, snapshot=None):
+        """
+        Generator of SSE text for one dashboard.
+
+        Starts with `snapshot` (current totals) if given, then one message per
+        sale or check-in. A comment line is sent every `heartbeat` seconds so
+        proxies keep the connection open and closed clients are noticed.
+        """
+        subscription = self.broker.subscribe(f"event:{event_id}")
+        try:
+            yield f"retry: {self.heartbeat * 1000}\n\n"
+            if snapshot is not None:
+                yield sse_message("snapshot", snapshot)
+            while not subscription.dropped:
+                message = subscription.get(timeout=self.heartbeat)
+                if message is None:
+                    yield ": keep-alive\n\n"
+                else:
+                    yield sse_message(message["type"], message)
+        finally:
+            subscription.close()
+
+    def _on_purchase(self, sender, event_id, user_id, ticket_ids, **_):
+        self.broker.publish(f"event:{event_id}", {
+            "type": "sold", "event_id": event_id, "count": len(ticket_ids), "ticket_ids": list(ticket_ids)
+        })
+
+    def _on_validate(self, sender, event_id, ticket_ids, **_):
+        self.broker.publish(f"event:{event_id}", {
+            "type": "validated", "event_id": event_id, "count": len(ticket_ids), "ticket_ids": list(ticket_ids)
+        })
@@ -0,0 +1,84 @@
+"""Cached committee membership and event ownership lookups"""
+import threading
+
+from helper import prepared_statements
+from helper.ttl_cache import TTLCache
+
+MEMBER_QUERY = "SELECT 1 FROM panitia WHERE id_user = %s AND id_acara = %s"
+OWNER_QUERY = "SELECT user_id FROM events WHERE id = %s"
+
+
+class MembershipCache:
+    """
+    TTL cache in front of the `panitia` and event owner lookups.
+
+    Positive and negative membership answers are cached, keyed by (user,
+    event); owners are cached by event, but a missing event is not, so an
+    event created right after a lookup of its id is owned at once. Routes that change committees or
+    delete events invalidate explicitly; the TTL only bounds how stale another
+    worker process can be.
+    """
+
+    def __init__(self, ttl=60, maxsize=50000):
+        self._members = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._owners = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """Read the cache lifetime from the app config"""
+        ttl = int(app.config.get('MEMBERSHIP_CACHE_TTL', self._members.ttl))
+        self._members.ttl = ttl
+        self._owners.ttl = ttl
+
+    def is_committee_member(self, user_id, event_id, cursor=None, connection=None):
+        """
+        True if the user is in the event's committee (panitia).
+
+        On a miss the lookup runs on `connection` (as a prepared statement),
+        on `cursor`, or on a connection of its own if neither is given, so a
+        cache hit does not even check out a connection.
+        """
+        key = (int(user_id), int(event_id), self._generations.get(int(event_id), 0))
+        is_member = self._members.get(key)
+        if is_member is None:
+            result = _fetch_one(cursor, connection, MEMBER_QUERY, (user_id, event_id))
+            is_member = result is not None
+            self._members.set(key, is_member)
+        return is_member
+
+    def get_event_owner(self, event_id, cursor=None, connection=None):
+        """ID of the user owning the event, or None if the event does not exist"""
+        owner = self._owners.get(int(event_id))
+        if owner is None:
+            result = _fetch_one(cursor, connection, OWNER_QUERY, (event_id,))
+            if result is None:
+                return None
+            owner = result[0]
+            self._owners.set(int(event_id), owner)
+        return owner
+
+    def invalidate_member(self, user_id, event_id):
+        """Forget the cached membership of one user in one event"""
+        self._members.delete((int(user_id), int(event_id), self._generations.get(int(event_id), 0)))
+
+    def invalidate_event(self, event_id):
+        """Forget the owner and every cached membership of an event"""
+        with self._lock:
+            self._generations[int(event_id)] = self._generations.get(int(event_id), 0) + 1
+        self._owners.delete(int(event_id))
+
+
+def _fetch_one(cursor, connection, query, params):
+    if connection is not None:
+        rows = prepared_statements.execute(connection, cursor, query, params).fetchall()
+        return rows[0] if rows else None
+    if cursor is not None:
+        cursor.execute(query, params)
+        return cursor.fetchone()
+
+    # Imported here so the cache itself does not need a configured database
+    from helper.db_helper import get_connection
+    with get_connection() as own_connection:
+        rows = own_connection.execute_prepared(query, params).fetchall()
+        return rows[0] if rows else None
@@ -0,0 +1,432 @@
+"""Request, DB pool and ticket metrics in the Prometheus text format"""
+import atexit
+import bisect
+import hmac
+import json
+import math
+import os
+import secrets
+import threading
+import time
+
+from flask import Response, g, request
+
+from helper import signals
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; covers cached reads (ms) up to slow exports
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def state(self):
+        """[[label values], value] for every label set, JSON-serialisable"""
+        with self._lock:
+            return [[list(key), self._copy(value)] for key, value in self._values.items()]
+
+    @staticmethod
+    def _copy(value):
+        return value
+
+    def merge(self, values, other):
+        """Add one process' state into `values` (a dict keyed by label values)"""
+        for key, value in other:
+            key = tuple(key)
+            values[key] = value if key not in values else self._add(values[key], value)
+
+    @staticmethod
+    def _add(a, b):
+        return a + b
+
+    def render(self, values):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.kind}"
+        for key in sorted(values):
+            yield from self._lines(list(zip(self.labelnames, key)), values[key])
+
+    def _lines(self, labels, value):
+        yield f"{self.name}{_format_labels(labels)} {_format_value(value)}"
+
+
+class Counter(_Metric):
+    """Monotonic total; summed over every process that ever reported it"""
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def set_total(self, value, **labels):
+        """Take over a total kept elsewhere (e.g. the pool's own counters)"""
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Gauge(_Metric):
+    """Current value; summed over the processes still running"""
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    """Observations counted in cumulative `le` buckets, plus their sum and count"""
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # per-bucket counts (last one is +Inf), sum
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    @staticmethod
+    def _copy(value):
+        return [list(value[0]), value[1]]
+
+    @staticmethod
+    def _add(a, b):
+        return [[x + y for x, y in zip(a[0], b[0])], a[1] + b[1]]
+
+    def _lines(self, labels, value):
+        counts, total = value
+        cumulative = 0
+        for bound, count in zip(self.buckets + (math.inf,), counts):
+            cumulative += count
+            yield f"{self.name}_bucket{_format_labels(labels + [('le', _format_value(float(bound)))])} {cumulative}"
+        yield f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}"
+        yield f"{self.name}_count{_format_labels(labels)} {cumulative}"
+
+
+class MetricsRegistry:
+    """The metrics of this process, and the callbacks refreshing them before each export"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def _register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def add_collector(self, collect):
+        """Call `collect()` before every snapshot, e.g. to copy pool stats into gauges"""
+        self._collectors.append(collect)
+
+    def snapshot(self):
+        """State of every metric: {name: [[label values], value], ...}"""
+        for collect in self._collectors:
+            collect()
+        return {name: metric.state() for name, metric in self._metrics.items()}
+
+    def render(self, snapshots=None):
+        """
+        Text exposition of one or several process snapshots.
+
+        Args:
+            snapshots: (snapshot, alive) pairs; defaults to this process alone.
+                Gauges of processes that are gone are left out.
+        """
+        if snapshots is None:
+            snapshots = [(self.snapshot(), True)]
+        lines = []
+        for name, metric in self._metrics.items():
+            values = {}
+            for snapshot, alive in snapshots:
+                if alive or metric.kind != "gauge":
+                    metric.merge(values, snapshot.get(name, ()))
+            lines.extend(metric.render(values))
+        return "\n".join(lines) + "\n"
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class MetricsFiles:
+    """
+    One snapshot file per worker process in a shared directory.
+
+    Every worker writes its own file; whichever worker answers /metrics reads
+    all of them, so the totals cover the whole server. A worker removes its
+    file when it exits. The file of a worker that died without exiting is
+    kept for its counters and histograms; names are `<pid>-<random>.json`,
+    so a new process that gets the same pid never overwrites it.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._names = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, pid=None):
+        """File of a process (default this one)"""
+        pid = pid or os.getpid()
+        # Keyed by pid, so a worker forked after this was created picks its own name
+        name = self._names.get(pid)
+        if name is None:
+            name = self._names[pid] = f"{pid}-{secrets.token_hex(4)}.json"
+        return os.path.join(self.directory, name)
+
+    def write(self, snapshot, pid=None):
+        path = self.path(pid)
+        temporary = f"{path}.tmp"
+        with open(temporary, "w") as handle:
+            json.dump(snapshot, handle, separators=(",", ":"))
+        os.replace(temporary, path)
+
+    def remove(self, pid=None):
+        """Delete the file of a process (default this one)"""
+        try:
+            os.remove(self.path(pid))
+        except FileNotFoundError:
+            pass
+
+    def read(self):
+        """(snapshot, alive) of every worker that wrote one"""
+        snapshots = []
+        for filename in os.listdir(self.directory):
+            if not filename.endswith(".json"):
+                continue
+            try:
+                pid = int(filename.split("-")[0])
+                with open(os.path.join(self.directory, filename)) as handle:
+                    snapshot = json.load(handle)
+            except (OSError, ValueError):
+                continue
+            snapshots.append((snapshot, _pid_alive(pid)))
+        return snapshots
+
+
+class Metrics:
+    """
+    Prometheus metrics of the app, served on /metrics.
+
+    Per route: request latency histogram and status counts; per blueprint:
+    requests in flight. Also the DB pool gauges (see helper.db_pool) and
+    ticket sale/check-in counters fed by helper.signals. Recording a request
+    is a clock read, a bucket search and a few dict updates under a lock.
+
+    With METRICS_DIR set (needed when several worker processes serve the app)
+    each worker flushes its snapshot there every METRICS_FLUSH_INTERVAL
+    seconds and /metrics merges all of them.
+
+    /metrics is only served with METRICS_TOKEN set, and then needs it as a
+    bearer token: route names, error rates and sales counts are not public.
+    """
+
+    def __init__(self, registry=None):
+        self.registry = registry or MetricsRegistry()
+        self.enabled = False
+        self.files = None
+        self.flush_interval = 5
+        self.token = None
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.requests = self.registry.counter(
+            "http_requests_total", "HTTP requests by route and status.",
+            ("blueprint", "route", "method", "status"))
+        self.latency = self.registry.histogram(
+            "http_request_duration_seconds", "Time to produce the response, by route.",
+            ("blueprint", "route", "method"))
+        self.in_flight = self.registry.gauge(
+            "http_requests_in_flight", "Requests being handled, by blueprint.", ("blueprint",))
+        self.tickets_sold = self.registry.counter("tickets_sold_total", "Tickets sold.")
+        self.tickets_validated = self.registry.counter("tickets_validated_total", "Tickets checked in.")
+        self.tickets_transferred = self.registry.counter("tickets_transferred_total", "Tickets transferred.")
+        self.pool_connections = self.registry.gauge(
+            "db_pool_connections", "DB connections by state (open, idle, in_use).", ("pool", "state"))
+        self.pool_waiting = self.registry.gauge(
+            "db_pool_waiting", "Requests queued for a DB connection.", ("pool",))
+        self.pool_checkouts = self.registry.counter(
+            "db_pool_checkouts_total", "DB connections handed out.", ("pool",))
+        self.pool_timeouts = self.registry.counter(
+            "db_pool_timeouts_total", "Requests that gave up waiting for a DB connection.", ("pool",))
+        self.pool_wait = self.registry.counter(
+            "db_pool_wait_seconds_total", "Time spent queued for a DB connection.", ("pool",))
+
+    def init_app(self, app):
+        """Hook into every request, serve /metrics and follow the ticket signals"""
+        if not app.config.get('METRICS_ENABLED', True):
+            return
+        self.enabled = True
+        self.token = app.config.get('METRICS_TOKEN') or None
+        self.flush_interval = float(app.config.get('METRICS_FLUSH_INTERVAL', self.flush_interval))
+        directory = app.config.get('METRICS_DIR')
+        if directory:
+            self.files = MetricsFiles(directory)
+            self.start()
+            atexit.register(self.close)
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        if self.token:
+            app.add_url_rule(app.config.get('METRICS_PATH', '/metrics'), "metrics", self.export)
+        else:
+            app.logger.warning("METRICS_TOKEN is not set, /metrics is not served")
+
+        self.registry.add_collector(self._collect_pools)
+        signals.tickets_purchased.connect(self._on_purchase, weak=False)
+        signals.tickets_validated.connect(self._on_validate, weak=False)
+        signals.ticket_transferred.connect(self._on_transfer, weak=False)
+
+    def export(self):
+        """The /metrics view"""
+        supplied = request.headers.get("Authorization", "")
+        if supplied.startswith("Bearer "):
+            supplied = supplied[len("Bearer "):]
+        if not self.token or not hmac.compare_digest(supplied.strip().encode(), self.token.encode()):
+            return Response("Unauthorized\n", status=401, mimetype="text/plain")
+        if self.files is None:
+            body = self.registry.render()
+        else:
+            self.flush()
+            body = self.registry.render(self.files.read())
+        return Response(body, content_type=CONTENT_TYPE)
+
+    def flush(self):
+        """Write this worker's snapshot to METRICS_DIR"""
+        if self.files is not None:
+            self.files.write(self.registry.snapshot())
+
+    def close(self):
+        """Stop flushing and remove this worker's file (at exit)"""
+        self.stop()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+        if self.files is not None:
+            self.files.remove()
+
+    def start(self):
+        """Start the flushing thread (no-op if it already runs)"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="metrics-flush", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Ask the flushing thread to finish"""
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                pass
+
+    def _before_request(self):
+        g._metrics_started = time.perf_counter()
+        g._metrics_blueprint = request.blueprint or "app"
+        self.in_flight.inc(blueprint=g._metrics_blueprint)
+
+    def observe_request(self, blueprint, route, method, status, seconds):
+        """Record one finished request (also used by the async routes of helper.async_reads)"""
+        self.latency.observe(seconds, blueprint=blueprint, route=route, method=method)
+        self.requests.inc(blueprint=blueprint, route=route, method=method, status=status)
+
+    def _after_request(self, response):
+        started = g.get("_metrics_started")
+        if started is not None:
+            # URL rule template, so /tickets/<int:event_id> is one series whatever the ID
+            route = request.url_rule.rule if request.url_rule is not None else "<unmatched>"
+            self.observe_request(g._metrics_blueprint, route, request.method, response.status_code,
+                                 time.perf_counter() - started)
+        return response
+
+    def _teardown_request(self, exc):
+        blueprint = g.pop("_metrics_blueprint", None)
+        if blueprint is not None:
+            self.in_flight.dec(blueprint=blueprint)
+
+    def _collect_pools(self):
+        # Imported here so the metrics themselves do not need a configured database
+        from helper.db_helper import db_router
+        pools = [("primary", db_router.primary)] + [(replica.name, replica.pool) for replica in db_router.replicas]
+        for name, pool in pools:
+            stats = pool.stats()
+            for state in ("open", "idle", "in_use"):
+                self.pool_connections.set(stats[state], pool=name, state=state)
+            self.pool_waiting.set(stats["waiting"], pool=name)
+            self.pool_checkouts.set_total(stats["checkouts"], pool=name)
+            self.pool_timeouts.set_total(stats["timeouts"], pool=name)
+            self.pool_wait.set_total(stats["wait_seconds"], pool=name)
+
+    def _on_purchase(self, sender, ticket_ids, **_):
+        self.tickets_sold.inc(len(ticket_ids))
+
+    def _on_validate(self, sender, ticket_ids, **_):
+        self.tickets_validated.inc(len(ticket_ids))
+
+    def _on_transfer(self, sender, **_):
+        self.tickets_transferred.inc()
@@ -0,0 +1,76 @@
+"""Keyset (cursor) pagination helpers"""
+import base64
+import binascii
+import json
+from datetime import date
+
+
+class InvalidCursor(ValueError):
+    """The `after` cursor can not be decoded"""
+
+
+def encode_cursor(values):
+    """
+    Turn the sort key of the last row of a page into an opaque cursor.
+
+    Dates and datetimes are kept as 'YYYY-MM-DD[ hh:mm:ss]' strings, which
+    MySQL compares correctly against DATE/DATETIME columns.
+    """
+    values = [str(value) if isinstance(value, date) else value for value in values]
+    raw = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor, size):
+    """
+    Read a cursor made by `encode_cursor`.
+
+    Raises:
+        InvalidCursor: If the cursor is malformed or has the wrong number of keys.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (binascii.Error, ValueError) as e:
+        raise InvalidCursor("Invalid cursor.") from e
+
+    if not isinstance(values, list) or len(values) != size:
+        raise InvalidCursor("Invalid cursor.")
+    if not all(isinstance(value, (int, float, str)) and not isinstance(value, bool) for value in values):
+        raise InvalidCursor("Invalid cursor.")
+    return values
+
+
+def keyset_condition(columns, values, descending=False):
+    """
+    SQL condition selecting the rows that come after `values` in
+    ORDER BY `columns` (all ascending, or all descending).
+
+    (a, b) after (x, y) is written as `a > x OR (a = x AND b > y)` so MySQL
+    can turn it into a range scan on an index over the sort columns.
+
+    Returns:
+        tuple: (sql, params)
+    """
+    operator = "<" if descending else ">"
+    clauses = []
+    params = []
+    for index, column in enumerate(columns):
+        parts = [f"{previous} = %s" for previous in columns[:index]]
+        parts.append(f"{column} {operator} %s")
+        clauses.append("(" + " AND ".join(parts) + ")")
+        params.extend(values[:index + 1])
+    return "(" + " OR ".join(clauses) + ")", params
+
+
+def next_cursor(rows, per_page, key):
+    """
+    Cursor for the page after `rows`, or None on the last page.
+
+    The listing should fetch `per_page + 1` rows; the extra row only tells
+    that there is a next page and is dropped from `rows` here.
+    """
+    if len(rows) <= per_page:
+        return None
+    del rows[per_page:]
+    return encode_cursor(key(rows[-1]))
@@ -0,0 +1,73 @@
+"""Server-side prepared statements kept per pooled connection"""
+import threading
+from collections import OrderedDict
+
+
+class PreparedStatements:
+    """
+    Prepared cursors of one connection, by query text.
+
+    The first execution of a query prepares it on the server; later ones
+    only send the statement ID and the parameters, so MySQL skips parsing
+    and planning. The registry lives with the raw connection in the pool,
+    so statements survive across checkouts. The least recently used
+    statement is closed once more than `maxsize` are open, keeping well
+    under the server's max_prepared_stmt_count.
+    """
+
+    def __init__(self, maxsize=64):
+        self.maxsize = maxsize
+        self._cursors = OrderedDict()  # query -> (query object, prepared cursor)
+        self._lock = threading.Lock()
+        self.prepares = 0
+        self.executions = 0
+
+    def execute(self, connection, query, params=()):
+        """
+        Run `query` as a prepared statement on `connection` (the raw one).
+
+        Returns the cursor: read rowcount/lastrowid, or every row with
+        fetchall() before running anything else on the connection.
+        """
+        with self._lock:
+            entry = self._cursors.get(query)
+            if entry is None:
+                entry = (query, connection.cursor(prepared=True))
+                self._cursors[query] = entry
+                self.prepares += 1
+                evicted = self._cursors.popitem(last=False)[1] if len(self._cursors) > self.maxsize else None
+            else:
+                self._cursors.move_to_end(query)
+                evicted = None
+            self.executions += 1
+
+        if evicted is not None:
+            evicted[1].close()
+        # The cursor re-prepares when handed another string object, so always
+        # pass the one it was first run with
+        query, cursor = entry
+        try:
+            cursor.execute(query, tuple(params))
+        except Exception:
+            # A failed statement may have left the cursor unusable
+            with self._lock:
+                self._cursors.pop(query, None)
+            cursor.close()
+            raise
+        return cursor
+
+    def __len__(self):
+        return len(self._cursors)
+
+
+def execute(connection, cursor, query, params=()):
+    """
+    Run a hot query on a pooled connection's prepared statement, or on
+    `cursor` as plain text when the connection does not keep any.
+
+    Returns the cursor that ran it (see PreparedStatements.execute).
+    """
+    if hasattr(connection, "execute_prepared"):
+        return connection.execute_prepared(query, params)
+    cursor.execute(query, params)
+    return cursor
@@ -0,0 +1,273 @@
+"""Sampling profiler for production requests, with flamegraph-compatible (collapsed stack) output"""
+import base64
+import hmac
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+import zlib
+from collections import Counter
+
+from flask import g, request
+
+from helper.ttl_cache import TTLCache
+
+PROFILE_HEADER = "X-Profile-Token"
+
+_PROFILE_ID = re.compile(r"^[0-9a-f]{32}$")
+
+# Room for the X-Profile-Stacks header; proxies commonly allow 8 KB per header
+MAX_STACKS_HEADER = 6000
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def frame_name(code):
+    """`path:function` of a code object; project files relative to the repo root"""
+    filename = code.co_filename
+    if filename.startswith(_ROOT + os.sep):
+        filename = filename[len(_ROOT) + 1:]
+    else:
+        filename = os.sep.join(filename.split(os.sep)[-2:])
+    return f"{filename}:{code.co_name}"
+
+
+def collapse(frame, max_depth=100):
+    """The stack of `frame`, outermost first, as one `a;b;c` line"""
+    names = []
+    while frame is not None and len(names) < max_depth:
+        names.append(frame_name(frame.f_code))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+def render_collapsed(stacks):
+    """`stack count` lines, the input format of flamegraph.pl and speedscope"""
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+def _replace_file(path, text):
+    """Write `text` to `path` so that readers never see a partial file"""
+    temporary = f"{path}.tmp"
+    with open(temporary, "w") as handle:
+        handle.write(text)
+    os.replace(temporary, path)
+
+
+def encode_stacks(stacks, limit=MAX_STACKS_HEADER):
+    """
+    Collapsed stacks, zlib-compressed and base64url-encoded for a header.
+
+    When they do not fit in `limit` characters the rarest stacks are left
+    out until they do. Returns (value, stacks left out).
+    """
+    kept = stacks.most_common()
+    while True:
+        value = base64.urlsafe_b64encode(zlib.compress(render_collapsed(Counter(dict(kept))).encode())).decode()
+        if len(value) <= limit or not kept:
+            return value, len(stacks) - len(kept)
+        kept = kept[:len(kept) // 2]
+
+
+def decode_stacks(value):
+    """Collapsed stack text of an X-Profile-Stacks header"""
+    return zlib.decompress(base64.urlsafe_b64decode(value)).decode()
+
+
+class StackSampler:
+    """
+    One background thread sampling the stacks of the threads registered with it.
+
+    While nothing is registered the thread sleeps, so an idle profiler costs
+    nothing; each sample is a single sys._current_frames() call.
+    """
+
+    def __init__(self, interval=0.005, max_depth=100):
+        self.interval = interval
+        self.max_depth = max_depth
+        self._samples = {}  # thread id -> Counter of collapsed stacks
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def start(self, thread_id):
+        """Begin collecting samples of a thread"""
+        with self._lock:
+            self._samples[thread_id] = Counter()
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def stop(self, thread_id):
+        """Stop sampling a thread and return its samples"""
+        with self._lock:
+            return self._samples.pop(thread_id, Counter())
+
+    def sample(self):
+        """Take one sample of every registered thread"""
+        frames = sys._current_frames()
+        with self._lock:
+            for thread_id, samples in self._samples.items():
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    samples[collapse(frame, self.max_depth)] += 1
+
+    def _run(self):
+        while True:
+            with self._lock:
+                idle = not self._samples
+                if idle:
+                    self._wake.clear()
+            if idle:
+                self._wake.wait()
+                continue
+            self.sample()
+            time.sleep(self.interval)
+
+
+class RequestProfiler:
+    """
+    Opt-in profiling of requests (PROFILER_ENABLED).
+
+    A random PROFILER_SAMPLE_RATE share of requests is sampled every
+    PROFILER_INTERVAL_MS; a request carrying the `X-Profile-Token` header with
+    PROFILER_TOKEN is always sampled, and its own profile can be fetched
+    afterwards by the `X-Profile-Id` it gets back. Samples are aggregated per
+    route (the route is the root frame), served on the admin endpoint and,
+    with PROFILER_DIR set, written there as `profile-<pid>.folded`.
+
+    A forced request's profile has to be readable whichever worker answers
+    the fetch: with PROFILER_DIR it is written there as
+    `profile-<X-Profile-Id>.folded`; without it, the profiled response also
+    carries the stacks in `X-Profile-Stacks` (see `decode_stacks`).
+    """
+
+    def __init__(self, sampler=None, sample_rate=0.01, max_stacks=20000):
+        self.sampler = sampler or StackSampler()
+        self.sample_rate = sample_rate
+        self.max_stacks = max_stacks
+        self.enabled = False
+        self.token = None
+        self.directory = None
+        self.write_interval = 60
+        self._stacks = Counter()
+        self._profiled = 0
+        self._dropped = 0
+        self._recent = TTLCache(maxsize=50, ttl=3600)
+        self._written_at = 0.0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """Read the profiler settings and hook into requests when enabled"""
+        self.enabled = app.config.get('PROFILER_ENABLED', False)
+        if not self.enabled:
+            return
+        self.sample_rate = float(app.config.get('PROFILER_SAMPLE_RATE', self.sample_rate))
+        self.sampler.interval = float(app.config.get('PROFILER_INTERVAL_MS', self.sampler.interval * 1000)) / 1000
+        self.max_stacks = int(app.config.get('PROFILER_MAX_STACKS', self.max_stacks))
+        self.token = app.config.get('PROFILER_TOKEN') or None
+        self.directory = app.config.get('PROFILER_DIR') or None
+        self.write_interval = float(app.config.get('PROFILER_WRITE_INTERVAL', self.write_interval))
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+
+    def forced(self):
+        """True if the request carries the profiling token"""
+        supplied = request.headers.get(PROFILE_HEADER)
+        return bool(self.token and supplied and hmac.compare_digest(supplied.encode(), self.token.encode()))
+
+    def stacks(self, route=None):
+        """Aggregated samples, optionally of one route, as collapsed stack text"""
+        with self._lock:
+            stacks = Counter(self._stacks)
+        if route:
+            stacks = Counter({stack: count for stack, count in stacks.items()
+                              if stack.split(";", 1)[0] == route})
+        return render_collapsed(stacks)
+
+    def request_profile(self, profile_id):
+        """Collapsed stacks of one forced request, or None once forgotten"""
+        if not _PROFILE_ID.match(profile_id):
+            return None
+        stacks = self._recent.get(profile_id)
+        if stacks is None and self.directory:
+            # Served by another worker
+            try:
+                with open(self._request_profile_path(profile_id)) as handle:
+                    stacks = handle.read()
+            except FileNotFoundError:
+                return None
+        return stacks
+
+    def _request_profile_path(self, profile_id):
+        return os.path.join(self.directory, f"profile-{profile_id}.folded")
+
+    def stats(self):
+        with self._lock:
+            return {"profiled_requests": self._profiled, "stacks": len(self._stacks),
+                    "dropped_samples": self._dropped, "sample_rate": self.sample_rate}
+
+    def reset(self):
+        """Forget the aggregated samples"""
+        with self._lock:
+            self._stacks.clear()
+            self._profiled = 0
+            self._dropped = 0
+
+    def write(self):
+        """Write the aggregate to PROFILER_DIR (replacing this worker's previous file)"""
+        _replace_file(os.path.join(self.directory, f"profile-{os.getpid()}.folded"), self.stacks())
+        self._written_at = time.monotonic()
+
+    def _before_request(self):
+        forced = self.forced()
+        if forced or random.random() < self.sample_rate:
+            g._profile_forced = forced
+            g._profile_thread = threading.get_ident()
+            self.sampler.start(g._profile_thread)
+
+    def _after_request(self, response):
+        samples = self._finish()
+        if samples is not None and g.get("_profile_forced"):
+            profile_id = uuid.uuid4().hex
+            stacks = render_collapsed(samples)
+            self._recent.set(profile_id, stacks)
+            response.headers["X-Profile-Id"] = profile_id
+            response.headers["X-Profile-Samples"] = str(sum(samples.values()))
+            if self.directory:
+                _replace_file(self._request_profile_path(profile_id), stacks)
+            else:
+                value, left_out = encode_stacks(samples)
+                response.headers["X-Profile-Stacks"] = value
+                if left_out:
+                    response.headers["X-Profile-Stacks-Omitted"] = str(left_out)
+        return response
+
+    def _teardown_request(self, exc):
+        # Requests that failed before after_request still stop being sampled
+        self._finish()
+
+    def _finish(self):
+        thread_id = g.pop("_profile_thread", None)
+        if thread_id is None:
+            return None
+        samples = self.sampler.stop(thread_id)
+        route = f"{request.method} {request.url_rule.rule if request.url_rule is not None else '<unmatched>'}"
+        rooted = Counter({f"{route};{stack}": count for stack, count in samples.items()})
+        with self._lock:
+            self._profiled += 1
+            for stack, count in rooted.items():
+                if stack in self._stacks or len(self._stacks) < self.max_stacks:
+                    self._stacks[stack] += count
+                else:
+                    self._dropped += count
+        if self.directory and time.monotonic() - self._written_at >= self.write_interval:
+            self.write()
+        return rooted
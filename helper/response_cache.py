@@ -0,0 +1,225 @@
+"""Cached responses with strong ETags for public GET endpoints"""
+import hashlib
+import threading
+from functools import wraps
+
+from flask import request, make_response
+from werkzeug.http import parse_etags, quote_etag
+
+from helper import signals
+from helper.ttl_cache import TTLCache
+
+
+# Tag of the public events listing
+EVENTS_TAG = "events"
+
+
+def event_tag(event_id):
+    """Tag of one event's detail"""
+    return f"event:{event_id}"
+
+
+def packages_tag(event_id):
+    """Tag of one event's packages (and their availability)"""
+    return f"packages:{event_id}"
+
+
+class InMemoryResponseStore:
+    """
+    Responses kept in this process, bounded in size and age, plus the
+    version counter of every tag.
+
+    Versions bumped here are only seen by this process, so this store is for
+    a single worker process and tests; see MySQLResponseStore otherwise.
+    """
+
+    def __init__(self, maxsize=2000, ttl=300):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """Read size and lifetime of cached responses from the app config"""
+        self._cache.maxsize = int(app.config.get('RESPONSE_CACHE_MAX_ENTRIES', self._cache.maxsize))
+        self._cache.ttl = int(app.config.get('RESPONSE_CACHE_TTL', self._cache.ttl))
+
+    def get(self, key):
+        """Stored response, or None"""
+        return self._cache.get(key)
+
+    def set(self, key, entry):
+        """Store a response"""
+        self._cache.set(key, entry)
+
+    def version(self, tag):
+        """Current version of a tag"""
+        return self._versions.get(tag, 0)
+
+    def versions(self, tags):
+        """Current version of each tag, as a dict"""
+        return {tag: self.version(tag) for tag in tags}
+
+    def bump(self, tag):
+        """Make every response cached under the tag outdated"""
+        with self._lock:
+            self._versions[tag] = self._versions.get(tag, 0) + 1
+
+
+class MySQLResponseStore(InMemoryResponseStore):
+    """
+    Responses kept in this process, tag versions in the cache_versions table
+    (stuff/migrations/008_cache_versions.sql), shared by every worker.
+
+    A write bumps the version in the table, so every worker stops serving
+    (and answering 304 for) the old responses at once. Each lookup reads the
+    versions of its tags by primary key, which is far cheaper than the
+    queries behind the cached responses.
+
+    Args:
+        get_connection: Returns a pooled connection (helper.db_helper.get_connection).
+    """
+
+    def __init__(self, get_connection, maxsize=2000, ttl=300):
+        super().__init__(maxsize, ttl)
+        self.get_connection = get_connection
+
+    @staticmethod
+    def versions_query(tags):
+        """(query, params) reading the versions of `tags`; rows are (tag, version)"""
+        placeholders = ", ".join(["%s"] * len(tags))
+        return f"SELECT tag, version FROM cache_versions WHERE tag IN ({placeholders})", tuple(tags)
+
+    @staticmethod
+    def versions_from_rows(tags, rows):
+        """Result of `versions_query` as a dict; tags never bumped are at 0"""
+        found = dict(rows)
+        return {tag: found.get(tag, 0) for tag in tags}
+
+    def version(self, tag):
+        """Current version of a tag"""
+        return self.versions([tag])[tag]
+
+    def versions(self, tags):
+        """Current version of each tag, as a dict"""
+        tags = list(tags)
+        if not tags:
+            return {}
+        query, params = self.versions_query(tags)
+        with self.get_connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute(query, params)
+                return self.versions_from_rows(tags, cursor.fetchall())
+
+    def bump(self, tag):
+        """Make every response cached under the tag outdated, in every worker"""
+        with self.get_connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute("""
+                    INSERT INTO cache_versions (tag, version) VALUES (%s, 1)
+                    ON DUPLICATE KEY UPDATE version = version + 1
+                """, (tag,))
+
+
+class ResponseCache:
+    """
+    Caches successful GET responses per URL and serves them with an ETag.
+
+    Every cached route declares the tags its content depends on. A key
+    includes the current version of those tags, so bumping a tag (on the
+    signals from helper.signals) retires the old responses at once without
+    scanning the store. Clients sending a matching If-None-Match get a 304.
+    """
+
+    def __init__(self, store=None, max_age=0):
+        self._store_given = store is not None
+        self.store = store or InMemoryResponseStore()
+        self.max_age = max_age
+        self.enabled = True
+
+    def init_app(self, app):
+        """Read the cache settings, pick the store and subscribe to the change signals"""
+        self.enabled = app.config.get('RESPONSE_CACHE_ENABLED', True)
+        self.max_age = int(app.config.get('RESPONSE_CACHE_MAX_AGE', self.max_age))
+        if not self._store_given and app.config.get('RESPONSE_CACHE_STORE', 'mysql') == 'mysql':
+            # Imported here so the cache itself does not need a configured database
+            from helper.db_helper import get_connection
+            self.store = MySQLResponseStore(get_connection)
+        if hasattr(self.store, "init_app"):
+            self.store.init_app(app)
+        signals.event_changed.connect(self._on_event_changed, weak=False)
+        signals.packages_changed.connect(self._on_packages_changed, weak=False)
+        signals.tickets_purchased.connect(self._on_packages_changed, weak=False)
+
+    def invalidate(self, *tags):
+        """Retire every cached response depending on one of the tags"""
+        for tag in tags:
+            self.store.bump(tag)
+
+    def cached(self, tags):
+        """
+        Decorator for public GET endpoints.
+
+        `tags` gets the view arguments and returns the tags the response
+        depends on, e.g. `lambda id_acara: [packages_tag(id_acara)]`.
+        Only 200 responses are cached.
+        """
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if not self.enabled or request.method != "GET":
+                    return view(*args, **kwargs)
+
+                key = self.key(request.full_path, tags(**kwargs))
+                entry = self.store.get(key)
+                if entry is None:
+                    response = make_response(view(*args, **kwargs))
+                    if response.status_code != 200 or response.direct_passthrough:
+                        return response
+                    entry = self.remember(key, response.get_data(), response.mimetype)
+
+                return self._respond(entry)
+            return wrapper
+        return decorator
+
+    def key(self, full_path, tags, versions=None):
+        """
+        Store key of a URL (path and query string) under the current versions
+        of its tags; `versions` when the caller already read them.
+        """
+        tags = list(tags)
+        if versions is None:
+            versions = self.store.versions(tags)
+        return f"{full_path}|" + ",".join(f"{tag}@{versions[tag]}" for tag in tags)
+
+    def remember(self, key, body, mimetype):
+        """Store a 200 response body and return its entry"""
+        entry = {
+            "body": body,
+            "mimetype": mimetype,
+            "etag": hashlib.sha256(body).hexdigest()[:32],
+        }
+        self.store.set(key, entry)
+        return entry
+
+    def not_modified(self, entry, if_none_match):
+        """True when the If-None-Match header value already names the entry's ETag"""
+        return entry["etag"] in parse_etags(if_none_match)
+
+    def headers(self, entry):
+        """ETag and Cache-Control of a cached response"""
+        return {"ETag": quote_etag(entry["etag"]), "Cache-Control": f"public, max-age={self.max_age}"}
+
+    def _respond(self, entry):
+        if self.not_modified(entry, request.headers.get("If-None-Match")):
+            response = make_response("", 304)
+        else:
+            response = make_response(entry["body"], 200)
+            response.mimetype = entry["mimetype"]
+        response.headers.update(self.headers(entry))
+        return response
+
+    def _on_event_changed(self, sender, event_id, **_):
+        self.invalidate(EVENTS_TAG, event_tag(event_id), packages_tag(event_id))
+
+    def _on_packages_changed(self, sender, event_id, **_):
+        self.invalidate(packages_tag(event_id))
@@ -0,0 +1,159 @@
+"""Sold and validated counters per package, kept in step with the tickets table"""
+from collections import Counter
+
+import click
+from flask.cli import AppGroup
+
+from helper import prepared_statements
+
+# Counters are applied as upserts, so packages without a row yet start at 0.
+# Must run inside the transaction that changes the tickets.
+BUMP_QUERY = """
+    INSERT INTO package_sales (package_id, event_id, sold, validated, revenue)
+    VALUES (%s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE sold = sold + VALUES(sold), validated = validated + VALUES(validated),
+        revenue = revenue + VALUES(revenue)
+"""
+
+# New tickets add sold * the package price; the purchase transaction has the
+# package row locked, so this is the price the tickets were inserted with
+SALES_QUERY = """
+    INSERT INTO package_sales (package_id, event_id, sold, validated, revenue)
+    VALUES (%s, %s, %s, 0, %s * (SELECT price FROM packages WHERE id = %s))
+    ON DUPLICATE KEY UPDATE sold = sold + VALUES(sold), revenue = revenue + VALUES(revenue)
+"""
+
+SUMMARY_QUERY = """
+    SELECT p.id, p.name, p.price, p.total_tickets_available,
+           COALESCE(s.sold, 0), COALESCE(s.validated, 0), COALESCE(s.revenue, 0)
+    FROM packages p
+    LEFT JOIN package_sales s ON s.package_id = p.id
+    WHERE p.id_acara = %s
+    ORDER BY p.id
+"""
+
+# Counts recomputed from tickets, one row per package (also packages with no tickets)
+RECOUNT_QUERY = """
+    SELECT p.id, p.id_acara, COUNT(t.id), COUNT(t.deleted_at), COALESCE(SUM(t.price), 0)
+    FROM packages p
+    LEFT JOIN tickets t ON t.package_id = p.id
+    {where}
+    GROUP BY p.id, p.id_acara
+"""
+
+
+def _bump(cursor, query, rows, connection=None):
+    # Rows come sorted by package, the same order in every transaction, so
+    # concurrent updates can not deadlock
+    if len(rows) == 1 and connection is not None:
+        # Single-package case (one ticket bought or scanned) is the hot one
+        prepared_statements.execute(connection, cursor, query, rows[0])
+    elif rows:
+        cursor.executemany(query, rows)
+
+
+def record_sales(cursor, event_id, package_ids, connection=None):
+    """Count new tickets and their revenue, given the package of each one"""
+    sold = Counter(package_ids)
+    _bump(cursor, SALES_QUERY, [(package_id, event_id, sold[package_id], sold[package_id], package_id)
+                                for package_id in sorted(sold)], connection)
+
+
+def record_validations(cursor, event_id, package_ids, connection=None):
+    """Count tickets marked as used, given the package of each one"""
+    validated = Counter(package_ids)
+    _bump(cursor, BUMP_QUERY, [(package_id, event_id, 0, validated[package_id], 0)
+                               for package_id in sorted(validated)], connection)
+
+
+def record_deletion(cursor, event_id, package_id, was_validated, price):
+    """Take a deleted ticket, bought for `price`, out of the counters"""
+    _bump(cursor, BUMP_QUERY, [(package_id, event_id, -1, -1 if was_validated else 0, -(price or 0))])
+
+
+def event_summary(cursor, event_id):
+    """
+    Sales dashboard of an event from the counters.
+
+    Revenue is the sum of what the sold tickets were bought for, so later
+    price changes do not alter it; `price` is the current price. Reads one
+    row per package, whatever the number of tickets.
+    """
+    cursor.execute(SUMMARY_QUERY, (event_id,))
+    packages = []
+    for package_id, name, price, remaining, sold, validated, revenue in cursor.fetchall():
+        packages.append({
+            "package_id": package_id,
+            "package_name": name,
+            "price": float(price),
+            "sold": int(sold),
+            "validated": int(validated),
+            "remaining": remaining,
+            "revenue": float(revenue)
+        })
+    totals = {
+        field: sum(package[field] for package in packages)
+        for field in ("sold", "validated", "remaining", "revenue")
+    }
+    return {"event_id": event_id, "totals": totals, "packages": packages}
+
+
+def rebuild(connection, event_id=None):
+    """
+    Recount the counters from the tickets table, for one event or all.
+
+    Returns:
+        list: (package_id, old (sold, validated, revenue), new (sold,
+        validated, revenue)) for every package whose counters were off.
+    """
+    where, params = ("WHERE p.id_acara = %s", (event_id,)) if event_id else ("", ())
+    with connection.cursor() as cursor:
+        connection.start_transaction()
+        try:
+            # Lock the counters first: purchases committed before the recount are
+            # in it, later ones wait and add themselves on top of it
+            scope, scope_params = ("WHERE event_id = %s", (event_id,)) if event_id else ("", ())
+            cursor.execute(f"SELECT package_id, sold, validated, revenue FROM package_sales {scope} FOR UPDATE",
+                           scope_params)
+            stored = {row[0]: tuple(row[1:]) for row in cursor.fetchall()}
+
+            cursor.execute(RECOUNT_QUERY.format(where=where), params)
+            counts = cursor.fetchall()
+
+            drift = []
+            for package_id, package_event_id, sold, validated, revenue in counts:
+                old = stored.pop(package_id, (0, 0, 0))
+                if old != (sold, validated, revenue):
+                    drift.append((package_id, old, (sold, validated, revenue)))
+                    cursor.execute("""
+                        INSERT INTO package_sales (package_id, event_id, sold, validated, revenue)
+                        VALUES (%s, %s, %s, %s, %s)
+                        ON DUPLICATE KEY UPDATE sold = VALUES(sold), validated = VALUES(validated),
+                            revenue = VALUES(revenue)
+                    """, (package_id, package_event_id, sold, validated, revenue))
+
+            # Counters of packages that no longer exist
+            for package_id, old in stored.items():
+                drift.append((package_id, old, (0, 0, 0)))
+                cursor.execute("DELETE FROM package_sales WHERE package_id = %s", (package_id,))
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+    return drift
+
+
+sales_cli = AppGroup("sales", help="Sales counters (package_sales).")
+
+
+@sales_cli.command("rebuild")
+@click.option("--event", "event_id", type=int, default=None, help="Only recount this event.")
+def rebuild_command(event_id):
+    """Recount package_sales from the tickets table and report drift."""
+    from helper.db_helper import get_connection
+    with get_connection() as connection:
+        drift = rebuild(connection, event_id)
+    for package_id, old, new in drift:
+        click.echo(f"package {package_id}: sold/validated/revenue {old[0]}/{old[1]}/{old[2]} "
+                   f"-> {new[0]}/{new[1]}/{new[2]}")
+    click.echo(f"{len(drift)} package(s) corrected.")
@@ -0,0 +1,22 @@
+"""In-process notifications sent after ticket and event changes are committed
+
+Endpoints send these once their transaction is committed; caches, indexes and
+other subsystems connect to them in their `init_app`. Receivers are called as
+`receiver(sender, **payload)`.
+"""
+from blinker import Namespace
+
+_signals = Namespace()
+
+# event_id, user_id, ticket_ids
+tickets_purchased = _signals.signal('tickets-purchased')
+# event_id, ticket_ids, owner_ids
+tickets_validated = _signals.signal('tickets-validated')
+# event_id, ticket_id, from_user_id, to_user_id
+ticket_transferred = _signals.signal('ticket-transferred')
+# event_id, ticket_id, user_id
+ticket_deleted = _signals.signal('ticket-deleted')
+# event_id, holder_ids (users holding tickets of the event; omitted for a new event)
+event_changed = _signals.signal('event-changed')
+# event_id, package_id (None when several packages changed)
+packages_changed = _signals.signal('packages-changed')
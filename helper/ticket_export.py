@@ -0,0 +1,101 @@
+"""Streaming export of an event's attendee list"""
+import csv
+import io
+import json
+from datetime import date
+from decimal import Decimal
+
+EXPORT_FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+EXPORT_COLUMNS = [
+    "ticket_id", "ticket_owner_id", "ticket_owner_username", "ticket_owner_email",
+    "package_id", "package_name", "package_price", "purchase_date", "deleted_by", "deleted_at",
+]
+
+EXPORT_QUERY = """
+    SELECT t.id, t.user_id, u.username, u.email, t.package_id, p.name, p.price,
+           t.purchase_date, t.deleted_by, t.deleted_at
+    FROM tickets t
+    JOIN packages p ON t.package_id = p.id
+    JOIN user u ON t.user_id = u.id
+    WHERE p.id_acara = %s
+    ORDER BY t.id
+"""
+
+
+# Leading characters that make spreadsheet apps read a cell as a formula
+_FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+def spreadsheet_safe(value):
+    """Text cells starting like a formula are prefixed with ' so they open as text"""
+    if isinstance(value, str) and value.startswith(_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def _plain(value):
+    if isinstance(value, date):
+        return value.isoformat(sep=" ") if hasattr(value, "hour") else value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def csv_chunks(batches):
+    """
+    CSV text, one chunk per batch of rows, starting with the header.
+
+    User-controlled text (usernames, emails, package names) goes through
+    spreadsheet_safe(), so opening the file can not run an injected formula.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for rows in batches:
+        writer.writerows([[_plain(spreadsheet_safe(value)) for value in row] for row in rows])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def ndjson_chunks(batches):
+    """One JSON object per line, one chunk per batch of rows"""
+    for rows in batches:
+        yield "".join(json.dumps(dict(zip(EXPORT_COLUMNS, map(_plain, row))), separators=(",", ":")) + "\n"
+                      for row in rows)
+
+
+def fetch_batches(cursor, size):
+    """Rows of the executed query in lists of up to `size`"""
+    while True:
+        rows = cursor.fetchmany(size)
+        if not rows:
+            return
+        yield rows
+
+
+def stream_attendees(get_connection, event_id, export_format, batch_size=1000):
+    """
+    Generator of the export, for a streamed Flask response.
+
+    The query runs on an unbuffered cursor, so MySQL sends the rows as they
+    are read and only one batch is in memory at a time. The connection is
+    held until the download ends.
+    """
+    chunks = csv_chunks if export_format == "csv" else ndjson_chunks
+    with get_connection() as connection:
+        cursor = connection.cursor(buffered=False)
+        try:
+            cursor.execute(EXPORT_QUERY, (event_id,))
+            yield from chunks(fetch_batches(cursor, batch_size))
+        finally:
+            # Sisa hasil harus dibaca sebelum koneksi kembali ke pool (mis. download dibatalkan)
+            for _ in fetch_batches(cursor, batch_size):
+                pass
+            cursor.close()
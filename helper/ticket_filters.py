@@ -0,0 +1,82 @@
+"""Filters of the /user_tickets listing"""
+from datetime import date, timedelta
+
+from helper.event_search import boolean_query, match_events
+
+# Nilai `status` yang diterima (Indonesia dan Inggris)
+STATUS_FILTERS = {
+    "terpakai": "t.deleted_at IS NOT NULL",
+    "used": "t.deleted_at IS NOT NULL",
+    "belum terpakai": "t.deleted_at IS NULL",
+    "unused": "t.deleted_at IS NULL",
+}
+
+
+class InvalidFilter(ValueError):
+    """A filter parameter has a value that can not be used"""
+
+
+def parse_date(value, name):
+    """Date of a YYYY-MM-DD query parameter, None when empty"""
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError as e:
+        raise InvalidFilter(f"'{name}' must be a date (YYYY-MM-DD).") from e
+
+
+def user_ticket_filters(search="", status="", date_from="", date_to=""):
+    """
+    SQL conditions for a user's tickets joined as t (tickets) and e (events).
+
+    - search: words in the event name or description, through the events
+      FULLTEXT index (prefix match, case-insensitive). A YYYY-MM-DD search
+      matches events on that day instead.
+    - status: one of STATUS_FILTERS.
+    - date_from / date_to: inclusive event date range. Written as
+      `e.tanggal >= from AND e.tanggal < day after to`, so it stays a range
+      on the column whether tanggal is a DATE or a DATETIME.
+
+    Returns:
+        tuple: (" AND ..." clause or "", params)
+
+    Raises:
+        InvalidFilter: On an unknown status or a malformed/inverted date range.
+    """
+    clauses = []
+    params = []
+
+    search = (search or "").strip()
+    if search:
+        try:
+            day = date.fromisoformat(search)
+        except ValueError:
+            day = None
+        if day:
+            clauses.append("e.tanggal >= %s AND e.tanggal < %s")
+            params.extend([day, day + timedelta(days=1)])
+        else:
+            query = boolean_query(search)
+            if query:
+                clauses.append(match_events("e"))
+                params.append(query)
+
+    status = (status or "").strip().lower()
+    if status:
+        if status not in STATUS_FILTERS:
+            raise InvalidFilter("'status' must be one of: " + ", ".join(STATUS_FILTERS) + ".")
+        clauses.append(STATUS_FILTERS[status])
+
+    start = parse_date(date_from, "date_from")
+    end = parse_date(date_to, "date_to")
+    if start and end and start > end:
+        raise InvalidFilter("'date_from' must not be after 'date_to'.")
+    if start:
+        clauses.append("e.tanggal >= %s")
+        params.append(start)
+    if end:
+        clauses.append("e.tanggal < %s")
+        params.append(end + timedelta(days=1))
+
+    return "".join(f" AND {clause}" for clause in clauses), params
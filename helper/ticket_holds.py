@@ -0,0 +1,258 @@
+"""Time-limited ticket holds and the background sweeper that releases them"""
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from helper import signals
+from helper.db_helper import get_connection
+from helper.ticket_purchase import PurchaseError, reserve_stock, insert_tickets
+from helper.sales_summary import record_sales
+
+
+class HoldNotFound(PurchaseError):
+    """The hold does not exist or belongs to another user"""
+    status_code = 404
+    message = "Hold not found."
+
+
+class HoldLimitReached(PurchaseError):
+    """The user already holds as many tickets (or holds) of the package as allowed"""
+    status_code = 409
+    message = "You already hold the maximum number of tickets of this package."
+
+
+class HoldExpired(PurchaseError):
+    """The hold ran out (or was already used) before it was confirmed"""
+    status_code = 400
+    message = "This hold has expired or was already confirmed."
+
+
+INSERT_HOLD_QUERY = """
+    INSERT INTO ticket_holds (user_id, package_id, quantity, expires_at)
+    VALUES (%s, %s, %s, %s)
+"""
+
+CONFIRM_HOLD_QUERY = """
+    UPDATE ticket_holds
+    SET status = 'confirmed', confirmed_at = %s
+    WHERE id = %s AND user_id = %s AND status = 'held' AND expires_at > %s
+"""
+
+# Live holds of one user on a package, next to the package's per-user limit
+ACTIVE_HOLDS_QUERY = """
+    SELECT COUNT(h.id), COALESCE(SUM(h.quantity), 0), p.tickets_per_package
+    FROM packages p
+    LEFT JOIN ticket_holds h
+        ON h.package_id = p.id AND h.user_id = %s AND h.status = 'held' AND h.expires_at > %s
+    WHERE p.id = %s
+    GROUP BY p.id, p.tickets_per_package
+"""
+
+EXPIRED_HOLDS_QUERY = """
+    SELECT id, package_id, quantity
+    FROM ticket_holds
+    WHERE status = 'held' AND expires_at <= %s
+    ORDER BY expires_at
+    LIMIT %s
+    FOR UPDATE SKIP LOCKED
+"""
+
+
+def create_hold(connection, user_id, event_id, package_id, quantity, ttl, max_holds=2):
+    """
+    Reserve `quantity` tickets of a package for `ttl` seconds.
+
+    The stock leaves the package right away, so nobody else can buy it while
+    the user is checking out, but no row lock is held after this returns.
+
+    A user's live holds on a package may add up to at most the package's
+    tickets_per_package, and there may be at most `max_holds` of them, so one
+    account can not keep the whole stock on hold by holding again and again.
+
+    Raises:
+        HoldLimitReached: If the new hold would go over either limit.
+
+    Returns:
+        tuple: (hold_id, expires_at)
+    """
+    now = datetime.now()
+    expires_at = now + timedelta(seconds=ttl)
+
+    with connection.cursor() as cursor:
+        connection.start_transaction()
+        try:
+            reserve_stock(connection, cursor, event_id, package_id, quantity)
+            # The package row is locked by the reservation, so concurrent holds
+            # of the same package are counted one after another
+            cursor.execute(ACTIVE_HOLDS_QUERY, (user_id, now, package_id))
+            holds, held, per_user = cursor.fetchone()
+            if holds >= max_holds or held + quantity > per_user:
+                connection.rollback()
+                raise HoldLimitReached()
+            cursor.execute(INSERT_HOLD_QUERY, (user_id, package_id, quantity, expires_at))
+            hold_id = cursor.lastrowid
+            connection.commit()
+        except PurchaseError:
+            raise
+        except Exception:
+            connection.rollback()
+            raise
+
+    return hold_id, expires_at
+
+
+def confirm_hold(connection, user_id, hold_id):
+    """
+    Turn a live hold into tickets.
+
+    The hold is claimed with a conditional UPDATE, so a hold that the sweeper
+    is releasing at the same moment can only end up on one side.
+
+    Returns:
+        tuple: (event_id, IDs of the new tickets)
+    """
+    now = datetime.now()
+
+    with connection.cursor() as cursor:
+        connection.start_transaction()
+        try:
+            cursor.execute(CONFIRM_HOLD_QUERY, (now, hold_id, user_id, now))
+            if cursor.rowcount != 1:
+                connection.rollback()
+                cursor.execute("SELECT 1 FROM ticket_holds WHERE id = %s AND user_id = %s", (hold_id, user_id))
+                if not cursor.fetchone():
+                    raise HoldNotFound()
+                raise HoldExpired()
+
+            cursor.execute("""
+                SELECT h.package_id, h.quantity, p.id_acara
+                FROM ticket_holds h
+                JOIN packages p ON h.package_id = p.id
+                WHERE h.id = %s
+            """, (hold_id,))
+            package_id, quantity, event_id = cursor.fetchone()
+            ticket_ids = insert_tickets(cursor, user_id, package_id, quantity, now)
+            record_sales(cursor, event_id, [package_id] * quantity)
+            connection.commit()
+        except PurchaseError:
+            raise
+        except Exception:
+            connection.rollback()
+            raise
+
+    return event_id, ticket_ids
+
+
+def release_expired_holds(connection, batch_size=500, now=None):
+    """
+    Give the stock of up to `batch_size` expired holds back to their packages.
+
+    One transaction per batch: the holds are claimed with SKIP LOCKED (so
+    several sweepers can run side by side), flagged as released, and the stock
+    goes back with a single UPDATE over all touched packages. Afterwards
+    `packages_changed` is sent for every event whose stock came back.
+
+    Returns:
+        int: Number of holds released.
+    """
+    now = now or datetime.now()
+
+    with connection.cursor() as cursor:
+        connection.start_transaction()
+        try:
+            cursor.execute(EXPIRED_HOLDS_QUERY, (now, batch_size))
+            holds = cursor.fetchall()
+            if not holds:
+                connection.rollback()
+                return 0
+
+            hold_ids = [row[0] for row in holds]
+            id_placeholders = ", ".join(["%s"] * len(hold_ids))
+            cursor.execute(
+                f"UPDATE ticket_holds SET status = 'released' WHERE id IN ({id_placeholders})",
+                hold_ids)
+
+            released = defaultdict(int)
+            for _, package_id, quantity in holds:
+                released[package_id] += quantity
+
+            cases = " ".join(["WHEN %s THEN %s"] * len(released))
+            package_placeholders = ", ".join(["%s"] * len(released))
+            params = [value for item in released.items() for value in item] + list(released)
+            cursor.execute(f"""
+                UPDATE packages
+                SET total_tickets_available = total_tickets_available + CASE id {cases} END
+                WHERE id IN ({package_placeholders})
+            """, params)
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+
+        cursor.execute(f"SELECT DISTINCT id_acara FROM packages WHERE id IN ({package_placeholders})", list(released))
+        event_ids = [row[0] for row in cursor.fetchall()]
+
+    for event_id in event_ids:
+        signals.packages_changed.send(None, event_id=event_id, package_id=None)
+    return len(holds)
+
+
+class HoldSweeper:
+    """
+    Background thread that releases expired holds in batches.
+
+    The thread is started by the first request the app serves, so commands
+    and scripts that only import the app (`flask sales rebuild`, the tests)
+    never run it, and pre-forking servers start one per worker after the fork.
+    """
+
+    def __init__(self, interval=30, batch_size=500):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.logger = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def init_app(self, app):
+        """Read the sweeper settings and, unless disabled, start it with the first request"""
+        self.interval = int(app.config.get('HOLD_SWEEP_INTERVAL', self.interval))
+        self.batch_size = int(app.config.get('HOLD_SWEEP_BATCH', self.batch_size))
+        self.logger = app.logger
+        if app.config.get('HOLD_SWEEPER_ENABLED', True):
+            app.before_request(self.start)
+
+    def start(self):
+        """Start the sweeper thread (no-op if it already runs)"""
+        if self._thread and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="hold-sweeper", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Ask the sweeper thread to finish"""
+        self._stop.set()
+
+    def run_once(self):
+        """Release expired holds until a batch comes back short. Returns the total released."""
+        total = 0
+        while True:
+            with get_connection() as connection:
+                released = release_expired_holds(connection, self.batch_size)
+            total += released
+            if released < self.batch_size:
+                return total
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                released = self.run_once()
+                if released and self.logger:
+                    self.logger.info(f"Released {released} expired ticket holds")
+            except Exception as e:
+                if self.logger:
+                    self.logger.error(f"Hold sweeper failed: {e}")
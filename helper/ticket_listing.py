@@ -0,0 +1,87 @@
+"""Queries of the public tickets listing of an event, shared by the Flask view and its async twin"""
+from helper.pagination import decode_cursor, keyset_condition, next_cursor
+
+SELECT_CLAUSE = """
+    SELECT
+        t.id AS ticket_id,
+        t.user_id AS ticket_owner_id,
+        u.username AS ticket_owner_username,
+        u.email AS ticket_owner_email,
+        t.package_id,
+        p.name AS package_name,
+        p.price AS package_price,
+        t.purchase_date,
+        t.deleted_by,
+        t.deleted_at
+"""
+
+# FROM and filters are shared by the page query and the count query
+FROM_CLAUSE = """
+    FROM tickets t
+    JOIN packages p ON t.package_id = p.id
+    JOIN user u ON t.user_id = u.id
+    WHERE p.id_acara = %s
+"""
+
+STATUS_FILTERS = {
+    'Terpakai': " AND t.deleted_at IS NOT NULL",
+    'Belum terpakai': " AND t.deleted_at IS NULL",
+}
+
+
+def status_filter_clause(status):
+    """Filter of the `status` parameter; unknown values filter nothing"""
+    return STATUS_FILTERS.get(status, "")
+
+
+def page_query(filter_clause, filter_params, page, per_page, after=None):
+    """
+    (query, params) of one page, ordered by (purchase_date, id).
+
+    With `after` (a cursor from `next_cursor`) the page continues after that
+    row without OFFSET. One row more than `per_page` is read to tell whether
+    a next page exists.
+
+    Raises:
+        InvalidCursor: If `after` can not be decoded.
+    """
+    query = SELECT_CLAUSE + filter_clause
+    params = list(filter_params)
+    if after:
+        keyset_clause, keyset_params = keyset_condition(["t.purchase_date", "t.id"], decode_cursor(after, 2))
+        query += f" AND {keyset_clause} ORDER BY t.purchase_date, t.id LIMIT %s"
+        params += keyset_params + [per_page + 1]
+    else:
+        query += " ORDER BY t.purchase_date, t.id LIMIT %s OFFSET %s"
+        params += [per_page + 1, (page - 1) * per_page]
+    return query, tuple(params)
+
+
+def listing_payload(results, total_count, count_is_estimate, page, per_page):
+    """Response body of the rows of `page_query` and the count"""
+    results = list(results)
+    cursor_next = next_cursor(results, per_page, lambda row: (row[7], row[0]))
+    tickets = [
+        {
+            "ticket_id": row[0],
+            "ticket_owner_id": row[1],
+            "ticket_owner_username": row[2],
+            "ticket_owner_email": row[3],
+            "package_id": row[4],
+            "package_name": row[5],
+            "package_price": row[6],
+            "purchase_date": row[7],
+            "deleted_by": row[8],
+            "deleted_at": row[9]
+        }
+        for row in results
+    ]
+    return {
+        "tickets": tickets,
+        "total_count": total_count,
+        "count_is_estimate": count_is_estimate,
+        "page": page,
+        "per_page": per_page,
+        "total_pages": None if total_count is None else (total_count + per_page - 1) // per_page,
+        "next_cursor": cursor_next
+    }
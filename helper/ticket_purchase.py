@@ -0,0 +1,238 @@
+"""Ticket purchase engine - reserve stock and issue the ticket in one short transaction"""
+import uuid
+from datetime import datetime
+
+from helper import prepared_statements
+from helper.sales_summary import record_sales
+
+
+class PurchaseError(Exception):
+    """Base error for a purchase that can not be completed"""
+    status_code = 400
+    message = "Unable to purchase ticket."
+
+    def __init__(self, message=None):
+        super().__init__(message or self.message)
+        self.message = message or self.message
+
+
+class PackageNotFound(PurchaseError):
+    """The package does not exist or does not belong to the event"""
+    status_code = 404
+    message = "Package not found."
+
+
+class SoldOut(PurchaseError):
+    """Not enough stock left in the package"""
+    status_code = 400
+    message = "No tickets available."
+
+
+class OverLimit(PurchaseError):
+    """More tickets of a package than its tickets_per_package allows"""
+    status_code = 400
+    message = "You can not buy that many tickets of this package."
+
+
+# Conditional decrement: the row is only touched when enough stock is left,
+# so concurrent buyers can never push total_tickets_available below zero.
+RESERVE_STOCK_QUERY = """
+    UPDATE packages
+    SET total_tickets_available = total_tickets_available - %s
+    WHERE id = %s AND id_acara = %s
+        AND total_tickets_available >= %s AND tickets_per_package >= %s
+"""
+
+# Each ticket keeps the price it was bought for; the package row is locked by
+# the reservation, so it is the same price record_sales() adds to revenue
+INSERT_TICKET_QUERY = """
+    INSERT INTO tickets (user_id, package_id, purchase_date, price)
+    VALUES (%s, %s, %s, (SELECT price FROM packages WHERE id = %s))
+"""
+
+INSERT_TICKET_BATCH_QUERY = """
+    INSERT INTO tickets (user_id, package_id, purchase_date, price, purchase_batch)
+    VALUES (%s, %s, %s, (SELECT price FROM packages WHERE id = %s), %s)
+"""
+
+
+
+def reserve_stock(connection, cursor, event_id, package_id, quantity=1):
+    """
+    Take `quantity` tickets off a package inside the running transaction.
+
+    The transaction is rolled back before raising.
+
+    Raises:
+        PackageNotFound: If the package is not part of the event.
+        OverLimit: If `quantity` is above the package's tickets_per_package.
+        SoldOut: If the package has less than `quantity` tickets left.
+    """
+    result = prepared_statements.execute(connection, cursor, RESERVE_STOCK_QUERY,
+                                         (quantity, package_id, event_id, quantity, quantity))
+    if result.rowcount == 1:
+        return
+
+    connection.rollback()
+    _raise_reservation_error(cursor, event_id, {package_id: quantity})
+
+
+def reserve_stock_bulk(connection, cursor, event_id, quantities):
+    """
+    Take stock off several packages of one event with a single UPDATE.
+
+    Args:
+        quantities (dict): package_id -> number of tickets.
+
+    All packages are reserved or none is: if any of them can not cover its
+    quantity the transaction is rolled back and the first problem is raised.
+    """
+    cases = " ".join(["WHEN %s THEN %s"] * len(quantities))
+    guards = " OR ".join(
+        ["(id = %s AND total_tickets_available >= %s AND tickets_per_package >= %s)"] * len(quantities))
+    params = [value for item in quantities.items() for value in item]
+    params.append(event_id)
+    for package_id, quantity in quantities.items():
+        params += [package_id, quantity, quantity]
+
+    cursor.execute(f"""
+        UPDATE packages
+        SET total_tickets_available = total_tickets_available - CASE id {cases} END
+        WHERE id_acara = %s AND ({guards})
+    """, params)
+    if cursor.rowcount == len(quantities):
+        return
+
+    connection.rollback()
+    _raise_reservation_error(cursor, event_id, quantities)
+
+
+def _raise_reservation_error(cursor, event_id, quantities):
+    """Look the packages up again to explain why a reservation missed"""
+    placeholders = ", ".join(["%s"] * len(quantities))
+    cursor.execute(f"""
+        SELECT id, total_tickets_available, tickets_per_package
+        FROM packages
+        WHERE id_acara = %s AND id IN ({placeholders})
+    """, [event_id] + list(quantities))
+    packages = {str(row[0]): row[1:] for row in cursor.fetchall()}
+
+    for package_id, quantity in quantities.items():
+        if str(package_id) not in packages:
+            raise PackageNotFound(f"Package {package_id} not found.")
+        available, per_package = packages[str(package_id)]
+        if quantity > per_package:
+            raise OverLimit(f"Package {package_id} allows at most {per_package} ticket(s) per purchase.")
+        if quantity > available:
+            raise SoldOut(f"Only {available} ticket(s) left for package {package_id}.")
+    raise SoldOut()
+
+
+def insert_tickets(cursor, user_id, package_id, quantity=1, purchase_date=None, connection=None):
+    """Insert `quantity` ticket rows of one package for a user and return their IDs"""
+    return insert_ticket_rows(cursor, user_id, [package_id] * quantity, purchase_date, connection)
+
+
+def insert_ticket_rows(cursor, user_id, package_ids, purchase_date=None, connection=None):
+    """
+    Insert one ticket per entry of `package_ids` and return the new IDs in order.
+
+    A single row takes its ID from lastrowid, as a prepared statement when
+    `connection` is given. Several rows go out as one multi-row INSERT
+    (executemany) tagged with a fresh purchase_batch token, and their IDs are
+    read back by that token: the auto-increment values of such an INSERT are
+    ascending in row order but not necessarily consecutive
+    (auto_increment_increment, interleaved lock mode, split batches).
+    """
+    purchase_date = purchase_date or datetime.now()
+    if len(package_ids) == 1:
+        row = (user_id, package_ids[0], purchase_date, package_ids[0])
+        if connection is not None:
+            return [prepared_statements.execute(connection, cursor, INSERT_TICKET_QUERY, row).lastrowid]
+        cursor.execute(INSERT_TICKET_QUERY, row)
+        return [cursor.lastrowid]
+
+    batch = uuid.uuid4().hex
+    cursor.executemany(INSERT_TICKET_BATCH_QUERY,
+                       [(user_id, package_id, purchase_date, package_id, batch) for package_id in package_ids])
+    cursor.execute("SELECT id FROM tickets WHERE purchase_batch = %s ORDER BY id", (batch,))
+    ticket_ids = [row[0] for row in cursor.fetchall()]
+    if len(ticket_ids) != len(package_ids):
+        raise RuntimeError(f"Inserted {len(package_ids)} tickets but read back {len(ticket_ids)}")
+    return ticket_ids
+
+
+def purchase_ticket(connection, user_id, event_id, package_id):
+    """
+    Buy one ticket of a package.
+
+    The stock is reserved with a single conditional UPDATE and the ticket row
+    is inserted and counted in package_sales in the same transaction, so the
+    happy path costs three statements and a commit. All three are prepared
+    statements on pooled connections.
+
+    Args:
+        connection: Connection from `helper.db_helper.get_connection`.
+        user_id (int): Buyer.
+        event_id (int): Event the package must belong to.
+        package_id (int): Package to buy.
+
+    Returns:
+        int: ID of the new ticket.
+
+    Raises:
+        PackageNotFound: If the package is not part of the event.
+        SoldOut: If the package has no tickets left.
+    """
+    with connection.cursor() as cursor:
+        connection.start_transaction()
+        try:
+            reserve_stock(connection, cursor, event_id, package_id)
+            ticket_ids = insert_tickets(cursor, user_id, package_id, connection=connection)
+            record_sales(cursor, event_id, [package_id], connection)
+            connection.commit()
+        except PurchaseError:
+            raise
+        except Exception:
+            connection.rollback()
+            raise
+
+    return ticket_ids[0]
+
+
+def purchase_tickets(connection, user_id, event_id, items):
+    """
+    Buy several tickets, possibly of several packages, in one transaction.
+
+    Args:
+        items (list): (package_id, quantity) pairs. Repeated packages are merged.
+
+    Returns:
+        dict: package_id -> list of new ticket IDs.
+
+    Raises:
+        PackageNotFound, OverLimit, SoldOut: Nothing is bought in that case.
+    """
+    quantities = {}
+    for package_id, quantity in items:
+        quantities[package_id] = quantities.get(package_id, 0) + quantity
+
+    package_ids = [package_id for package_id, quantity in quantities.items() for _ in range(quantity)]
+
+    with connection.cursor() as cursor:
+        connection.start_transaction()
+        try:
+            reserve_stock_bulk(connection, cursor, event_id, quantities)
+            ticket_ids = insert_ticket_rows(cursor, user_id, package_ids)
+            record_sales(cursor, event_id, package_ids)
+            connection.commit()
+        except PurchaseError:
+            raise
+        except Exception:
+            connection.rollback()
+            raise
+
+    tickets = {}
+    for package_id, ticket_id in zip(package_ids, ticket_ids):
+        tickets.setdefault(package_id, []).append(ticket_id)
+    return tickets
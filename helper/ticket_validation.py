@@ -0,0 +1,145 @@
+"""Set-based ticket validation for gate scanners"""
+from datetime import datetime
+
+from helper.sales_summary import record_validations
+
+OK = "ok"
+ALREADY_USED = "already_used"
+NOT_FOUND = "not_found"
+WRONG_EVENT = "wrong_event"
+
+
+def classify_scans(ticket_ids, rows, event_id):
+    """
+    Decide the outcome of each scan before anything is written.
+
+    Args:
+        ticket_ids (list): Scanned ticket IDs in scan order, may repeat.
+        rows (list): (ticket_id, event_id, deleted_at, ...) rows for those tickets.
+        event_id (int): Event the scanner is checking in for.
+
+    Returns:
+        tuple: (results, candidates) where results is a list of [ticket_id, status]
+        in scan order (status None for tickets still to be marked) and
+        candidates the IDs that can be marked as used.
+    """
+    tickets = {row[0]: row[1:] for row in rows}
+    seen = set()
+    results = []
+    candidates = []
+
+    for ticket_id in ticket_ids:
+        if ticket_id in seen:
+            # Scanned twice in the same batch, only the first scan counts
+            results.append([ticket_id, ALREADY_USED])
+            continue
+        seen.add(ticket_id)
+
+        ticket = tickets.get(ticket_id)
+        if not ticket:
+            status = NOT_FOUND
+        elif ticket[0] != event_id:
+            status = WRONG_EVENT
+        elif ticket[1] is not None:
+            status = ALREADY_USED
+        else:
+            status = None
+            candidates.append(ticket_id)
+        results.append([ticket_id, status])
+
+    return results, candidates
+
+
+def validate_tickets(connection, user_id, event_id, ticket_ids, validated_at=None):
+    """
+    Mark a batch of scanned tickets of one event as used.
+
+    Committee rights must be checked by the caller. The batch costs two SELECTs
+    and one UPDATE: the unused tickets are locked with SELECT ... FOR UPDATE
+    and only those still unused are marked, so two gates scanning the same
+    ticket at once can not both succeed and each knows which tickets it
+    marked. The tickets marked here are counted in package_sales in the same
+    transaction.
+
+    Args:
+        validated_at: One datetime for the whole batch (default now), or a
+            dict ticket_id -> datetime when scans were recorded offline.
+
+    Returns:
+        list: {"ticket_id", "status", "validated_at", "owner_id"} per scan, in
+        scan order. validated_at is when the ticket was (first) used, None if
+        it was not; owner_id is None for unknown tickets.
+    """
+    if not isinstance(validated_at, dict):
+        batch_time = validated_at or datetime.now()
+        validated_at = {ticket_id: batch_time for ticket_id in ticket_ids}
+    # DATETIME drops sub-seconds, keep the values comparable with what is stored
+    validated_at = {ticket_id: value.replace(microsecond=0) for ticket_id, value in validated_at.items()}
+
+    unique_ids = list(dict.fromkeys(ticket_ids))
+    placeholders = ", ".join(["%s"] * len(unique_ids))
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            SELECT t.id, p.id_acara, t.deleted_at, t.user_id, t.package_id
+            FROM tickets t
+            JOIN packages p ON t.package_id = p.id
+            WHERE t.id IN ({placeholders})
+        """, unique_ids)
+        rows = cursor.fetchall()
+        used_at = {row[0]: row[2] for row in rows}
+        owners = {row[0]: row[3] for row in rows}
+        packages = {row[0]: row[4] for row in rows}
+        results, candidates = classify_scans(ticket_ids, rows, event_id)
+
+        marked = set()
+        if candidates:
+            connection.start_transaction()
+            try:
+                # Lock the candidates (in id order, so gates can not deadlock) and
+                # keep those another gate has not marked since the read above
+                candidate_placeholders = ", ".join(["%s"] * len(candidates))
+                cursor.execute(f"""
+                    SELECT id, deleted_at FROM tickets
+                    WHERE id IN ({candidate_placeholders})
+                    ORDER BY id FOR UPDATE
+                """, candidates)
+                for ticket_id, deleted_at in cursor.fetchall():
+                    if deleted_at is None:
+                        marked.add(ticket_id)
+                    else:
+                        used_at[ticket_id] = deleted_at
+
+                unused = [ticket_id for ticket_id in candidates if ticket_id in marked]
+                if unused:
+                    cases = " ".join(["WHEN %s THEN %s"] * len(unused))
+                    params = [user_id]
+                    for ticket_id in unused:
+                        params += [ticket_id, validated_at[ticket_id]]
+                        used_at[ticket_id] = validated_at[ticket_id]
+                    unused_placeholders = ", ".join(["%s"] * len(unused))
+                    cursor.execute(f"""
+                        UPDATE tickets
+                        SET deleted_by = %s, deleted_at = CASE id {cases} END
+                        WHERE id IN ({unused_placeholders})
+                    """, params + unused)
+
+                record_validations(cursor, event_id, [packages[ticket_id] for ticket_id in unused])
+                connection.commit()
+            except Exception:
+                connection.rollback()
+                raise
+
+    for result in results:
+        if result[1] is None:
+            result[1] = OK if result[0] in marked else ALREADY_USED
+
+    return [
+        {
+            "ticket_id": ticket_id,
+            "status": status,
+            "validated_at": used_at.get(ticket_id) if status in (OK, ALREADY_USED) else None,
+            "owner_id": owners.get(ticket_id)
+        }
+        for ticket_id, status in results
+    ]
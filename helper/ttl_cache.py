@@ -0,0 +1,70 @@
+"""Small thread-safe in-process cache with LRU eviction and per-entry expiry"""
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Bounded mapping whose entries expire after `ttl` seconds.
+
+    When more than `maxsize` entries are stored the least recently used one is
+    dropped, so memory stays bounded whatever the traffic looks like.
+    """
+
+    def __init__(self, maxsize=1024, ttl=60, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._data = OrderedDict()  # key -> (expires_at, value)
+
+    def get(self, key, default=None):
+        """Value of a live entry, or `default`"""
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                return default
+            if entry[0] <= self.clock():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, ttl=None):
+        """Store a value, replacing any previous one"""
+        with self._lock:
+            self._store(key, value, ttl)
+
+    def add(self, key, value, ttl=None):
+        """Store a value only if the key has no live entry. Returns True when stored."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry and entry[0] > self.clock():
+                return False
+            self._store(key, value, ttl)
+            return True
+
+    def delete(self, key):
+        """Drop an entry. Returns True if it was there."""
+        with self._lock:
+            return self._data.pop(key, None) is not None
+
+    def clear(self):
+        """Drop every entry"""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def _store(self, key, value, ttl):
+        self._data[key] = (self.clock() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
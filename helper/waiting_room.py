@@ -0,0 +1,307 @@
+"""Virtual waiting room to admit buyers of a busy event at a fixed rate"""
+import math
+import threading
+import time
+import uuid
+
+
+def _advance(room, now):
+    """Move the admission window of a room dict forward to `now`, never past the end of the queue"""
+    elapsed = max(0.0, now - room["ticked_at"])
+    room["admitted"] = min(float(room["tail"]), room["admitted"] + elapsed * room["rate"])
+    room["ticked_at"] = now
+    return room["admitted"]
+
+
+class InMemoryQueueStore:
+    """
+    Queue state kept inside this process.
+
+    Only for a single worker process and for tests: other workers would not
+    see the room and would let every buyer through. Use MySQLQueueStore
+    when several processes serve the app.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rooms = {}
+
+    def open(self, event_id, rate, now):
+        """Open (or re-rate) the room of an event"""
+        with self._lock:
+            room = self._rooms.get(event_id)
+            if room:
+                room["rate"] = rate
+            else:
+                self._rooms[event_id] = {
+                    "rate": rate,
+                    "tail": 0,           # last position handed out
+                    "admitted": 0.0,     # positions up to this one are admitted
+                    "ticked_at": now,
+                    "tickets": {},       # token -> queue ticket
+                    "users": {},         # user_id -> token
+                }
+
+    def close(self, event_id):
+        """Close the room, dropping every queue ticket"""
+        with self._lock:
+            return self._rooms.pop(event_id, None) is not None
+
+    def get_rate(self, event_id):
+        """Admission rate of the room, or None if the event has no open room"""
+        room = self._rooms.get(event_id)
+        return room["rate"] if room else None
+
+    def join(self, event_id, user_id, now):
+        """Hand out the next position, or the current one if the user already queued"""
+        with self._lock:
+            room = self._rooms[event_id]
+            token = room["users"].get(user_id)
+            if token in room["tickets"]:
+                return token, room["tickets"][token]["position"]
+
+            # Settle admissions earned so far before the queue grows, so idle
+            # time can not be spent on people who were not waiting yet
+            _advance(room, now)
+            room["tail"] += 1
+            token = uuid.uuid4().hex
+            room["tickets"][token] = {"user_id": user_id, "position": room["tail"], "admitted_at": None}
+            room["users"][user_id] = token
+            return token, room["tail"]
+
+    def advance(self, event_id, now):
+        """Let the admission window move forward, never past the end of the queue"""
+        with self._lock:
+            return _advance(self._rooms[event_id], now)
+
+    def get_ticket(self, event_id, token):
+        """Queue ticket for a token, or None"""
+        room = self._rooms.get(event_id)
+        if not room:
+            return None
+        ticket = room["tickets"].get(token)
+        return dict(ticket) if ticket else None
+
+    def mark_admitted(self, event_id, token, now):
+        """Remember when a ticket was first seen admitted and return that time"""
+        with self._lock:
+            ticket = self._rooms[event_id]["tickets"][token]
+            if ticket["admitted_at"] is None:
+                ticket["admitted_at"] = now
+            return ticket["admitted_at"]
+
+    def remove(self, event_id, token):
+        """Drop a queue ticket, e.g. after its admission expired"""
+        with self._lock:
+            room = self._rooms.get(event_id)
+            if room:
+                ticket = room["tickets"].pop(token, None)
+                if ticket and room["users"].get(ticket["user_id"]) == token:
+                    del room["users"][ticket["user_id"]]
+
+
+class MySQLQueueStore:
+    """
+    Queue state in the waiting_rooms and waiting_room_tickets tables
+    (stuff/migrations/007_waiting_rooms.sql), shared by every worker process.
+
+    Same methods as InMemoryQueueStore. Changes to a room run in a
+    transaction holding its row lock, so positions and admissions stay
+    sequential whichever worker serves the request.
+
+    Args:
+        get_connection: Returns a pooled connection (helper.db_helper.get_connection).
+    """
+
+    def __init__(self, get_connection):
+        self.get_connection = get_connection
+
+    def _in_room(self, event_id, change):
+        """Run `change(cursor, room)` with the room row locked; KeyError if there is no room"""
+        with self.get_connection() as connection:
+            with connection.cursor() as cursor:
+                connection.start_transaction()
+                try:
+                    cursor.execute("SELECT rate, tail, admitted, ticked_at FROM waiting_rooms "
+                                   "WHERE event_id = %s FOR UPDATE", (event_id,))
+                    row = cursor.fetchone()
+                    if row is None:
+                        raise KeyError(event_id)
+                    room = dict(zip(("rate", "tail", "admitted", "ticked_at"), row))
+                    result = change(cursor, room)
+                    connection.commit()
+                    return result
+                except Exception:
+                    connection.rollback()
+                    raise
+
+    def _run(self, query, params):
+        with self.get_connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute(query, params)
+                return cursor.fetchone() if cursor.description else cursor.rowcount
+
+    def open(self, event_id, rate, now):
+        """Open (or re-rate) the room of an event"""
+        self._run("""
+            INSERT INTO waiting_rooms (event_id, rate, tail, admitted, ticked_at) VALUES (%s, %s, 0, 0, %s)
+            ON DUPLICATE KEY UPDATE rate = VALUES(rate)
+        """, (event_id, rate, now))
+
+    def close(self, event_id):
+        """Close the room, dropping every queue ticket"""
+        with self.get_connection() as connection:
+            with connection.cursor() as cursor:
+                connection.start_transaction()
+                try:
+                    cursor.execute("DELETE FROM waiting_rooms WHERE event_id = %s", (event_id,))
+                    closed = cursor.rowcount > 0
+                    cursor.execute("DELETE FROM waiting_room_tickets WHERE event_id = %s", (event_id,))
+                    connection.commit()
+                except Exception:
+                    connection.rollback()
+                    raise
+        return closed
+
+    def get_rate(self, event_id):
+        """Admission rate of the room, or None if the event has no open room"""
+        row = self._run("SELECT rate FROM waiting_rooms WHERE event_id = %s", (event_id,))
+        return row[0] if row else None
+
+    def join(self, event_id, user_id, now):
+        """Hand out the next position, or the current one if the user already queued"""
+        def change(cursor, room):
+            cursor.execute("SELECT token, position FROM waiting_room_tickets WHERE event_id = %s AND user_id = %s",
+                           (event_id, user_id))
+            row = cursor.fetchone()
+            if row:
+                return row[0], row[1]
+            # Same order as the in-memory store: settle earned admissions, then grow the queue
+            _advance(room, now)
+            room["tail"] += 1
+            token = uuid.uuid4().hex
+            cursor.execute("INSERT INTO waiting_room_tickets (token, event_id, user_id, position) "
+                           "VALUES (%s, %s, %s, %s)", (token, event_id, user_id, room["tail"]))
+            cursor.execute("UPDATE waiting_rooms SET tail = %s, admitted = %s, ticked_at = %s WHERE event_id = %s",
+                           (room["tail"], room["admitted"], room["ticked_at"], event_id))
+            return token, room["tail"]
+        return self._in_room(event_id, change)
+
+    def advance(self, event_id, now):
+        """Let the admission window move forward, never past the end of the queue"""
+        def change(cursor, room):
+            admitted = _advance(room, now)
+            cursor.execute("UPDATE waiting_rooms SET admitted = %s, ticked_at = %s WHERE event_id = %s",
+                           (admitted, room["ticked_at"], event_id))
+            return admitted
+        return self._in_room(event_id, change)
+
+    def get_ticket(self, event_id, token):
+        """Queue ticket for a token, or None"""
+        row = self._run("SELECT user_id, position, admitted_at FROM waiting_room_tickets "
+                        "WHERE event_id = %s AND token = %s", (event_id, token))
+        return dict(zip(("user_id", "position", "admitted_at"), row)) if row else None
+
+    def mark_admitted(self, event_id, token, now):
+        """Remember when a ticket was first seen admitted and return that time"""
+        self._run("UPDATE waiting_room_tickets SET admitted_at = COALESCE(admitted_at, %s) "
+                  "WHERE event_id = %s AND token = %s", (now, event_id, token))
+        return self._run("SELECT admitted_at FROM waiting_room_tickets WHERE event_id = %s AND token = %s",
+                         (event_id, token))[0]
+
+    def remove(self, event_id, token):
+        """Drop a queue ticket, e.g. after its admission expired"""
+        self._run("DELETE FROM waiting_room_tickets WHERE event_id = %s AND token = %s", (event_id, token))
+
+
+class WaitingRoom:
+    """
+    Admission policy on top of a queue store.
+
+    Users join the queue of an event and get a position token. Positions are
+    admitted at `rate` per second; once admitted a token may be used to buy for
+    `admission_ttl` seconds, after which the user has to queue again.
+    """
+
+    def __init__(self, store=None, admission_ttl=300, clock=time.time):
+        self.store = store or InMemoryQueueStore()
+        self.admission_ttl = admission_ttl
+        self.clock = clock
+
+    def init_app(self, app):
+        """Read the admission window and pick the queue store from the app config"""
+        self.admission_ttl = int(app.config.get('WAITING_ROOM_ADMISSION_TTL', self.admission_ttl))
+        if app.config.get('WAITING_ROOM_STORE', 'mysql') == 'mysql':
+            # Imported here so the waiting room itself does not need a configured database
+            from helper.db_helper import get_connection
+            self.store = MySQLQueueStore(get_connection)
+        else:
+            app.logger.warning("WAITING_ROOM_STORE is 'memory': rooms are only seen by the worker "
+                               "that opened them, run a single worker process")
+
+    def open(self, event_id, rate):
+        """Start gating purchases of an event at `rate` buyers per second"""
+        if not math.isfinite(rate) or rate <= 0:
+            raise ValueError("rate must be a positive, finite number")
+        self.store.open(event_id, float(rate), self.clock())
+
+    def close(self, event_id):
+        """Stop gating purchases of an event"""
+        return self.store.close(event_id)
+
+    def is_active(self, event_id):
+        """True when purchases of the event go through the queue"""
+        return self.store.get_rate(event_id) is not None
+
+    def join(self, event_id, user_id):
+        """Queue a user and return their status"""
+        token, _ = self.store.join(event_id, user_id, self.clock())
+        return self.status(event_id, token)
+
+    def status(self, event_id, token):
+        """
+        Position of a token in the queue.
+
+        Returns None when the room is closed or the token is unknown/expired.
+        """
+        rate = self.store.get_rate(event_id)
+        ticket = self.store.get_ticket(event_id, token) if rate else None
+        if not ticket:
+            return None
+
+        now = self.clock()
+        admitted_upto = self.store.advance(event_id, now)
+        position = ticket["position"]
+        admitted = position <= admitted_upto
+
+        if admitted:
+            admitted_at = self.store.mark_admitted(event_id, token, now)
+            if now - admitted_at > self.admission_ttl:
+                self.store.remove(event_id, token)
+                return None
+            return {
+                "token": token,
+                "position": position,
+                "ahead": 0,
+                "admitted": True,
+                "expires_in": int(self.admission_ttl - (now - admitted_at)),
+            }
+
+        ahead = max(0, math.ceil(position - 1 - admitted_upto))
+        return {
+            "token": token,
+            "position": position,
+            "ahead": ahead,
+            "admitted": False,
+            "estimated_wait": math.ceil((position - admitted_upto) / rate),
+        }
+
+    def is_admitted(self, event_id, token, user_id):
+        """True when the token belongs to the user and is inside its admission window"""
+        if not token:
+            return False
+        ticket = self.store.get_ticket(event_id, token)
+        if not ticket or ticket["user_id"] != user_id:
+            return False
+        status = self.status(event_id, token)
+        return bool(status and status["admitted"])
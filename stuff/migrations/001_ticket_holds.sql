@@ -0,0 +1,16 @@
+-- Time-limited ticket holds (cart reservations).
+-- Stock is taken off packages.total_tickets_available when the hold is made
+-- and given back by the hold sweeper once expires_at has passed.
+CREATE TABLE IF NOT EXISTS ticket_holds (
+    id INT NOT NULL AUTO_INCREMENT,
+    user_id INT NOT NULL,
+    package_id INT NOT NULL,
+    quantity INT NOT NULL,
+    status ENUM('held', 'confirmed', 'released') NOT NULL DEFAULT 'held',
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    expires_at DATETIME NOT NULL,
+    confirmed_at DATETIME NULL,
+    PRIMARY KEY (id),
+    KEY idx_ticket_holds_status_expires (status, expires_at),
+    KEY idx_ticket_holds_user (user_id)
+);
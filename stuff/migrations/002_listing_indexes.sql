@@ -0,0 +1,6 @@
+-- Indexes matching the ORDER BY of the paginated listings, so keyset
+-- pages (?after=) are range scans instead of OFFSET scans.
+CREATE INDEX idx_events_tanggal ON events (tanggal, id);
+CREATE INDEX idx_events_user_tanggal ON events (user_id, tanggal, id);
+CREATE INDEX idx_tickets_package_purchase ON tickets (package_id, purchase_date, id);
+CREATE INDEX idx_tickets_user_purchase ON tickets (user_id, purchase_date, id);
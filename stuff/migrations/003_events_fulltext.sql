@@ -0,0 +1,3 @@
+-- Inverted index for the `search` parameter of /events and /manage
+-- (see helper/event_search.py), replacing the '%term%' LIKE scans.
+ALTER TABLE events ADD FULLTEXT INDEX ft_events_nama_deskripsi (nama, deskripsi);
@@ -0,0 +1,10 @@
+-- Sold / validated counters per package, updated in the same transaction as
+-- the tickets (see helper/sales_summary.py). Fill or repair with:
+--   flask --app app sales rebuild
+CREATE TABLE package_sales (
+    package_id INT NOT NULL PRIMARY KEY,
+    event_id INT NOT NULL,
+    sold INT NOT NULL DEFAULT 0,
+    validated INT NOT NULL DEFAULT 0,
+    KEY idx_package_sales_event (event_id)
+);
@@ -0,0 +1,5 @@
+-- Token shared by the tickets of one multi-ticket INSERT, used to read their
+-- IDs back (see helper/ticket_purchase.py); auto-increment values of a
+-- multi-row INSERT are not guaranteed to be consecutive.
+ALTER TABLE tickets ADD COLUMN purchase_batch CHAR(32) NULL;
+CREATE INDEX idx_tickets_purchase_batch ON tickets (purchase_batch);
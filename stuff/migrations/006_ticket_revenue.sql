@@ -0,0 +1,7 @@
+-- Revenue at the price each ticket was bought for, so editing a package's
+-- price does not rewrite past sales (see helper/sales_summary.py).
+ALTER TABLE tickets ADD COLUMN price DECIMAL(10, 2) NULL;
+ALTER TABLE package_sales ADD COLUMN revenue DECIMAL(14, 2) NOT NULL DEFAULT 0;
+-- Tickets sold before this migration only have the package's current price
+UPDATE tickets t JOIN packages p ON t.package_id = p.id SET t.price = p.price WHERE t.price IS NULL;
+-- Then fill the new column with: flask --app app sales rebuild
@@ -0,0 +1,18 @@
+-- Waiting rooms shared by every worker process (see helper/waiting_room.py,
+-- MySQLQueueStore). Times are Unix timestamps in seconds.
+CREATE TABLE IF NOT EXISTS waiting_rooms (
+    event_id INT NOT NULL PRIMARY KEY,
+    rate DOUBLE NOT NULL,
+    tail INT NOT NULL DEFAULT 0,
+    admitted DOUBLE NOT NULL DEFAULT 0,
+    ticked_at DOUBLE NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS waiting_room_tickets (
+    token CHAR(32) NOT NULL PRIMARY KEY,
+    event_id INT NOT NULL,
+    user_id INT NOT NULL,
+    position INT NOT NULL,
+    admitted_at DOUBLE NULL,
+    UNIQUE KEY uq_waiting_room_tickets_user (event_id, user_id)
+);
@@ -0,0 +1,7 @@
+-- Versions of the response cache tags (see helper/response_cache.py,
+-- MySQLResponseStore). Bumping a tag retires the responses cached under it
+-- in every worker process. Tags never bumped have no row and are at 0.
+CREATE TABLE IF NOT EXISTS cache_versions (
+    tag VARCHAR(64) NOT NULL PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0
+);
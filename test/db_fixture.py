@@ -0,0 +1,45 @@
+"""Shared fixture for tests that need a real MySQL database.
+
+These tests only run when the same DB_* / POOL_SIZE variables used by the app
+are set, e.g. against a scratch copy of the database.
+"""
+import os
+import uuid
+
+DB_CONFIGURED = all(os.environ.get(key) for key in ("DB_NAME", "DB_USER", "POOL_SIZE"))
+SKIP_REASON = "DB_NAME, DB_USER and POOL_SIZE must point to a scratch MySQL database"
+
+
+def create_event_fixture(connection, stock, tickets_per_package=1, price=50000):
+    """Create a throwaway user, event and package. Returns (user_id, event_id, package_id)."""
+    suffix = uuid.uuid4().hex[:12]
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            INSERT INTO user (nama, nomor_telepon, email, username, password, roles)
+            VALUES (%s, %s, %s, %s, %s, %s)
+        """, ("Test", "0800", f"{suffix}@test.local", f"test_{suffix}", "x", "admin"))
+        user_id = cursor.lastrowid
+        cursor.execute("""
+            INSERT INTO events (user_id, nama, deskripsi, tanggal, lokasi, gambar)
+            VALUES (%s, %s, %s, CURDATE(), %s, %s)
+        """, (user_id, f"Test event {suffix}", "Load test", "Test", "test.jpeg"))
+        event_id = cursor.lastrowid
+        cursor.execute("""
+            INSERT INTO packages (id_acara, name, tickets_per_package, total_tickets_available, price)
+            VALUES (%s, %s, %s, %s, %s)
+        """, (event_id, "Regular", tickets_per_package, stock, price))
+        package_id = cursor.lastrowid
+        connection.commit()
+    return user_id, event_id, package_id
+
+
+def drop_event_fixture(connection, user_id, event_id, package_id):
+    """Remove everything created by `create_event_fixture`."""
+    with connection.cursor() as cursor:
+        cursor.execute("DELETE FROM tickets WHERE package_id = %s", (package_id,))
+        cursor.execute("DELETE FROM package_sales WHERE package_id = %s", (package_id,))
+        cursor.execute("DELETE FROM packages WHERE id = %s", (package_id,))
+        cursor.execute("DELETE FROM panitia WHERE id_acara = %s", (event_id,))
+        cursor.execute("DELETE FROM events WHERE id = %s", (event_id,))
+        cursor.execute("DELETE FROM user WHERE id = %s", (user_id,))
+        connection.commit()
@@ -0,0 +1,282 @@
+import asyncio
+import json
+import time
+import unittest
+from datetime import date, datetime
+from decimal import Decimal
+
+from flask import Flask
+from flask_cors import CORS
+from flask_cors.core import get_cors_options
+
+from helper.async_reads import AsyncReadApp, match_route
+from helper.count_cache import CountCache
+from helper.db_instrumentation import QueryInstrumentation
+from helper.metrics import Metrics
+from helper.response_cache import ResponseCache, MySQLResponseStore, packages_tag
+from test.db_fixture import DB_CONFIGURED, SKIP_REASON, create_event_fixture, drop_event_fixture
+
+
+class FakeCursor:
+    def __init__(self, rows, delay):
+        self.rows = rows
+        self.delay = delay
+        self.query = None
+
+    async def execute(self, query, params):
+        self.query = query
+        self.params = params
+        await asyncio.sleep(self.delay)
+
+    async def fetchone(self):
+        if "COUNT(*)" in self.query:
+            return (len(TICKETS),)
+        return self.rows.get(self.query.count("JSON_ARRAYAGG"))
+
+    async def fetchall(self):
+        if "cache_versions" in self.query:
+            return ((tag, 7) for tag in self.params)
+        # aiomysql returns a tuple of rows
+        return tuple(TICKETS)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FakePool:
+    """aiomysql-like pool answering every query after `delay` seconds"""
+
+    def __init__(self, rows, delay=0):
+        self.rows = rows
+        self.delay = delay
+
+    def acquire(self):
+        return self
+
+    def cursor(self):
+        return FakeCursor(self.rows, self.delay)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+EVENT = (3, "a.jpeg", "Konser", "Musik", date(2024, 11, 20), "Jakarta", 9, "budi")
+TICKETS = [(10 + i, 5, "siti", "siti@example.com", 1, "Regular", Decimal("50000.00"),
+            datetime(2024, 11, 1, 10, i), None, None) for i in range(3)]
+
+
+async def call(app, path, method="GET", query_string=b""):
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    await app({"type": "http", "method": method, "path": path, "query_string": query_string}, None, send)
+    return messages[0]["status"], messages[1]["body"]
+
+
+async def call_with_headers(app, path, headers=()):
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {"type": "http", "method": "GET", "path": path, "query_string": b"",
+             "headers": [(name.encode(), value.encode()) for name, value in headers]}
+    await app(scope, None, send)
+    response_headers = {name.decode(): value.decode() for name, value in messages[0]["headers"]}
+    return messages[0]["status"], response_headers, messages[1]["body"]
+
+
+class TestAsyncReads(unittest.TestCase):
+    def setUp(self):
+        self.fallback_calls = []
+
+        async def fallback(scope, receive, send):
+            self.fallback_calls.append(scope["path"])
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+            await send({"type": "http.response.body", "body": b"flask"})
+
+        rows = {0: EVENT, 1: EVENT + ('[{"id": 1, "id_user": 5, "username": "siti"}]',)}
+        self.pool = FakePool(rows, delay=0.05)
+
+        async def create_pool():
+            return self.pool
+
+        self.app = AsyncReadApp(create_pool, fallback)
+
+    def test_routes(self):
+        self.assertEqual(match_route("GET", "/api/v1/packages/get/12")[1], 12)
+        self.assertEqual(match_route("GET", "/api/v1/tickets/tickets/12")[0].blueprint, "tickets")
+        self.assertIsNone(match_route("POST", "/api/v1/packages/get/12"))
+        self.assertIsNone(match_route("GET", "/api/v1/events/events"))
+
+    def test_event_and_fallback(self):
+        status, body = asyncio.run(call(self.app, "/api/v1/events/events/3"))
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(body)["event"]["tanggal"], "2024-11-20")
+
+        status, body = asyncio.run(call(self.app, "/api/v1/events/events"))
+        self.assertEqual((status, body), (200, b"flask"))
+        self.assertEqual(self.fallback_calls, ["/api/v1/events/events"])
+
+    def test_committees_and_bad_include(self):
+        status, body = asyncio.run(call(self.app, "/api/v1/committee/list/3"))
+        self.assertEqual(json.loads(body)["committees"][0]["username"], "siti")
+        status, _ = asyncio.run(call(self.app, "/api/v1/events/detail/3", query_string=b"include=tickets"))
+        self.assertEqual(status, 400)
+
+    def test_requests_overlap_while_waiting_on_db(self):
+        async def many():
+            return await asyncio.gather(*[call(self.app, "/api/v1/events/events/3") for _ in range(100)])
+
+        start = time.perf_counter()
+        results = asyncio.run(many())
+        self.assertTrue(all(status == 200 for status, _ in results))
+        # 100 queries of 50 ms each finish in about one query time, not 5 seconds
+        self.assertLess(time.perf_counter() - start, 1)
+
+    def test_event_tickets_like_flask(self):
+        status, body = asyncio.run(call(self.app, "/api/v1/tickets/tickets/3", query_string=b"per_page=2"))
+        self.assertEqual(status, 200)
+        payload = json.loads(body)
+        self.assertEqual([ticket["ticket_id"] for ticket in payload["tickets"]], [10, 11])
+        self.assertEqual((payload["total_count"], payload["total_pages"]), (3, 2))
+        self.assertIsNotNone(payload["next_cursor"])
+        # Dates and prices encoded as Flask's jsonify does
+        self.assertEqual(payload["tickets"][0]["purchase_date"], "Fri, 01 Nov 2024 10:00:00 GMT")
+        self.assertEqual(payload["tickets"][0]["package_price"], "50000.00")
+
+        status, _ = asyncio.run(call(self.app, "/api/v1/tickets/tickets/3", query_string=b"after=%%%"))
+        self.assertEqual(status, 400)
+
+        # Search uses the attendee index of the Flask app
+        asyncio.run(call(self.app, "/api/v1/tickets/tickets/3", query_string=b"search=siti"))
+        self.assertEqual(self.fallback_calls, ["/api/v1/tickets/tickets/3"])
+
+    def test_pool_created_once(self):
+        created = []
+
+        async def create_pool():
+            created.append(1)
+            await asyncio.sleep(0.05)
+            return self.pool
+
+        app = AsyncReadApp(create_pool, None)
+
+        async def many():
+            return await asyncio.gather(*[call(app, "/api/v1/events/events/3") for _ in range(10)])
+
+        self.assertTrue(all(status == 200 for status, _ in asyncio.run(many())))
+        self.assertEqual(len(created), 1)
+
+
+class TestAsyncReadsLikeFlask(unittest.TestCase):
+    """Headers and metrics the Flask app would add to the same routes"""
+
+    def setUp(self):
+        flask_app = Flask(__name__)
+        CORS(flask_app)
+        self.cache = ResponseCache()
+        self.metrics = Metrics()
+        self.metrics.enabled = True
+        self.pool = FakePool({1: EVENT + ('[{"id": 1, "id_acara": 3, "name": "VIP", "tickets_per_package": 1, '
+                                          '"total_tickets_available": 5, "price": "150000.00"}]',)})
+
+        async def create_pool():
+            return self.pool
+
+        self.app = AsyncReadApp(create_pool, None, response_cache=self.cache,
+                                instrumentation=QueryInstrumentation(), metrics=self.metrics,
+                                cors_options=get_cors_options(flask_app), count_cache=CountCache())
+
+    def test_etag_and_revalidation(self):
+        status, headers, body = asyncio.run(call_with_headers(self.app, "/api/v1/packages/get/3"))
+        self.assertEqual(status, 200)
+        self.assertEqual(headers["cache-control"], "public, max-age=0")
+        etag = headers["etag"]
+
+        status, headers, body = asyncio.run(call_with_headers(self.app, "/api/v1/packages/get/3",
+                                                              [("If-None-Match", etag)]))
+        self.assertEqual((status, body, headers["etag"]), (304, b"", etag))
+
+        self.pool.rows[1] = EVENT + (None,)
+        self.cache.invalidate(packages_tag(3))
+        status, _, _ = asyncio.run(call_with_headers(self.app, "/api/v1/packages/get/3", [("If-None-Match", etag)]))
+        self.assertEqual(status, 200)
+
+    def test_shared_versions_are_read_on_the_async_pool(self):
+        def blocking_connection():
+            raise AssertionError("blocking connection used in the event loop")
+
+        self.app.response_cache = ResponseCache(MySQLResponseStore(blocking_connection))
+        status, _, _ = asyncio.run(call_with_headers(self.app, "/api/v1/packages/get/3"))
+        self.assertEqual(status, 200)
+        self.assertIsNotNone(self.app.response_cache.store.get("/api/v1/packages/get/3?|packages:3@7"))
+
+    def test_cors_server_timing_and_metrics(self):
+        status, headers, _ = asyncio.run(call_with_headers(self.app, "/api/v1/committee/list/3",
+                                                           [("Origin", "https://example.com")]))
+        self.assertEqual(headers["access-control-allow-origin"], "https://example.com")
+        self.assertRegex(headers["server-timing"], r'^db;dur=[\d.]+;desc="1 queries", db-pool;dur=[\d.]+$')
+
+        rendered = self.metrics.registry.render()
+        self.assertIn('http_requests_total{blueprint="committee",route="/api/v1/committee/list/<int:event_id>",'
+                      'method="GET",status="200"} 1', rendered)
+        self.assertIn('http_requests_in_flight{blueprint="committee"} 0', rendered)
+
+
+@unittest.skipUnless(DB_CONFIGURED, SKIP_REASON)
+class TestAsyncThroughput(unittest.TestCase):
+    """Requests per second of one worker: async pool against the sync Flask app"""
+
+    REQUESTS = 2000
+
+    def setUp(self):
+        from helper.db_helper import get_connection
+        self.get_connection = get_connection
+        with get_connection() as connection:
+            self.user_id, self.event_id, self.package_id = create_event_fixture(connection, stock=10)
+
+    def tearDown(self):
+        with self.get_connection() as connection:
+            drop_event_fixture(connection, self.user_id, self.event_id, self.package_id)
+
+    def test_async_serves_more_requests_per_second(self):
+        from concurrent.futures import ThreadPoolExecutor
+        from asgi import application, create_pool
+        from app import app
+        from helper.db_helper import POOL_SIZE
+
+        path = f"/api/v1/events/detail/{self.event_id}"
+        client = app.test_client()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=POOL_SIZE) as executor:
+            statuses = list(executor.map(lambda _: client.get(path).status_code, range(self.REQUESTS)))
+        sync_rate = self.REQUESTS / (time.perf_counter() - start)
+        self.assertTrue(all(status == 200 for status in statuses))
+
+        async def run():
+            application.pool = await create_pool()
+            try:
+                start = time.perf_counter()
+                results = await asyncio.gather(*[call(application, path) for _ in range(self.REQUESTS)])
+                return results, self.REQUESTS / (time.perf_counter() - start)
+            finally:
+                application.pool.close()
+                await application.pool.wait_closed()
+
+        results, async_rate = asyncio.run(run())
+        print(f"\nsync: {sync_rate:.0f} req/s, async: {async_rate:.0f} req/s")
+        self.assertTrue(all(status == 200 for status, _ in results))
+        self.assertGreater(async_rate, sync_rate)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
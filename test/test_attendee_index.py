@@ -0,0 +1,98 @@
+import threading
+import unittest
+from helper.attendee_index import AttendeeIndex, EventAttendees
+
+
+class FakeCursor:
+    """Serves the holder query of one event and the user lookup of pending holders."""
+
+    def __init__(self, holders, users):
+        self.holders = holders
+        self.users = users
+        self.queries = []
+        self._result = None
+
+    def execute(self, query, params):
+        self.queries.append(query)
+        if "GROUP BY" in query:
+            self._result = self.holders
+        else:
+            self._result = [(user_id,) + self.users[user_id] for user_id in params if user_id in self.users]
+
+    def fetchall(self):
+        return self._result
+
+
+class BlockingCursor(FakeCursor):
+    """Holds the holder query of an event until `release` is set."""
+
+    def __init__(self, holders, users):
+        super().__init__(holders, users)
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def execute(self, query, params):
+        if "GROUP BY" in query:
+            self.started.set()
+            self.release.wait(5)
+        super().execute(query, params)
+
+
+class TestAttendeeIndex(unittest.TestCase):
+    def setUp(self):
+        users = {1: ("budi", "budi@mail.com"), 2: ("Siti", "siti@kampus.ac.id"), 3: ("andi", "andi@mail.com")}
+        self.cursor = FakeCursor([(1, *users[1], 2), (2, *users[2], 1)], users)
+        self.index = AttendeeIndex(max_matches=10)
+
+    def test_search_substring_of_username_or_email(self):
+        self.assertEqual(self.index.search(self.cursor, 7, "SIT"), [2])
+        self.assertEqual(self.index.search(self.cursor, 7, "mail.c"), [1])
+        self.assertEqual(self.index.search(self.cursor, 7, "i"), [1, 2])
+        self.assertEqual(self.index.search(self.cursor, 7, "zzz"), [])
+        self.assertEqual(sum("GROUP BY" in query for query in self.cursor.queries), 1)
+
+    def test_purchase_and_transfer_update_built_index(self):
+        self.index.search(self.cursor, 7, "a")
+        self.index._on_purchase(None, event_id=7, user_id=3, ticket_ids=[10])
+        self.assertEqual(self.index.search(self.cursor, 7, "andi"), [3])
+
+        self.index._on_transfer(None, event_id=7, from_user_id=2, to_user_id=1)
+        self.assertEqual(self.index.search(self.cursor, 7, "siti"), [])
+        self.index._on_delete(None, event_id=7, user_id=1)
+        self.assertEqual(self.index.search(self.cursor, 7, "budi"), [1])
+
+    def test_broad_search_returns_none(self):
+        self.index.max_matches = 1
+        self.assertIsNone(self.index.search(self.cursor, 7, "i"))
+
+    def test_event_change_drops_index(self):
+        self.index.search(self.cursor, 7, "budi")
+        self.index._on_event_changed(None, event_id=7)
+        self.index.search(self.cursor, 7, "budi")
+        self.assertEqual(sum("GROUP BY" in query for query in self.cursor.queries), 2)
+
+    def test_builds_lock_per_event(self):
+        slow = BlockingCursor(self.cursor.holders, self.cursor.users)
+        results = []
+        searches = [threading.Thread(target=lambda: results.append(self.index.search(slow, 7, "budi")))
+                    for _ in range(3)]
+        for search in searches:
+            search.start()
+        self.assertTrue(slow.started.wait(5))
+        # Event 8 is built while event 7's holder query is still running
+        self.assertEqual(self.index.search(self.cursor, 8, "siti"), [2])
+        slow.release.set()
+        for search in searches:
+            search.join()
+        self.assertEqual(results, [[1], [1], [1]])
+        self.assertEqual(sum("GROUP BY" in query for query in slow.queries), 1)
+        self.assertEqual(self.index._build_locks, {})
+
+    def test_gram_intersection(self):
+        attendees = EventAttendees([(1, "abcdef", None, 1), (2, "defabc", None, 1)])
+        self.assertEqual(attendees.search("cde"), [1])
+        self.assertEqual(attendees.search("abc"), [1, 2])
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,94 @@
+import unittest
+from helper.count_cache import CountCache, estimate_from_plan, user_tickets_scope
+
+
+class FakeCursor:
+    """Returns a fixed COUNT(*) and a one-table EXPLAIN plan, counting the scans."""
+
+    def __init__(self, total, plan_rows=1200):
+        self.total = total
+        self.plan_rows = plan_rows
+        self.counts = 0
+        self.explains = 0
+        self.description = None
+        self._result = None
+
+    def execute(self, query, params):
+        if query.startswith("EXPLAIN"):
+            self.explains += 1
+            self.description = [("id",), ("table",), ("rows",), ("filtered",)]
+            self._result = [(1, "tickets", self.plan_rows, 50.0)]
+        else:
+            self.counts += 1
+            self._result = [(self.total,)]
+
+    def fetchone(self):
+        return self._result[0]
+
+    def fetchall(self):
+        return self._result
+
+
+QUERY = "SELECT COUNT(*) FROM tickets t WHERE t.user_id = %s"
+
+
+class TestCountCache(unittest.TestCase):
+    def setUp(self):
+        self.cursor = FakeCursor(total=42)
+        self.cache = CountCache(ttl=60, single_process=True)
+
+    def test_exact_count_is_reused_until_scope_changes(self):
+        self.assertEqual(self.cache.count(self.cursor, "user_tickets:1", QUERY, (1,)), (42, False))
+        self.assertEqual(self.cache.count(self.cursor, "user_tickets:1", QUERY, (1,)), (42, False))
+        self.assertEqual(self.cursor.counts, 1)
+
+        self.cache.invalidate("user_tickets:1")
+        self.cursor.total = 43
+        self.assertEqual(self.cache.count(self.cursor, "user_tickets:1", QUERY, (1,)), (43, False))
+        self.assertEqual(self.cursor.counts, 2)
+
+    def test_event_change_invalidates_holders_counts(self):
+        for user_id in (1, 2):
+            self.cache.count(self.cursor, user_tickets_scope(user_id), QUERY, (user_id,))
+        self.cache._on_event_changed(None, event_id=7, holder_ids=[1, 1])
+        self.cache.count(self.cursor, user_tickets_scope(1), QUERY, (1,))
+        self.cache.count(self.cursor, user_tickets_scope(2), QUERY, (2,))
+        self.assertEqual(self.cursor.counts, 3)
+
+    def test_approx_uses_last_value_then_plan(self):
+        self.assertEqual(self.cache.count(self.cursor, "user_tickets:1", QUERY, (1,), "approx"), (600, True))
+        self.assertEqual(self.cursor.counts, 0)
+
+        self.cache.count(self.cursor, "user_tickets:1", QUERY, (1,))
+        self.cache.invalidate("user_tickets:1")
+        self.assertEqual(self.cache.count(self.cursor, "user_tickets:1", QUERY, (1,), "approx"), (42, True))
+        self.assertEqual(self.cursor.counts, 1)
+
+    def test_cached_count_is_an_estimate_across_processes(self):
+        cache = CountCache(ttl=60)
+        self.assertEqual(cache.count(self.cursor, "user_tickets:1", QUERY, (1,)), (42, False))
+        self.assertEqual(cache.count(self.cursor, "user_tickets:1", QUERY, (1,)), (42, True))
+        self.assertEqual(self.cursor.counts, 1)
+
+    def test_generations_are_bounded_and_never_reused(self):
+        cache = CountCache(ttl=60, maxsize=2, single_process=True)
+        cache.count(self.cursor, "user_tickets:1", QUERY, (1,))
+        for user_id in range(2, 10):
+            cache.invalidate(f"user_tickets:{user_id}")
+        self.assertEqual(len(cache._generations), 2)
+        # The generation of user 1 was evicted; its old count must not come back
+        self.cursor.total = 43
+        self.assertEqual(cache.count(self.cursor, "user_tickets:1", QUERY, (1,)), (43, False))
+
+    def test_none_skips_count(self):
+        self.assertEqual(self.cache.count(self.cursor, "user_tickets:1", QUERY, (1,), "none"), (None, False))
+        self.assertEqual(self.cursor.counts + self.cursor.explains, 0)
+
+    def test_estimate_multiplies_join(self):
+        description = [("id",), ("rows",), ("filtered",)]
+        self.assertEqual(estimate_from_plan(description, [(1, 10, 100.0), (1, 5, 20.0)]), 10)
+        self.assertIsNone(estimate_from_plan(description, [(1, None, None)]))
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
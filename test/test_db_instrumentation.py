@@ -0,0 +1,103 @@
+import unittest
+from datetime import datetime
+
+from flask import Flask
+
+from helper.db_instrumentation import QueryInstrumentation, redact, one_line
+from helper.db_pool import ConnectionPool
+
+
+class FakeCursor:
+    def __init__(self):
+        self.closed = False
+        self.rows = [(1,)]
+
+    def execute(self, operation, params=None):
+        self.operation = operation
+
+    def executemany(self, operation, seq_params):
+        self.operation = operation
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        self.closed = True
+
+
+class FakeConnection:
+    in_transaction = False
+    unread_result = False
+
+    def cursor(self, *args, **kwargs):
+        return FakeCursor()
+
+    def close(self):
+        pass
+
+
+class TestQueryInstrumentation(unittest.TestCase):
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.pool = ConnectionPool(FakeConnection, size=1, leak_timeout=0)
+        self.instrumentation = QueryInstrumentation(slow_query_ms=10000)
+        self.instrumentation.attach(self.pool)
+        self.app.after_request(self.instrumentation._add_server_timing)
+
+        @self.app.route("/events")
+        def events():
+            with self.pool.get_connection() as connection:
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+                    cursor.executemany("INSERT INTO t VALUES (%s)", [(1,), (2,)])
+                    return {"rows": cursor.fetchall()}
+
+        @self.app.route("/static")
+        def static_page():
+            return "no database"
+
+        self.client = self.app.test_client()
+
+    def test_server_timing_header(self):
+        response = self.client.get("/events")
+        self.assertEqual(response.get_json(), {"rows": [[1]]})
+        timing = response.headers["Server-Timing"]
+        self.assertIn('desc="2 queries"', timing)
+        self.assertRegex(timing, r"^db;dur=[\d.]+;desc=\"2 queries\", db-pool;dur=[\d.]+$")
+
+    def test_no_header_without_database(self):
+        self.assertNotIn("Server-Timing", self.client.get("/static").headers)
+
+    def test_cursor_is_closed_by_with(self):
+        with self.pool.get_connection() as connection:
+            cursor = connection.cursor()
+            with cursor:
+                pass
+            self.assertTrue(cursor._cursor.closed)
+
+    def test_slow_query_logged_without_values(self):
+        self.instrumentation.slow_query_ms = 0
+        with self.assertLogs("helper.db_instrumentation", "WARNING") as logs:
+            with self.app.test_request_context("/user_tickets"):
+                with self.pool.get_connection() as connection:
+                    with connection.cursor() as cursor:
+                        cursor.execute("SELECT *\n  FROM user WHERE email = %s", ("budi@example.com",))
+        self.assertIn("GET /user_tickets", logs.output[0])
+        self.assertIn("SELECT * FROM user WHERE email = %s params=(<str>)", logs.output[0])
+        self.assertNotIn("budi", logs.output[0])
+
+    def test_queries_outside_requests_are_only_timed(self):
+        with self.pool.get_connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+        self.assertIsNone(self.instrumentation.current())
+
+    def test_redact(self):
+        self.assertEqual(redact((1, "x", datetime(2024, 1, 1), None)), "(<int>, <str>, <datetime>, <NoneType>)")
+        self.assertEqual(redact({"id": 3}), "{id: <int>}")
+        self.assertEqual(redact(None), "()")
+        self.assertEqual(one_line("a" * 20, limit=5), "aaaaa...")
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
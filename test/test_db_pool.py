@@ -0,0 +1,186 @@
+import threading
+import time
+import unittest
+
+from helper.db_pool import ConnectionPool, PoolTimeout
+
+
+class FakeConnection:
+    def __init__(self, number):
+        self.number = number
+        self.closed = False
+        self.alive = True
+        self.in_transaction = False
+        self.unread_result = False
+        self.pings = 0
+        self.rollbacks = 0
+
+    def ping(self, reconnect=False):
+        self.pings += 1
+        if not self.alive:
+            raise OSError("MySQL server has gone away")
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.in_transaction = False
+
+    def consume_results(self):
+        self.unread_result = False
+
+    def close(self):
+        self.closed = True
+
+
+class TestConnectionPool(unittest.TestCase):
+    def setUp(self):
+        self.opened = []
+
+    def connect(self):
+        connection = FakeConnection(len(self.opened))
+        self.opened.append(connection)
+        return connection
+
+    def pool(self, **kwargs):
+        options = {"size": 2, "max_overflow": 0, "timeout": 0.2, "ping_after": 60, "leak_timeout": 0}
+        options.update(kwargs)
+        return ConnectionPool(self.connect, **options)
+
+    def test_opens_lazily_and_reuses(self):
+        pool = self.pool()
+        self.assertEqual(self.opened, [])
+        with pool.get_connection() as connection:
+            self.assertEqual(connection.number, 0)
+        with pool.get_connection() as connection:
+            self.assertEqual(connection.number, 0)
+        self.assertEqual(len(self.opened), 1)
+        self.assertEqual(pool.stats()["idle"], 1)
+
+    def test_overflow_connections_close_on_return(self):
+        pool = self.pool(size=1, max_overflow=1)
+        first = pool.get_connection()
+        second = pool.get_connection()
+        self.assertEqual(pool.stats()["open"], 2)
+        second.close()
+        self.assertTrue(self.opened[1].closed)
+        first.close()
+        self.assertFalse(self.opened[0].closed)
+        self.assertEqual(pool.stats()["open"], 1)
+
+    def test_times_out_when_exhausted(self):
+        pool = self.pool(size=1)
+        held = pool.get_connection()
+        with self.assertRaises(PoolTimeout):
+            pool.get_connection()
+        stats = pool.stats()
+        self.assertEqual((stats["timeouts"], stats["waiting"], stats["in_use"]), (1, 0, 1))
+        held.close()
+
+    def test_waiters_are_served_in_arrival_order(self):
+        pool = self.pool(size=1, timeout=2)
+        held = pool.get_connection()
+        served = []
+
+        def worker(name):
+            with pool.get_connection():
+                served.append(name)
+
+        threads = []
+        for name in range(5):
+            thread = threading.Thread(target=worker, args=(name,))
+            thread.start()
+            threads.append(thread)
+            while pool.stats()["waiting"] <= name:
+                time.sleep(0.001)
+        held.close()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(served, [0, 1, 2, 3, 4])
+        self.assertEqual(len(self.opened), 1)
+        self.assertEqual(pool.stats()["waits"], 5)
+
+    def test_burst_queues_instead_of_failing(self):
+        pool = self.pool(size=2, max_overflow=1, timeout=5)
+        errors = []
+
+        def request():
+            try:
+                with pool.get_connection():
+                    time.sleep(0.01)
+            except PoolTimeout as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=request) for _ in range(30)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertLessEqual(len(self.opened), 3)
+        self.assertEqual(pool.stats()["checkouts"], 30)
+
+    def test_dead_idle_connection_is_replaced(self):
+        pool = self.pool(ping_after=0)
+        pool.get_connection().close()
+        self.opened[0].alive = False
+        with pool.get_connection() as connection:
+            self.assertEqual(connection.number, 1)
+        self.assertTrue(self.opened[0].closed)
+        self.assertEqual(pool.stats()["ping_failures"], 1)
+
+    def test_recently_used_connection_is_not_pinged(self):
+        pool = self.pool(ping_after=60)
+        pool.get_connection().close()
+        pool.get_connection().close()
+        self.assertEqual(self.opened[0].pings, 0)
+
+    def test_old_connection_is_recycled(self):
+        pool = self.pool(recycle=0.01)
+        pool.get_connection().close()
+        time.sleep(0.02)
+        with pool.get_connection() as connection:
+            self.assertEqual(connection.number, 1)
+        self.assertEqual(pool.stats()["recycled"], 1)
+
+    def test_return_rolls_back_open_transaction(self):
+        pool = self.pool()
+        connection = pool.get_connection()
+        connection.in_transaction = True
+        connection.unread_result = True
+        connection.close()
+        self.assertEqual(self.opened[0].rollbacks, 1)
+        self.assertFalse(self.opened[0].unread_result)
+
+    def test_failed_connect_frees_the_slot(self):
+        pool = ConnectionPool(self.fail, size=1, max_overflow=0, timeout=0.1)
+        for _ in range(3):
+            with self.assertRaises(ConnectionError):
+                pool.get_connection()
+        self.assertEqual(pool.stats()["open"], 0)
+
+    @staticmethod
+    def fail():
+        raise ConnectionError("refused")
+
+    def test_leaked_checkout_is_reported(self):
+        pool = self.pool(size=1, leak_timeout=0.01)
+        leaked = pool.get_connection()
+        time.sleep(0.02)
+        with self.assertLogs("helper.db_pool", "WARNING") as logs:
+            with self.assertRaises(PoolTimeout):
+                pool.get_connection()
+        self.assertIn("test_db_pool.py", logs.output[0])
+        self.assertEqual(pool.stats()["leaks"], 1)
+        leaked.close()
+
+    def test_closed_connection_can_not_be_used(self):
+        pool = self.pool()
+        connection = pool.get_connection()
+        connection.close()
+        connection.close()
+        with self.assertRaises(Exception):
+            connection.ping()
+        self.assertEqual(pool.stats()["idle"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
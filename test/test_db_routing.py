@@ -0,0 +1,173 @@
+import time
+import unittest
+
+from flask import Flask, Response
+
+from helper import signals
+from helper.db_routing import ReplicaRouter, replica_lag
+
+
+class FakeCursor:
+    def __init__(self, status):
+        self.status = status
+        self.description = [("Replica_IO_State",), ("Seconds_Behind_Source",)]
+
+    def execute(self, query):
+        pass
+
+    def fetchone(self):
+        return None if self.status is False else ("Waiting", self.status)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class FakeConnection:
+    def __init__(self, pool):
+        self.pool = pool
+
+    def cursor(self):
+        return FakeCursor(self.pool.lag)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class FakePool:
+    def __init__(self, name, lag=0):
+        self.name = name
+        self.lag = lag
+        self.down = False
+        self.checkouts = 0
+
+    def get_connection(self):
+        if self.down:
+            raise ConnectionError(f"{self.name} is down")
+        self.checkouts += 1
+        return FakeConnection(self)
+
+    def stats(self):
+        return {"checkouts": self.checkouts}
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestReplicaRouter(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock()
+        self.primary = FakePool("primary")
+        self.replicas = {"r1": FakePool("r1"), "r2": FakePool("r2")}
+        self.router = ReplicaRouter(self.primary, self.replicas, max_lag=5, check_interval=5,
+                                    sticky_seconds=10, clock=self.clock)
+        self.router.check_lag()
+        self.app = Flask(__name__)
+
+    def read(self):
+        return self.router.get_connection(read_only=True).pool.name
+
+    def test_writes_go_to_primary(self):
+        self.assertEqual(self.router.get_connection().pool.name, "primary")
+
+    def test_reads_rotate_over_replicas(self):
+        self.assertEqual({self.read() for _ in range(4)}, {"r1", "r2"})
+
+    def test_lagging_replica_is_skipped(self):
+        self.replicas["r1"].lag = 30
+        self.router.check_lag()
+        self.assertEqual({self.read() for _ in range(4)}, {"r2"})
+
+    def test_lag_is_not_measured_on_reads(self):
+        router = ReplicaRouter(self.primary, self.replicas)
+        # Nothing measured yet: reads use the primary and do not check the replicas themselves
+        checkouts = [pool.checkouts for pool in self.replicas.values()]
+        self.assertEqual(router.get_connection(read_only=True).pool.name, "primary")
+        self.assertEqual([pool.checkouts for pool in self.replicas.values()], checkouts)
+
+        self.replicas["r1"].lag = 30
+        self.replicas["r2"].lag = None
+        router.check_lag()
+        self.assertEqual(router.get_connection(read_only=True).pool.name, "primary")
+        self.replicas["r1"].lag = 1
+        router.check_lag()
+        self.assertEqual(router.get_connection(read_only=True).pool.name, "r1")
+
+    def test_lag_thread(self):
+        router = ReplicaRouter(self.primary, self.replicas, check_interval=0.01)
+        router.start()
+        try:
+            deadline = time.monotonic() + 2
+            while router.replicas[0].lag is None and time.monotonic() < deadline:
+                time.sleep(0.01)
+            self.assertEqual(router.get_connection(read_only=True).pool.name[0], "r")
+        finally:
+            router.stop()
+
+    def test_unreachable_replica_falls_back(self):
+        self.replicas["r1"].down = True
+        self.replicas["r2"].down = True
+        self.assertEqual(self.read(), "primary")
+        self.assertEqual(self.router.stats()["primary_reads"], 1)
+
+    def test_without_replicas_everything_uses_primary(self):
+        router = ReplicaRouter(self.primary)
+        self.assertEqual(router.get_connection(read_only=True).pool.name, "primary")
+
+    def test_writing_client_stays_on_primary_for_a_while(self):
+        with self.app.test_request_context():
+            self.router.mark_written()
+            self.assertEqual(self.read(), "primary")
+            response = self.router._send_last_write(Response())
+        self.assertEqual(response.headers["X-Last-Write"], "1000.000")
+        self.assertIn("last_write=1000.000", response.headers["Set-Cookie"])
+
+        # The next request of that client, on any worker
+        with self.app.test_request_context(headers={"Cookie": "last_write=1000.000"}):
+            self.assertEqual(self.read(), "primary")
+        with self.app.test_request_context(headers={"X-Last-Write": "1000.000"}):
+            self.assertEqual(self.read(), "primary")
+        # Other clients, and the same one after the window, read from replicas
+        with self.app.test_request_context():
+            self.assertNotEqual(self.read(), "primary")
+        self.clock.now = 1011
+        with self.app.test_request_context(headers={"X-Last-Write": "1000.000"}):
+            self.assertNotEqual(self.read(), "primary")
+
+    def test_bad_or_future_write_time_is_ignored(self):
+        for value in ("soon", "1000000"):
+            with self.app.test_request_context(headers={"X-Last-Write": value}):
+                self.assertNotEqual(self.read(), "primary")
+
+    def test_signals_start_stickiness(self):
+        self.router.init_app(self.app)
+        try:
+            with self.app.test_request_context():
+                signals.ticket_transferred.send(None, event_id=3, ticket_id=1, from_user_id=7, to_user_id=9)
+                self.assertTrue(self.router.is_sticky())
+            with self.app.test_request_context():
+                self.assertFalse(self.router.is_sticky())
+        finally:
+            self.router.stop()
+            for signal in (signals.tickets_purchased, signals.tickets_validated,
+                           signals.ticket_transferred, signals.ticket_deleted):
+                signal.disconnect(self.router._on_write)
+
+    def test_replica_lag_reads_status_row(self):
+        self.assertEqual(replica_lag(FakeConnection(FakePool("r", lag=2))), 2.0)
+        self.assertIsNone(replica_lag(FakeConnection(FakePool("r", lag=None))))
+        self.assertIsNone(replica_lag(FakeConnection(FakePool("r", lag=False))))
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
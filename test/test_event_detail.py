@@ -0,0 +1,32 @@
+import json
+import unittest
+from datetime import date
+from helper.event_detail import parse_includes, detail_query, detail_payload, InvalidInclude, DETAIL_SECTIONS
+
+
+class TestEventDetail(unittest.TestCase):
+    def test_parse_includes(self):
+        self.assertEqual(parse_includes(None), list(DETAIL_SECTIONS))
+        self.assertEqual(parse_includes(""), [])
+        self.assertEqual(parse_includes("committees, PACKAGES"), ["packages", "committees"])
+        with self.assertRaises(InvalidInclude):
+            parse_includes("packages,tickets")
+
+    def test_query_has_only_requested_sections(self):
+        self.assertNotIn("JSON_ARRAYAGG", detail_query([]))
+        query = detail_query(["committees"])
+        self.assertIn("AS committees", query)
+        self.assertNotIn("AS packages", query)
+
+    def test_payload(self):
+        packages = json.dumps([{"id": 1, "id_acara": 3, "name": "VIP", "tickets_per_package": 2,
+                                "total_tickets_available": 10, "price": "150000.00"}])
+        row = (3, "a.jpeg", "Konser", "Musik", date(2024, 11, 20), "Jakarta", 9, "budi", packages, None)
+        payload = detail_payload(row, ["packages", "committees"])
+        self.assertEqual(payload["event"]["tanggal"], "2024-11-20")
+        self.assertEqual(payload["packages"][0]["price"], 150000.0)
+        self.assertEqual(payload["committees"], [])
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,21 @@
+import unittest
+from helper.event_search import boolean_query, MAX_TERMS
+
+
+class TestEventSearch(unittest.TestCase):
+    def test_words_are_required_prefixes(self):
+        self.assertEqual(boolean_query("Jazz"), "+jazz*")
+        self.assertEqual(boolean_query("  jazz  fest "), '+jazz* +fest* "jazz fest"')
+
+    def test_operators_are_dropped(self):
+        self.assertEqual(boolean_query('-konser +"musik" (jazz)~*'), '+konser* +musik* +jazz* "konser musik jazz"')
+        self.assertIsNone(boolean_query('+-*"()'))
+        self.assertIsNone(boolean_query(""))
+
+    def test_term_limit(self):
+        query = boolean_query(" ".join(f"w{i}" for i in range(20)))
+        self.assertEqual(query.count("+"), MAX_TERMS)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
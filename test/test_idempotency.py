@@ -0,0 +1,64 @@
+import unittest
+from flask import Flask, jsonify, request
+from helper.idempotency import idempotent, InMemoryIdempotencyStore
+
+
+class TestIdempotency(unittest.TestCase):
+    def setUp(self):
+        self.calls = 0
+        store = InMemoryIdempotencyStore(maxsize=100, ttl=60)
+        app = Flask(__name__)
+
+        @app.route('/buy', methods=['POST'])
+        @idempotent(store)
+        def buy():
+            self.calls += 1
+            if request.form.get('fail'):
+                return jsonify({"error": "boom"}), 500
+            if request.form.get('queued') and self.calls == 1:
+                return jsonify({"message": "Please wait for your turn."}), 429
+            if request.form.get('invalid'):
+                return jsonify({"message": "Bad package."}), 400
+            return jsonify({"ticket_id": self.calls}), 201
+
+        self.client = app.test_client()
+
+    def test_without_key_runs_every_time(self):
+        self.client.post('/buy')
+        self.client.post('/buy')
+        self.assertEqual(self.calls, 2)
+
+    def test_replays_stored_response(self):
+        first = self.client.post('/buy', data={"package_id": 1}, headers={"Idempotency-Key": "k1"})
+        again = self.client.post('/buy', data={"package_id": 1}, headers={"Idempotency-Key": "k1"})
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(again.status_code, 201)
+        self.assertEqual(again.get_json(), first.get_json())
+        self.assertEqual(again.headers['Idempotent-Replayed'], 'true')
+
+    def test_key_reused_for_other_payload(self):
+        self.client.post('/buy', data={"package_id": 1}, headers={"Idempotency-Key": "k1"})
+        other = self.client.post('/buy', data={"package_id": 2}, headers={"Idempotency-Key": "k1"})
+        self.assertEqual(other.status_code, 422)
+
+    def test_server_error_is_not_stored(self):
+        self.client.post('/buy', data={"fail": 1}, headers={"Idempotency-Key": "k2"})
+        self.client.post('/buy', data={"fail": 1}, headers={"Idempotency-Key": "k2"})
+        self.assertEqual(self.calls, 2)
+
+    def test_too_many_requests_is_not_stored(self):
+        queued = self.client.post('/buy', data={"queued": 1}, headers={"Idempotency-Key": "k3"})
+        admitted = self.client.post('/buy', data={"queued": 1}, headers={"Idempotency-Key": "k3"})
+        self.assertEqual(queued.status_code, 429)
+        self.assertEqual(admitted.status_code, 201)
+        self.assertNotIn('Idempotent-Replayed', admitted.headers)
+
+    def test_client_error_is_replayed(self):
+        self.client.post('/buy', data={"invalid": 1}, headers={"Idempotency-Key": "k4"})
+        again = self.client.post('/buy', data={"invalid": 1}, headers={"Idempotency-Key": "k4"})
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(again.status_code, 400)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,80 @@
+import json
+import unittest
+from unittest import mock
+
+from flask import Flask
+
+from helper import signals
+from helper.live_feed import LiveFeed, InMemoryBroker, sse_message
+
+
+def parse(message):
+    fields = dict(line.split(": ", 1) for line in message.strip().splitlines())
+    return fields["event"], json.loads(fields["data"])
+
+
+class TestLiveFeed(unittest.TestCase):
+    def setUp(self):
+        self.feed = LiveFeed(InMemoryBroker(queue_size=2), heartbeat=0.01)
+
+    def test_one_publish_reaches_every_listener(self):
+        streams = [self.feed.stream(7, snapshot={"sold": 3}) for _ in range(3)]
+        for stream in streams:
+            self.assertTrue(next(stream).startswith("retry:"))
+            self.assertEqual(parse(next(stream)), ("snapshot", {"sold": 3}))
+
+        self.feed._on_purchase(None, event_id=7, user_id=1, ticket_ids=[10, 11])
+        self.feed._on_validate(None, event_id=8, ticket_ids=[99], owner_ids=[1])
+        for stream in streams:
+            event, data = parse(next(stream))
+            self.assertEqual((event, data["count"], data["ticket_ids"]), ("sold", 2, [10, 11]))
+            self.assertEqual(next(stream), ": keep-alive\n\n")
+            stream.close()
+        self.assertEqual(self.feed.broker.publish("event:7", {}), 0)
+
+    def test_slow_listener_is_dropped(self):
+        stream = self.feed.stream(7)
+        next(stream)
+        for ticket_id in range(5):
+            self.feed._on_validate(None, event_id=7, ticket_ids=[ticket_id])
+        # The stream ends; the client reconnects and starts again from a snapshot
+        self.assertEqual(list(stream), [])
+        self.assertEqual(self.feed.broker.publish("event:7", {}), 0)
+
+    def test_sse_message(self):
+        self.assertEqual(sse_message("sold", {"count": 1}, event_id=4), 'event: sold\nid: 4\ndata: {"count":1}\n\n')
+
+
+class TestStreamAccess(unittest.TestCase):
+    def setUp(self):
+        self.feed = LiveFeed(max_streams=2, token_ttl=60)
+        app = Flask(__name__)
+        app.config.update(SECRET_KEY="test")
+        self.feed.init_app(app)
+
+    def tearDown(self):
+        signals.tickets_purchased.disconnect(self.feed._on_purchase)
+        signals.tickets_validated.disconnect(self.feed._on_validate)
+
+    def test_token_is_bound_to_event(self):
+        token = self.feed.issue_token(5, 7)
+        self.assertEqual(self.feed.read_token(token, 7), 5)
+        self.assertIsNone(self.feed.read_token(token, 8))
+        self.assertIsNone(self.feed.read_token(token[:-2], 7))
+        self.assertIsNone(self.feed.read_token("", 7))
+
+    def test_token_expires(self):
+        token = self.feed.issue_token(5, 7)
+        with mock.patch("itsdangerous.timed.time.time", return_value=10 ** 10):
+            self.assertIsNone(self.feed.read_token(token, 7))
+
+    def test_streams_are_capped(self):
+        self.assertTrue(self.feed.acquire())
+        self.assertTrue(self.feed.acquire())
+        self.assertFalse(self.feed.acquire())
+        self.feed.release()
+        self.assertTrue(self.feed.acquire())
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
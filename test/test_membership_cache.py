@@ -0,0 +1,62 @@
+import unittest
+from helper.membership_cache import MembershipCache
+
+
+class FakeCursor:
+    """Answers the two lookups from in-memory tables and counts queries."""
+
+    def __init__(self, panitia, owners):
+        self.panitia = panitia
+        self.owners = owners
+        self.queries = 0
+        self._result = None
+
+    def execute(self, query, params):
+        self.queries += 1
+        if "panitia" in query:
+            self._result = (1,) if tuple(params) in self.panitia else None
+        else:
+            owner = self.owners.get(params[0])
+            self._result = (owner,) if owner else None
+
+    def fetchone(self):
+        return self._result
+
+
+class TestMembershipCache(unittest.TestCase):
+    def setUp(self):
+        self.cursor = FakeCursor(panitia={(5, 1)}, owners={1: 9})
+        self.cache = MembershipCache(ttl=60)
+
+    def test_membership_is_cached(self):
+        self.assertTrue(self.cache.is_committee_member(5, 1, self.cursor))
+        self.assertTrue(self.cache.is_committee_member("5", "1", self.cursor))
+        self.assertFalse(self.cache.is_committee_member(6, 1, self.cursor))
+        self.assertFalse(self.cache.is_committee_member(6, 1, self.cursor))
+        self.assertEqual(self.cursor.queries, 2)
+
+    def test_invalidate_member(self):
+        self.assertFalse(self.cache.is_committee_member(6, 1, self.cursor))
+        self.cursor.panitia.add((6, 1))
+        self.cache.invalidate_member("6", 1)
+        self.assertTrue(self.cache.is_committee_member(6, 1, self.cursor))
+
+    def test_invalidate_event(self):
+        self.assertTrue(self.cache.is_committee_member(5, 1, self.cursor))
+        self.assertEqual(self.cache.get_event_owner(1, self.cursor), 9)
+        self.cursor.panitia.clear()
+        del self.cursor.owners[1]
+        self.cache.invalidate_event(1)
+        self.assertFalse(self.cache.is_committee_member(5, 1, self.cursor))
+        self.assertIsNone(self.cache.get_event_owner(1, self.cursor))
+
+    def test_missing_event_is_not_cached(self):
+        self.assertIsNone(self.cache.get_event_owner(2, self.cursor))
+        self.cursor.owners[2] = 9
+        self.assertEqual(self.cache.get_event_owner(2, self.cursor), 9)
+        self.assertEqual(self.cache.get_event_owner(2, self.cursor), 9)
+        self.assertEqual(self.cursor.queries, 2)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
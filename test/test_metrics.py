@@ -0,0 +1,131 @@
+import os
+import tempfile
+import unittest
+
+from flask import Blueprint, Flask
+
+from helper import signals
+from helper.metrics import Metrics, MetricsFiles, MetricsRegistry
+
+
+class TestRegistry(unittest.TestCase):
+    def test_histogram_buckets_are_cumulative(self):
+        registry = MetricsRegistry()
+        latency = registry.histogram("latency_seconds", "Latency.", ("route",), buckets=(0.1, 1))
+        for value in (0.05, 0.1, 0.5, 3):
+            latency.observe(value, route="/a")
+        text = registry.render()
+        self.assertIn('latency_seconds_bucket{route="/a",le="0.1"} 2', text)
+        self.assertIn('latency_seconds_bucket{route="/a",le="1"} 3', text)
+        self.assertIn('latency_seconds_bucket{route="/a",le="+Inf"} 4', text)
+        self.assertIn('latency_seconds_sum{route="/a"} 3.65', text)
+        self.assertIn('latency_seconds_count{route="/a"} 4', text)
+        self.assertIn("# TYPE latency_seconds histogram", text)
+
+    def test_label_values_are_escaped(self):
+        registry = MetricsRegistry()
+        registry.counter("hits_total", "Hits.", ("path",)).inc(path='a"b\\c')
+        self.assertIn('hits_total{path="a\\"b\\\\c"} 1', registry.render())
+
+    def test_processes_are_merged(self):
+        registry = MetricsRegistry()
+        sold = registry.counter("sold_total", "Sold.")
+        busy = registry.gauge("busy", "Busy.")
+        sold.inc(3)
+        busy.set(2)
+        first = registry.snapshot()
+        sold.inc(2)
+        busy.set(5)
+        second = registry.snapshot()
+
+        text = registry.render([(first, True), (second, False)])
+        # Counters of an exited worker still count, its gauges do not
+        self.assertIn("sold_total 8", text)
+        self.assertIn("busy 2", text)
+
+    def test_snapshot_files(self):
+        registry = MetricsRegistry()
+        registry.counter("sold_total", "Sold.").inc(4)
+        with tempfile.TemporaryDirectory() as directory:
+            files = MetricsFiles(directory)
+            files.write(registry.snapshot())
+            files.write(registry.snapshot(), pid=2 ** 22 + 12345)
+            snapshots = files.read()
+            self.assertEqual(sorted(alive for _, alive in snapshots), [False, True])
+            self.assertIn("sold_total 8", registry.render(snapshots))
+            self.assertEqual(len(os.listdir(directory)), 2)
+
+            # A process reusing the dead worker's pid gets its own file
+            MetricsFiles(directory).write(registry.snapshot(), pid=2 ** 22 + 12345)
+            self.assertEqual(len(os.listdir(directory)), 3)
+
+            files.remove()
+            self.assertEqual(len(os.listdir(directory)), 2)
+
+
+class TestMetricsApp(unittest.TestCase):
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config.update(METRICS_TOKEN="secret")
+        events = Blueprint("events", __name__)
+
+        @events.route("/events/<int:event_id>")
+        def get_event(event_id):
+            return {"id": event_id}
+
+        self.app.register_blueprint(events, url_prefix="/api/v1/events")
+        self.metrics = Metrics()
+        self.metrics.registry.add_collector = lambda collect: None  # no DB pools in these tests
+        self.metrics.init_app(self.app)
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        signals.tickets_purchased.disconnect(self.metrics._on_purchase)
+        signals.tickets_validated.disconnect(self.metrics._on_validate)
+        signals.ticket_transferred.disconnect(self.metrics._on_transfer)
+
+    def test_requests_by_route_template(self):
+        self.client.get("/api/v1/events/events/1")
+        self.client.get("/api/v1/events/events/2")
+        self.client.get("/missing")
+        text = self.scrape()
+        self.assertIn('http_requests_total{blueprint="events",route="/api/v1/events/events/<int:event_id>",'
+                      'method="GET",status="200"} 2', text)
+        self.assertIn('route="<unmatched>",method="GET",status="404"} 1', text)
+        self.assertIn('http_request_duration_seconds_count{blueprint="events",'
+                      'route="/api/v1/events/events/<int:event_id>",method="GET"} 2', text)
+        self.assertIn('http_requests_in_flight{blueprint="events"} 0', text)
+        # Only the /metrics request itself is still running
+        self.assertIn('http_requests_in_flight{blueprint="app"} 1', text)
+
+    def test_ticket_counters(self):
+        signals.tickets_purchased.send(None, event_id=1, user_id=2, ticket_ids=[1, 2, 3])
+        signals.tickets_validated.send(None, event_id=1, ticket_ids=[1], owner_ids=[2])
+        text = self.scrape()
+        self.assertIn("tickets_sold_total 3", text)
+        self.assertIn("tickets_validated_total 1", text)
+
+    def scrape(self):
+        return self.client.get("/metrics", headers={"Authorization": "Bearer secret"}).get_data(as_text=True)
+
+    def test_token(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 401)
+        self.assertEqual(self.client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code, 401)
+        response = self.client.get("/metrics", headers={"Authorization": "Bearer secret"})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith("text/plain; version=0.0.4"))
+
+    def test_not_served_without_token(self):
+        app = Flask(__name__)
+        metrics = Metrics()
+        metrics.init_app(app)
+        try:
+            self.assertEqual(app.test_client().get("/metrics").status_code, 404)
+        finally:
+            signals.tickets_purchased.disconnect(metrics._on_purchase)
+            signals.tickets_validated.disconnect(metrics._on_validate)
+            signals.ticket_transferred.disconnect(metrics._on_transfer)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,35 @@
+import unittest
+from datetime import date, datetime
+from helper.pagination import encode_cursor, decode_cursor, keyset_condition, next_cursor, InvalidCursor
+
+
+class TestPagination(unittest.TestCase):
+    def test_cursor_round_trip(self):
+        cursor = encode_cursor((datetime(2024, 11, 20, 19, 30, 5), 42))
+        self.assertEqual(decode_cursor(cursor, 2), ["2024-11-20 19:30:05", 42])
+        self.assertEqual(decode_cursor(encode_cursor((date(2024, 1, 2), 7)), 2), ["2024-01-02", 7])
+        self.assertEqual(decode_cursor(encode_cursor((0.6931471805599453, "2024-01-02", 7)), 3),
+                         [0.6931471805599453, "2024-01-02", 7])
+
+    def test_invalid_cursor(self):
+        for cursor in ["", "%%%", encode_cursor([1]), encode_cursor([{"a": 1}, 2])]:
+            with self.assertRaises(InvalidCursor):
+                decode_cursor(cursor, 2)
+
+    def test_keyset_condition(self):
+        sql, params = keyset_condition(["a", "b"], ["x", 1], descending=True)
+        self.assertEqual(sql, "((a < %s) OR (a = %s AND b < %s))")
+        self.assertEqual(params, ["x", "x", 1])
+        sql, _ = keyset_condition(["a", "b"], ["x", 1])
+        self.assertIn("b > %s", sql)
+
+    def test_next_cursor(self):
+        rows = [(1, "a"), (2, "b"), (3, "c")]
+        cursor = next_cursor(rows, 2, lambda row: (row[1], row[0]))
+        self.assertEqual(rows, [(1, "a"), (2, "b")])
+        self.assertEqual(decode_cursor(cursor, 2), ["b", 2])
+        self.assertIsNone(next_cursor(rows, 2, lambda row: row))
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
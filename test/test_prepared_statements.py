@@ -0,0 +1,136 @@
+import time
+import unittest
+
+from helper import prepared_statements
+from helper.db_pool import ConnectionPool
+from helper.prepared_statements import PreparedStatements
+from test.db_fixture import DB_CONFIGURED, SKIP_REASON, create_event_fixture, drop_event_fixture
+
+
+class FakePreparedCursor:
+    """Prepares like mysql-connector: again whenever handed another string object"""
+
+    def __init__(self, server):
+        self.server = server
+        self.executed = None
+        self.closed = False
+        self.rowcount = 1
+
+    def execute(self, query, params):
+        if query is not self.executed:
+            self.server.prepares += 1
+            self.executed = query
+        if params == ("boom",):
+            raise RuntimeError("statement failed")
+
+    def fetchall(self):
+        return [(1,)]
+
+    def close(self):
+        self.closed = True
+
+
+class FakeConnection:
+    def __init__(self):
+        self.prepares = 0
+        self.cursors = []
+        self.in_transaction = False
+        self.unread_result = False
+
+    def cursor(self, prepared=False):
+        cursor = FakePreparedCursor(self)
+        self.cursors.append(cursor)
+        return cursor
+
+    def close(self):
+        pass
+
+
+class TestPreparedStatements(unittest.TestCase):
+    def setUp(self):
+        self.connection = FakeConnection()
+        self.statements = PreparedStatements(maxsize=2)
+
+    def test_statement_is_prepared_once(self):
+        query = "SELECT 1 FROM panitia WHERE id_user = %s AND id_acara = %s"
+        for user_id in range(5):
+            # An equal string built at run time must still hit the same statement
+            self.statements.execute(self.connection, "".join(query), (user_id, 1))
+        self.assertEqual(self.connection.prepares, 1)
+        self.assertEqual((self.statements.prepares, self.statements.executions), (1, 5))
+
+    def test_least_recently_used_is_closed(self):
+        self.statements.execute(self.connection, "A", ())
+        self.statements.execute(self.connection, "B", ())
+        self.statements.execute(self.connection, "A", ())
+        self.statements.execute(self.connection, "C", ())
+        self.assertEqual(len(self.statements), 2)
+        self.assertTrue(self.connection.cursors[1].closed)
+        self.assertFalse(self.connection.cursors[0].closed)
+
+    def test_failed_statement_is_dropped(self):
+        with self.assertRaises(RuntimeError):
+            self.statements.execute(self.connection, "A", ("boom",))
+        self.assertEqual(len(self.statements), 0)
+        self.assertTrue(self.connection.cursors[0].closed)
+
+    def test_plain_connection_uses_cursor(self):
+        class PlainCursor:
+            def execute(self, query, params):
+                self.query = query
+
+        cursor = PlainCursor()
+        self.assertIs(prepared_statements.execute(object(), cursor, "SELECT 1", ()), cursor)
+        self.assertEqual(cursor.query, "SELECT 1")
+
+    def test_pool_keeps_statements_across_checkouts(self):
+        pool = ConnectionPool(FakeConnection, size=1, max_overflow=0, leak_timeout=0)
+        for _ in range(3):
+            with pool.get_connection() as connection:
+                self.assertEqual(connection.execute_prepared("SELECT 1", ()).fetchall(), [(1,)])
+        with pool.get_connection() as connection:
+            self.assertEqual(connection.prepares, 1)
+
+
+@unittest.skipUnless(DB_CONFIGURED, SKIP_REASON)
+class TestPreparedThroughput(unittest.TestCase):
+    """Queries per second of the hot lookups, sent as text versus prepared"""
+
+    ROUNDS = 5000
+
+    def setUp(self):
+        from helper.db_helper import get_connection
+        self.get_connection = get_connection
+        with get_connection() as connection:
+            self.user_id, self.event_id, self.package_id = create_event_fixture(connection, stock=10)
+
+    def tearDown(self):
+        with self.get_connection() as connection:
+            drop_event_fixture(connection, self.user_id, self.event_id, self.package_id)
+
+    def rate(self, run):
+        start = time.perf_counter()
+        for _ in range(self.ROUNDS):
+            run()
+        return self.ROUNDS / (time.perf_counter() - start)
+
+    def test_prepared_is_faster(self):
+        query = """
+            SELECT p.id_acara, t.deleted_at, t.user_id, t.package_id
+            FROM tickets t
+            JOIN packages p ON t.package_id = p.id
+            WHERE t.id = %s
+        """
+        with self.get_connection() as connection:
+            with connection.cursor() as cursor:
+                def text():
+                    cursor.execute(query, (1,))
+                    cursor.fetchall()
+                text_rate = self.rate(text)
+            prepared_rate = self.rate(lambda: connection.execute_prepared(query, (1,)).fetchall())
+        print(f"\ntext: {text_rate:.0f} q/s, prepared: {prepared_rate:.0f} q/s")
+        self.assertGreater(prepared_rate, text_rate)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,143 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from collections import Counter
+
+from flask import Flask
+
+from helper.profiler import RequestProfiler, StackSampler, collapse, decode_stacks, encode_stacks, render_collapsed
+
+
+def busy(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+class TestCollapse(unittest.TestCase):
+    def test_outermost_frame_first(self):
+        def inner():
+            import sys
+            return collapse(sys._getframe())
+
+        stack = inner().split(";")
+        self.assertEqual(stack[-1], "test/test_profiler.py:inner")
+        self.assertEqual(stack[-2], "test/test_profiler.py:test_outermost_frame_first")
+
+    def test_render(self):
+        self.assertEqual(render_collapsed(Counter({"a;b": 2, "a;c": 5})), "a;c 5\na;b 2\n")
+
+
+class TestStackSampler(unittest.TestCase):
+    def test_samples_registered_thread(self):
+        sampler = StackSampler(interval=0.001)
+        result = {}
+
+        def work():
+            sampler.start(threading.get_ident())
+            busy(0.1)
+            result["samples"] = sampler.stop(threading.get_ident())
+
+        thread = threading.Thread(target=work)
+        thread.start()
+        thread.join()
+        # A sample can land on the lines around busy(), so most, not all, end in it
+        samples = result["samples"]
+        in_busy = sum(count for stack, count in samples.items() if stack.endswith("test_profiler.py:busy"))
+        self.assertGreater(in_busy, 10)
+        self.assertGreater(in_busy, sum(samples.values()) // 2)
+
+
+class TestEncodeStacks(unittest.TestCase):
+    def test_round_trip(self):
+        stacks = Counter({"GET /a;f": 3, "GET /a;g": 1})
+        value, left_out = encode_stacks(stacks)
+        self.assertEqual(decode_stacks(value), render_collapsed(stacks))
+        self.assertEqual(left_out, 0)
+
+    def test_rarest_stacks_are_left_out_to_fit(self):
+        stacks = Counter({f"GET /a;{os.urandom(16).hex()}": count for count in range(1, 101)})
+        value, left_out = encode_stacks(stacks, limit=1000)
+        self.assertLessEqual(len(value), 1000)
+        self.assertGreater(left_out, 0)
+        kept = decode_stacks(value).splitlines()
+        self.assertEqual(len(kept), 100 - left_out)
+        self.assertTrue(kept[0].endswith(" 100"))
+
+
+class TestRequestProfiler(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.app = Flask(__name__)
+        self.app.config.update(PROFILER_ENABLED=True, PROFILER_SAMPLE_RATE=0, PROFILER_INTERVAL_MS=1,
+                               PROFILER_TOKEN="secret", PROFILER_DIR=self.directory)
+
+        @self.app.route("/events")
+        def get_all_events():
+            busy(0.05)
+            return "ok"
+
+        self.profiler = RequestProfiler()
+        self.profiler.init_app(self.app)
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_unsampled_request_is_not_profiled(self):
+        response = self.client.get("/events", headers={"X-Profile-Token": "wrong"})
+        self.assertNotIn("X-Profile-Id", response.headers)
+        self.assertEqual(self.profiler.stacks(), "")
+
+    def test_forced_request(self):
+        response = self.client.get("/events", headers={"X-Profile-Token": "secret"})
+        profile = self.profiler.request_profile(response.headers["X-Profile-Id"])
+        self.assertGreater(int(response.headers["X-Profile-Samples"]), 0)
+        self.assertTrue(profile.startswith("GET /events;"))
+        self.assertIn("test_profiler.py:get_all_events;test/test_profiler.py:busy", profile)
+        self.assertIn("test_profiler.py:get_all_events", self.profiler.stacks(route="GET /events"))
+        self.assertEqual(self.profiler.stacks(route="GET /other"), "")
+        with open(os.path.join(self.directory, f"profile-{os.getpid()}.folded")) as handle:
+            self.assertIn("GET /events;", handle.read())
+
+    def test_forced_profile_is_readable_from_another_worker(self):
+        response = self.client.get("/events", headers={"X-Profile-Token": "secret"})
+        profile_id = response.headers["X-Profile-Id"]
+        self.assertNotIn("X-Profile-Stacks", response.headers)
+        other_worker = RequestProfiler()
+        other_worker.directory = self.directory
+        self.assertEqual(other_worker.request_profile(profile_id), self.profiler.request_profile(profile_id))
+        self.assertIsNone(other_worker.request_profile("0" * 32))
+        self.assertIsNone(other_worker.request_profile("../profile-x"))
+
+    def test_forced_profile_without_directory_is_in_the_response(self):
+        self.profiler.directory = None
+        response = self.client.get("/events", headers={"X-Profile-Token": "secret"})
+        stacks = decode_stacks(response.headers["X-Profile-Stacks"])
+        self.assertEqual(stacks, self.profiler.request_profile(response.headers["X-Profile-Id"]))
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_random_sampling_and_limit(self):
+        self.profiler.sample_rate = 1
+        self.profiler.max_stacks = 1
+        self.client.get("/events")
+        self.client.get("/events")
+        stats = self.profiler.stats()
+        self.assertEqual(stats["profiled_requests"], 2)
+        self.assertEqual(stats["stacks"], 1)
+        self.profiler.reset()
+        self.assertEqual(self.profiler.stacks(), "")
+
+    def test_disabled_adds_no_hooks(self):
+        app = Flask(__name__)
+        profiler = RequestProfiler()
+        profiler.init_app(app)
+        self.assertFalse(profiler.enabled)
+        self.assertEqual(app.before_request_funcs, {})
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,128 @@
+import unittest
+from flask import Flask, jsonify
+from helper import signals
+from helper.response_cache import ResponseCache, InMemoryResponseStore, MySQLResponseStore, packages_tag
+
+
+class FakeVersionsTable:
+    """cache_versions shared by several stores, answering the two statements they run"""
+
+    def __init__(self):
+        self.rows = {}
+        self.result = []
+
+    def execute(self, query, params):
+        if query.startswith("SELECT"):
+            self.result = [(tag, self.rows[tag]) for tag in params if tag in self.rows]
+        else:
+            self.rows[params[0]] = self.rows.get(params[0], 0) + 1
+
+    def fetchall(self):
+        return self.result
+
+    def cursor(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class TestResponseCache(unittest.TestCase):
+    def setUp(self):
+        self.calls = 0
+        self.cache = ResponseCache(InMemoryResponseStore(maxsize=100, ttl=60), max_age=30)
+        app = Flask(__name__)
+        self.cache.init_app(app)
+
+        @app.route('/packages/<int:id_acara>')
+        @self.cache.cached(lambda id_acara: [packages_tag(id_acara)])
+        def packages(id_acara):
+            self.calls += 1
+            if id_acara == 0:
+                return jsonify({"message": "boom"}), 500
+            return jsonify({"event_id": id_acara, "calls": self.calls}), 200
+
+        self.app = app
+        self.client = app.test_client()
+
+    def tearDown(self):
+        for signal in (signals.event_changed, signals.packages_changed, signals.tickets_purchased):
+            signal.disconnect(self.cache._on_event_changed)
+            signal.disconnect(self.cache._on_packages_changed)
+
+    def test_cached_with_etag(self):
+        first = self.client.get('/packages/1')
+        again = self.client.get('/packages/1')
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(again.get_json(), first.get_json())
+        self.assertEqual(again.headers['ETag'], first.headers['ETag'])
+        self.assertEqual(again.headers['Cache-Control'], 'public, max-age=30')
+
+        self.client.get('/packages/1?page=2')
+        self.assertEqual(self.calls, 2)
+
+    def test_conditional_get(self):
+        etag = self.client.get('/packages/1').headers['ETag']
+        response = self.client.get('/packages/1', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b"")
+        self.assertEqual(response.headers['ETag'], etag)
+
+    def test_signals_invalidate_by_tag(self):
+        etag = self.client.get('/packages/1').headers['ETag']
+        self.client.get('/packages/2')
+        signals.tickets_purchased.send(self.app, event_id=1, user_id=5, ticket_ids=[9])
+
+        response = self.client.get('/packages/1', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+        self.client.get('/packages/2')
+        self.assertEqual(self.calls, 3)
+
+        signals.event_changed.send(self.app, event_id=2)
+        self.client.get('/packages/2')
+        self.assertEqual(self.calls, 4)
+
+    def test_errors_are_not_cached(self):
+        self.client.get('/packages/0')
+        response = self.client.get('/packages/0')
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(self.calls, 2)
+        self.assertNotIn('ETag', response.headers)
+
+
+class TestSharedVersions(unittest.TestCase):
+    """Two workers, each with its own responses but the versions in one table"""
+
+    def setUp(self):
+        table = FakeVersionsTable()
+        self.calls = 0
+        self.clients = []
+        for _ in range(2):
+            cache = ResponseCache(MySQLResponseStore(lambda: table))
+            app = Flask(__name__)
+
+            @app.route('/packages/<int:id_acara>')
+            @cache.cached(lambda id_acara: [packages_tag(id_acara)])
+            def packages(id_acara):
+                self.calls += 1
+                return jsonify({"event_id": id_acara, "calls": self.calls}), 200
+
+            self.clients.append((cache, app.test_client()))
+
+    def test_bump_in_one_worker_retires_responses_in_the_other(self):
+        (first, first_client), (second, second_client) = self.clients
+        etag = second_client.get('/packages/1').headers['ETag']
+        self.assertEqual(second_client.get('/packages/1', headers={'If-None-Match': etag}).status_code, 304)
+
+        first.invalidate(packages_tag(1))
+        response = second_client.get('/packages/1', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()["calls"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
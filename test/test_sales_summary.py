@@ -0,0 +1,82 @@
+import unittest
+from decimal import Decimal
+
+from helper.sales_summary import record_sales, record_validations, record_deletion, event_summary, rebuild
+
+
+class FakeCursor:
+    """Records statements and answers SELECTs from a queue of results."""
+
+    def __init__(self, results=()):
+        self.results = list(results)
+        self.statements = []
+
+    def execute(self, query, params=()):
+        self.statements.append((" ".join(query.split()), params))
+
+    def executemany(self, query, rows):
+        self.statements.append((" ".join(query.split()), rows))
+
+    def fetchall(self):
+        return self.results.pop(0)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class FakeConnection:
+    def __init__(self, cursor):
+        self.cursor_ = cursor
+        self.committed = False
+
+    def cursor(self):
+        return self.cursor_
+
+    def start_transaction(self):
+        pass
+
+    def commit(self):
+        self.committed = True
+
+    def rollback(self):
+        pass
+
+
+class TestSalesSummary(unittest.TestCase):
+    def test_counters_are_grouped_per_package_in_order(self):
+        cursor = FakeCursor()
+        record_sales(cursor, 7, [5, 3, 5, 5])
+        record_validations(cursor, 7, [])
+        record_deletion(cursor, 7, 3, was_validated=True, price=Decimal("50000.00"))
+        self.assertEqual(len(cursor.statements), 2)
+        self.assertIn("SELECT price FROM packages", cursor.statements[0][0])
+        self.assertEqual(cursor.statements[0][1], [(3, 7, 1, 1, 3), (5, 7, 3, 3, 5)])
+        self.assertEqual(cursor.statements[1][1], [(3, 7, -1, -1, Decimal("-50000.00"))])
+
+    def test_event_summary_uses_stored_revenue(self):
+        # 4 sold for 45000 each before the price went up to 50000
+        cursor = FakeCursor([[(1, "Regular", Decimal("50000.00"), 10, 4, 1, Decimal("180000.00")),
+                              (2, "VIP", Decimal("150000.00"), 0, 0, 0, Decimal("0"))]])
+        summary = event_summary(cursor, 7)
+        self.assertEqual(summary["packages"][0]["revenue"], 180000.0)
+        self.assertEqual(summary["totals"], {"sold": 4, "validated": 1, "remaining": 10, "revenue": 180000.0})
+
+    def test_rebuild_reports_and_fixes_drift(self):
+        stored = [(1, 4, 1, 400), (2, 3, 0, 300), (9, 1, 0, 100)]
+        counted = [(1, 7, 4, 1, 400), (2, 7, 2, 0, 200), (3, 7, 1, 1, 150)]
+        cursor = FakeCursor([stored, counted])
+        connection = FakeConnection(cursor)
+
+        drift = rebuild(connection, 7)
+        self.assertEqual(drift, [(2, (3, 0, 300), (2, 0, 200)), (3, (0, 0, 0), (1, 1, 150)),
+                                 (9, (1, 0, 100), (0, 0, 0))])
+        self.assertTrue(connection.committed)
+        writes = [params for query, params in cursor.statements if not query.startswith("SELECT")]
+        self.assertEqual(writes, [(2, 7, 2, 0, 200), (3, 7, 1, 1, 150), (9,)])
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
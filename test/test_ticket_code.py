@@ -0,0 +1,50 @@
+import unittest
+from flask import Flask
+from helper.ticket_code import event_key, sign_ticket, verify_ticket_code, require_secret, InvalidTicketCode
+
+
+class TestTicketCode(unittest.TestCase):
+    def setUp(self):
+        self.key = event_key("secret", 7)
+
+    def test_round_trip(self):
+        code = sign_ticket(self.key, 1234, 7, 3)
+        self.assertEqual(verify_ticket_code(self.key, code), (1234, 7, 3))
+
+    def test_code_is_compact(self):
+        self.assertLessEqual(len(sign_ticket(self.key, 2**31, 7, 3)), 32)
+
+    def test_keys_are_per_event(self):
+        self.assertNotEqual(event_key("secret", 7), event_key("secret", 8))
+        code = sign_ticket(self.key, 1234, 7, 3)
+        with self.assertRaises(InvalidTicketCode):
+            verify_ticket_code(event_key("secret", 8), code)
+
+    def test_tampered_code(self):
+        code = sign_ticket(self.key, 1234, 7, 3)
+        tampered = ("B" if code[0] != "B" else "C") + code[1:]
+        with self.assertRaises(InvalidTicketCode):
+            verify_ticket_code(self.key, tampered)
+
+    def test_malformed_code(self):
+        for code in ["", "not-a-code", "AAAA"]:
+            with self.assertRaises(InvalidTicketCode):
+                verify_ticket_code(self.key, code)
+
+
+class TestRequireSecret(unittest.TestCase):
+    def test_refuses_to_start_without_secret(self):
+        app = Flask(__name__)
+        app.config.update(SECRET_KEY="supersecretkey", TICKET_CODE_SECRET="")
+        with self.assertRaises(RuntimeError):
+            require_secret(app)
+
+    def test_debug_falls_back_to_secret_key(self):
+        app = Flask(__name__)
+        app.config.update(DEBUG=True, SECRET_KEY="dev", TICKET_CODE_SECRET="")
+        require_secret(app)
+        self.assertEqual(app.config["TICKET_CODE_SECRET"], "dev")
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
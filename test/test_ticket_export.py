@@ -0,0 +1,125 @@
+import csv
+import io
+import json
+import unittest
+from datetime import datetime
+from decimal import Decimal
+from unittest import mock
+
+from flask import Flask
+from flask_jwt_extended import JWTManager, create_access_token
+
+from helper.ticket_export import EXPORT_COLUMNS, stream_attendees
+
+ROWS = [
+    (1, 5, "budi", "budi@mail.com", 3, "Regular", Decimal("50000.00"), datetime(2024, 11, 20, 19, 30), None, None),
+    (2, 6, "siti", "siti@mail.com", 3, "Regular", Decimal("50000.00"), datetime(2024, 11, 21, 8, 0), 9,
+     datetime(2024, 12, 1, 18, 0)),
+    (3, 7, "andi, jr", "andi@mail.com", 4, "VIP", Decimal("150000.00"), datetime(2024, 11, 22, 9, 0), None, None),
+]
+
+
+class FakeCursor:
+    def __init__(self, rows):
+        self.rows = list(rows)
+        self.fetches = 0
+        self.closed = False
+
+    def execute(self, query, params):
+        pass
+
+    def fetchmany(self, size):
+        self.fetches += 1
+        batch, self.rows = self.rows[:size], self.rows[size:]
+        return batch
+
+    def close(self):
+        self.closed = True
+
+
+class FakeConnection:
+    def __init__(self, rows):
+        self.cursor_ = FakeCursor(rows)
+
+    def cursor(self, buffered=True):
+        assert buffered is False
+        return self.cursor_
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class TestTicketExport(unittest.TestCase):
+    def test_csv(self):
+        connection = FakeConnection(ROWS)
+        chunks = list(stream_attendees(lambda: connection, 1, "csv", batch_size=2))
+        self.assertEqual(len(chunks), 2)
+        rows = list(csv.reader(io.StringIO("".join(chunks))))
+        self.assertEqual(rows[0], EXPORT_COLUMNS)
+        self.assertEqual(rows[1][:8], ["1", "5", "budi", "budi@mail.com", "3", "Regular", "50000.00",
+                                       "2024-11-20 19:30:00"])
+        self.assertEqual(rows[3][2], "andi, jr")
+        self.assertTrue(connection.cursor_.closed)
+
+    def test_csv_neutralises_formulas(self):
+        row = (4, 8, "=HYPERLINK(\"http://x\")", "@evil.com", 3, "-2+3", Decimal("-1.00"), None, None, None)
+        chunks = stream_attendees(lambda: FakeConnection([row]), 1, "csv")
+        cells = list(csv.reader(io.StringIO("".join(chunks))))[1]
+        self.assertEqual(cells[2:7], ["'=HYPERLINK(\"http://x\")", "'@evil.com", "3", "'-2+3", "-1.00"])
+
+    def test_ndjson(self):
+        chunks = stream_attendees(lambda: FakeConnection(ROWS), 1, "ndjson", batch_size=10)
+        lines = "".join(chunks).splitlines()
+        self.assertEqual(len(lines), 3)
+        second = json.loads(lines[1])
+        self.assertEqual(second["deleted_by"], 9)
+        self.assertEqual(second["deleted_at"], "2024-12-01 18:00:00")
+
+    def test_empty_csv_has_header(self):
+        chunks = list(stream_attendees(lambda: FakeConnection([]), 1, "csv"))
+        self.assertEqual(chunks, [",".join(EXPORT_COLUMNS) + "\r\n"])
+
+    def test_abandoned_download_drains_cursor(self):
+        connection = FakeConnection(ROWS)
+        chunks = stream_attendees(lambda: connection, 1, "ndjson", batch_size=1)
+        next(chunks)
+        chunks.close()
+        self.assertEqual(connection.cursor_.rows, [])
+        self.assertTrue(connection.cursor_.closed)
+
+
+class TestExportEndpoint(unittest.TestCase):
+    """The export route end to end, with the database and membership lookups faked"""
+
+    def setUp(self):
+        from api.tickets.endpoints import tickets_endpoints
+        self.app = Flask(__name__)
+        self.app.config.update(JWT_SECRET_KEY="test-secret-key-of-at-least-32-bytes", JWT_VERIFY_SUB=False, EXPORT_BATCH_SIZE=2)
+        JWTManager(self.app)
+        self.app.register_blueprint(tickets_endpoints, url_prefix="/api/v1/tickets")
+        with self.app.app_context():
+            self.token = create_access_token(identity={"id": 5})
+
+    def test_streams_whole_body(self):
+        connection = FakeConnection(ROWS)
+        with mock.patch("api.tickets.endpoints.membership_cache") as membership, \
+                mock.patch("helper.db_helper.db_router") as router:
+            membership.get_event_owner.return_value = 5
+            router.get_connection.return_value = connection
+            response = self.app.test_client().get("/api/v1/tickets/export/1?format=csv",
+                                                  headers={"Authorization": f"Bearer {self.token}"})
+            body = response.get_data(as_text=True)
+
+        self.assertEqual(response.status_code, 200)
+        router.get_connection.assert_called_once_with(True)
+        rows = list(csv.reader(io.StringIO(body)))
+        self.assertEqual(rows[0], EXPORT_COLUMNS)
+        self.assertEqual([row[0] for row in rows[1:]], ["1", "2", "3"])
+        self.assertTrue(connection.cursor_.closed)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,108 @@
+import time
+import unittest
+from datetime import date, timedelta
+
+from helper.ticket_filters import user_ticket_filters, InvalidFilter
+from test.db_fixture import DB_CONFIGURED, SKIP_REASON, create_event_fixture, drop_event_fixture
+
+
+class TestUserTicketFilters(unittest.TestCase):
+    def test_no_filters(self):
+        self.assertEqual(user_ticket_filters(), ("", []))
+
+    def test_search_uses_fulltext(self):
+        clause, params = user_ticket_filters(search="Jazz Fest")
+        self.assertEqual(clause, " AND MATCH(e.nama, e.deskripsi) AGAINST (%s IN BOOLEAN MODE)")
+        self.assertEqual(params, ['+jazz* +fest* "jazz fest"'])
+        self.assertEqual(user_ticket_filters(search=" +- "), ("", []))
+
+    def test_date_search_is_a_day_range(self):
+        clause, params = user_ticket_filters(search="2024-11-20")
+        self.assertEqual(clause, " AND e.tanggal >= %s AND e.tanggal < %s")
+        self.assertEqual(params, [date(2024, 11, 20), date(2024, 11, 21)])
+
+    def test_status_and_date_range(self):
+        clause, params = user_ticket_filters(status="Belum Terpakai", date_from="2024-01-01", date_to="2024-01-31")
+        self.assertEqual(clause, " AND t.deleted_at IS NULL AND e.tanggal >= %s AND e.tanggal < %s")
+        self.assertEqual(params, [date(2024, 1, 1), date(2024, 2, 1)])
+        self.assertIn("IS NOT NULL", user_ticket_filters(status="used")[0])
+
+    def test_invalid_filters(self):
+        for kwargs in [{"status": "lost"}, {"date_from": "20-01-2024"},
+                       {"date_from": "2024-02-01", "date_to": "2024-01-01"}]:
+            with self.assertRaises(InvalidFilter):
+                user_ticket_filters(**kwargs)
+
+
+EVENTS = 30
+TICKETS_PER_EVENT = 100
+
+LISTING = """
+    SELECT t.id
+    FROM tickets t
+    JOIN packages p ON t.package_id = p.id
+    JOIN events e ON p.id_acara = e.id
+    WHERE t.user_id = %s
+"""
+
+
+@unittest.skipUnless(DB_CONFIGURED, SKIP_REASON)
+class TestUserTicketFiltersBenchmark(unittest.TestCase):
+    """Listing of a user with EVENTS * TICKETS_PER_EVENT tickets, old LIKE search against the filters"""
+
+    def setUp(self):
+        from helper.db_helper import get_connection
+        self.get_connection = get_connection
+        self.fixtures = []
+        with get_connection() as connection:
+            for index in range(EVENTS):
+                fixture = create_event_fixture(connection, stock=TICKETS_PER_EVENT)
+                self.fixtures.append(fixture)
+                _, event_id, package_id = fixture
+                with connection.cursor() as cursor:
+                    name = "Konser Jazz Malam" if index % 10 == 0 else f"Seminar {index}"
+                    cursor.execute("UPDATE events SET nama = %s, tanggal = %s WHERE id = %s",
+                                   (name, date(2024, 1, 1) + timedelta(days=index), event_id))
+                    cursor.executemany("INSERT INTO tickets (user_id, package_id, purchase_date) VALUES (%s, %s, NOW())",
+                                       [(self.user_id, package_id)] * TICKETS_PER_EVENT)
+                    connection.commit()
+
+    @property
+    def user_id(self):
+        return self.fixtures[0][0]
+
+    def tearDown(self):
+        with self.get_connection() as connection:
+            for user_id, event_id, package_id in reversed(self.fixtures):
+                with connection.cursor() as cursor:
+                    cursor.execute("DELETE FROM tickets WHERE package_id = %s", (package_id,))
+                    connection.commit()
+                drop_event_fixture(connection, user_id, event_id, package_id)
+
+    def _time(self, cursor, clause, params, runs=20):
+        start = time.perf_counter()
+        for _ in range(runs):
+            cursor.execute(LISTING + clause, [self.user_id] + params)
+            rows = cursor.fetchall()
+        cursor.execute("SELECT COUNT(*)" + LISTING.split("t.id", 1)[1] + clause, [self.user_id] + params)
+        self.assertEqual(cursor.fetchone()[0], len(rows))
+        return len(rows), (time.perf_counter() - start) / runs
+
+    def test_filters_match_and_report(self):
+        with self.get_connection() as connection:
+            with connection.cursor() as cursor:
+                like_rows, like_time = self._time(cursor, " AND (e.nama LIKE %s OR e.deskripsi LIKE %s)",
+                                                  ["%jazz%", "%jazz%"])
+                rows, search_time = self._time(cursor, *user_ticket_filters(search="jazz"))
+                range_rows, range_time = self._time(
+                    cursor, *user_ticket_filters(date_from="2024-01-01", date_to="2024-01-10"))
+
+        print(f"\nLIKE search: {like_time * 1000:.1f} ms, full-text: {search_time * 1000:.1f} ms, "
+              f"date range: {range_time * 1000:.1f} ms")
+        self.assertEqual(rows, like_rows)
+        self.assertEqual(rows, EVENTS // 10 * TICKETS_PER_EVENT)
+        self.assertEqual(range_rows, 10 * TICKETS_PER_EVENT)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
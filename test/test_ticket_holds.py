@@ -0,0 +1,80 @@
+import unittest
+from datetime import datetime, timedelta
+
+from test.db_fixture import DB_CONFIGURED, SKIP_REASON, create_event_fixture, drop_event_fixture
+
+
+@unittest.skipUnless(DB_CONFIGURED, SKIP_REASON)
+class TestTicketHolds(unittest.TestCase):
+    def setUp(self):
+        from helper.db_helper import get_connection
+        self.get_connection = get_connection
+        with get_connection() as connection:
+            self.user_id, self.event_id, self.package_id = create_event_fixture(connection, stock=10, tickets_per_package=6)
+
+    def tearDown(self):
+        with self.get_connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute("DELETE FROM ticket_holds WHERE package_id = %s", (self.package_id,))
+                connection.commit()
+            drop_event_fixture(connection, self.user_id, self.event_id, self.package_id)
+
+    def _stock(self):
+        with self.get_connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT total_tickets_available FROM packages WHERE id = %s", (self.package_id,))
+                return cursor.fetchone()[0]
+
+    def test_confirm_turns_hold_into_tickets(self):
+        from helper.ticket_holds import create_hold, confirm_hold, HoldExpired
+        with self.get_connection() as connection:
+            hold_id, _ = create_hold(connection, self.user_id, self.event_id, self.package_id, 3, ttl=60)
+            self.assertEqual(self._stock(), 7)
+            event_id, ticket_ids = confirm_hold(connection, self.user_id, hold_id)
+            self.assertEqual(event_id, self.event_id)
+            self.assertEqual(len(ticket_ids), 3)
+            with self.assertRaises(HoldExpired):
+                confirm_hold(connection, self.user_id, hold_id)
+        self.assertEqual(self._stock(), 7)
+
+    def test_sweeper_returns_expired_stock(self):
+        from helper.ticket_holds import create_hold, confirm_hold, release_expired_holds, HoldExpired
+        with self.get_connection() as connection:
+            hold_id, _ = create_hold(connection, self.user_id, self.event_id, self.package_id, 4, ttl=1)
+            create_hold(connection, self.user_id, self.event_id, self.package_id, 2, ttl=1)
+            self.assertEqual(self._stock(), 4)
+
+            later = datetime.now() + timedelta(seconds=5)
+            self.assertGreaterEqual(release_expired_holds(connection, now=later), 2)
+            self.assertEqual(self._stock(), 10)
+            with self.assertRaises(HoldExpired):
+                confirm_hold(connection, self.user_id, hold_id)
+
+    def test_active_holds_are_capped_per_user(self):
+        from helper.ticket_holds import create_hold, HoldLimitReached
+        with self.get_connection() as connection:
+            create_hold(connection, self.user_id, self.event_id, self.package_id, 5, ttl=60)
+            with self.assertRaises(HoldLimitReached):
+                create_hold(connection, self.user_id, self.event_id, self.package_id, 2, ttl=60)
+            create_hold(connection, self.user_id, self.event_id, self.package_id, 1, ttl=60)
+            with self.assertRaises(HoldLimitReached):
+                create_hold(connection, self.user_id, self.event_id, self.package_id, 1, ttl=60, max_holds=2)
+        # Rejected holds give their reservation back
+        self.assertEqual(self._stock(), 4)
+
+
+class TestHoldSweeper(unittest.TestCase):
+    def test_started_by_first_request_only(self):
+        from flask import Flask
+        from helper.ticket_holds import HoldSweeper
+        app = Flask(__name__)
+        sweeper = HoldSweeper(interval=3600)
+        sweeper.init_app(app)
+        self.assertIsNone(sweeper._thread)
+        app.test_client().get("/")
+        self.assertTrue(sweeper._thread.is_alive())
+        sweeper.stop()
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,177 @@
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from test.db_fixture import DB_CONFIGURED, SKIP_REASON, create_event_fixture, drop_event_fixture
+
+STOCK = 1000
+ATTEMPTS = 4000
+
+
+def legacy_purchase(connection, user_id, package_id):
+    """The old read-then-write flow of buy_ticket, kept here as the baseline."""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT total_tickets_available FROM packages WHERE id = %s", (package_id,))
+        if cursor.fetchone()[0] < 1:
+            return False
+        cursor.execute("INSERT INTO tickets (user_id, package_id, purchase_date) VALUES (%s, %s, %s)",
+                       (user_id, package_id, datetime.now()))
+        cursor.execute("UPDATE packages SET total_tickets_available = total_tickets_available - 1 WHERE id = %s",
+                       (package_id,))
+        connection.commit()
+    return True
+
+
+@unittest.skipUnless(DB_CONFIGURED, SKIP_REASON)
+class TestConcurrentPurchase(unittest.TestCase):
+    def setUp(self):
+        from helper.db_helper import get_connection, POOL_SIZE
+        self.get_connection = get_connection
+        self.workers = POOL_SIZE
+        with get_connection() as connection:
+            self.user_id, self.event_id, self.package_id = create_event_fixture(connection, STOCK)
+
+    def tearDown(self):
+        with self.get_connection() as connection:
+            drop_event_fixture(connection, self.user_id, self.event_id, self.package_id)
+
+    def _reset_stock(self):
+        with self.get_connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute("DELETE FROM tickets WHERE package_id = %s", (self.package_id,))
+                cursor.execute("UPDATE packages SET total_tickets_available = %s WHERE id = %s",
+                               (STOCK, self.package_id))
+                connection.commit()
+
+    def _stock_and_sold(self):
+        with self.get_connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT total_tickets_available FROM packages WHERE id = %s", (self.package_id,))
+                stock = cursor.fetchone()[0]
+                cursor.execute("SELECT COUNT(*) FROM tickets WHERE package_id = %s", (self.package_id,))
+                sold = cursor.fetchone()[0]
+        return stock, sold
+
+    def _run(self, attempt):
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            results = list(executor.map(attempt, range(ATTEMPTS)))
+        return results, time.perf_counter() - start
+
+    def test_no_oversell_and_faster_than_legacy(self):
+        from helper.ticket_purchase import purchase_ticket, SoldOut
+
+        def legacy_attempt(_):
+            with self.get_connection() as connection:
+                return legacy_purchase(connection, self.user_id, self.package_id)
+
+        def engine_attempt(_):
+            with self.get_connection() as connection:
+                try:
+                    purchase_ticket(connection, self.user_id, self.event_id, self.package_id)
+                    return True
+                except SoldOut:
+                    return False
+
+        legacy_results, legacy_elapsed = self._run(legacy_attempt)
+        legacy_rate = sum(legacy_results) / legacy_elapsed
+        self._reset_stock()
+
+        results, elapsed = self._run(engine_attempt)
+        rate = sum(results) / elapsed
+        stock, sold = self._stock_and_sold()
+
+        print(f"\nlegacy: {legacy_rate:.0f} purchases/s, engine: {rate:.0f} purchases/s")
+        self.assertEqual(sum(results), STOCK)
+        self.assertEqual(sold, STOCK)
+        self.assertEqual(stock, 0)
+        self.assertGreater(rate, legacy_rate)
+
+
+@unittest.skipUnless(DB_CONFIGURED, SKIP_REASON)
+class TestBulkPurchase(unittest.TestCase):
+    def setUp(self):
+        from helper.db_helper import get_connection
+        self.get_connection = get_connection
+        with get_connection() as connection:
+            self.user_id, self.event_id, self.package_id = create_event_fixture(
+                connection, stock=10, tickets_per_package=4)
+            with connection.cursor() as cursor:
+                cursor.execute("""
+                    INSERT INTO packages (id_acara, name, tickets_per_package, total_tickets_available, price)
+                    VALUES (%s, 'VIP', 2, 2, 150000)
+                """, (self.event_id,))
+                self.vip_id = cursor.lastrowid
+                connection.commit()
+
+    def tearDown(self):
+        with self.get_connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute("DELETE FROM tickets WHERE package_id = %s", (self.vip_id,))
+                cursor.execute("DELETE FROM packages WHERE id = %s", (self.vip_id,))
+                connection.commit()
+            drop_event_fixture(connection, self.user_id, self.event_id, self.package_id)
+
+    def _sold(self):
+        with self.get_connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT COUNT(*) FROM tickets WHERE package_id IN (%s, %s)",
+                               (self.package_id, self.vip_id))
+                return cursor.fetchone()[0]
+
+    def test_buys_every_package_in_one_go(self):
+        from helper.ticket_purchase import purchase_tickets
+        with self.get_connection() as connection:
+            tickets = purchase_tickets(connection, self.user_id, self.event_id,
+                                       [(self.package_id, 3), (self.vip_id, 2)])
+        self.assertEqual(len(tickets[self.package_id]), 3)
+        self.assertEqual(len(tickets[self.vip_id]), 2)
+        self.assertEqual(self._sold(), 5)
+        # The returned IDs are the rows that were inserted, package by package
+        with self.get_connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT id, package_id FROM tickets WHERE package_id IN (%s, %s)",
+                               (self.package_id, self.vip_id))
+                stored = dict(cursor.fetchall())
+        for package_id, ticket_ids in tickets.items():
+            self.assertEqual([stored[ticket_id] for ticket_id in ticket_ids], [package_id] * len(ticket_ids))
+
+    def test_all_or_nothing(self):
+        from helper.ticket_purchase import purchase_tickets, OverLimit, SoldOut
+        with self.get_connection() as connection:
+            with self.assertRaises(OverLimit):
+                purchase_tickets(connection, self.user_id, self.event_id, [(self.package_id, 5)])
+            purchase_tickets(connection, self.user_id, self.event_id, [(self.vip_id, 2)])
+            with self.assertRaises(SoldOut):
+                purchase_tickets(connection, self.user_id, self.event_id,
+                                 [(self.package_id, 1), (self.vip_id, 1)])
+        self.assertEqual(self._sold(), 2)
+
+
+class FakeCursor:
+    """Cursor of a server handing out auto-increment values in steps of two"""
+
+    def __init__(self):
+        self.rows = []
+
+    def executemany(self, query, rows):
+        for row in rows:
+            self.rows.append((101 + 2 * len(self.rows),) + row)
+
+    def execute(self, query, params):
+        self.result = [(row[0],) for row in self.rows if row[-1] == params[0]]
+
+    def fetchall(self):
+        return self.result
+
+
+class TestInsertTicketRows(unittest.TestCase):
+    def test_ids_are_read_back_not_assumed_consecutive(self):
+        from helper.ticket_purchase import insert_ticket_rows
+        cursor = FakeCursor()
+        self.assertEqual(insert_ticket_rows(cursor, 7, [1, 1, 2]), [101, 103, 105])
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
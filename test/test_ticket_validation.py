@@ -0,0 +1,90 @@
+import unittest
+from datetime import datetime
+from helper.ticket_validation import classify_scans, validate_tickets, ALREADY_USED, NOT_FOUND, OK, WRONG_EVENT
+
+
+class FakeTickets:
+    """
+    Tickets table behind a fake connection. `race` holds tickets another gate
+    marks between the batch's first read and its lock.
+    """
+
+    def __init__(self, tickets, race=None):
+        self.tickets = tickets  # ticket_id -> [event_id, deleted_at, user_id, package_id, deleted_by]
+        self.race = race or {}
+        self.updated = []
+        self._result = None
+
+    def cursor(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def start_transaction(self):
+        pass
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def execute(self, query, params=()):
+        if "FOR UPDATE" in query:
+            for ticket_id, (deleted_by, deleted_at) in self.race.items():
+                self.tickets[ticket_id][4], self.tickets[ticket_id][1] = deleted_by, deleted_at
+            self._result = [(ticket_id, self.tickets[ticket_id][1]) for ticket_id in sorted(params)]
+        elif query.strip().startswith("SELECT"):
+            self._result = [(ticket_id, *self.tickets[ticket_id][:4]) for ticket_id in params if ticket_id in self.tickets]
+        elif query.strip().startswith("UPDATE"):
+            # deleted_by, a (ticket_id, deleted_at) pair per ticket, then the IDs
+            ids = params[len(params) - (len(params) - 1) // 3:]
+            self.updated += ids
+            for ticket_id in ids:
+                self.tickets[ticket_id][1] = "marked"
+            self.rowcount = len(ids)
+
+    def executemany(self, query, rows):
+        pass
+
+    def fetchall(self):
+        return self._result
+
+
+class TestValidateTickets(unittest.TestCase):
+    def test_ticket_marked_by_another_gate_in_the_same_second(self):
+        now = datetime(2024, 11, 20, 19, 0)
+        connection = FakeTickets({1: [7, None, 10, 3, None], 4: [7, None, 11, 3, None]},
+                                 race={4: (5, now)})
+        results = validate_tickets(connection, 5, 7, [1, 4], validated_at=now)
+        self.assertEqual([(result["ticket_id"], result["status"]) for result in results], [(1, OK), (4, ALREADY_USED)])
+        self.assertEqual(results[1]["validated_at"], now)
+        self.assertEqual(connection.updated, [1])
+
+
+class TestClassifyScans(unittest.TestCase):
+    def setUp(self):
+        self.rows = [
+            (1, 7, None),
+            (2, 7, datetime(2024, 11, 20, 19, 0)),
+            (3, 8, None),
+            (4, 7, None),
+        ]
+
+    def test_statuses(self):
+        results, candidates = classify_scans([1, 2, 3, 99], self.rows, event_id=7)
+        self.assertEqual(results, [[1, None], [2, ALREADY_USED], [3, WRONG_EVENT], [99, NOT_FOUND]])
+        self.assertEqual(candidates, [1])
+
+    def test_duplicate_scan_in_batch(self):
+        results, candidates = classify_scans([4, 1, 4], self.rows, event_id=7)
+        self.assertEqual(results, [[4, None], [1, None], [4, ALREADY_USED]])
+        self.assertEqual(candidates, [4, 1])
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
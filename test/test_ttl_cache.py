@@ -0,0 +1,52 @@
+import unittest
+from helper.ttl_cache import TTLCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTTLCache(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = TTLCache(maxsize=3, ttl=10, clock=self.clock)
+
+    def test_get_and_expire(self):
+        self.cache.set("a", 1)
+        self.assertEqual(self.cache.get("a"), 1)
+        self.clock.now += 10
+        self.assertIsNone(self.cache.get("a"))
+
+    def test_custom_ttl(self):
+        self.cache.set("a", 1, ttl=100)
+        self.clock.now += 50
+        self.assertIn("a", self.cache)
+
+    def test_evicts_least_recently_used(self):
+        for key in "abc":
+            self.cache.set(key, key)
+        self.cache.get("a")
+        self.cache.set("d", "d")
+        self.assertNotIn("b", self.cache)
+        self.assertIn("a", self.cache)
+        self.assertEqual(len(self.cache), 3)
+
+    def test_add_only_when_absent(self):
+        self.assertTrue(self.cache.add("a", 1))
+        self.assertFalse(self.cache.add("a", 2))
+        self.clock.now += 11
+        self.assertTrue(self.cache.add("a", 3))
+        self.assertEqual(self.cache.get("a"), 3)
+
+    def test_delete(self):
+        self.cache.set("a", 1)
+        self.assertTrue(self.cache.delete("a"))
+        self.assertFalse(self.cache.delete("a"))
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
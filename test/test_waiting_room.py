@@ -0,0 +1,105 @@
+import unittest
+from helper.waiting_room import WaitingRoom, MySQLQueueStore
+from test.db_fixture import DB_CONFIGURED, SKIP_REASON
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestWaitingRoom(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.room = WaitingRoom(admission_ttl=60, clock=self.clock)
+        self.room.open(1, rate=2)
+
+    def test_inactive_room(self):
+        self.assertFalse(self.room.is_active(2))
+        self.assertIsNone(self.room.status(2, "whatever"))
+
+    def test_positions_are_sequential_and_stable(self):
+        first = self.room.join(1, user_id=10)
+        second = self.room.join(1, user_id=11)
+        again = self.room.join(1, user_id=10)
+        self.assertEqual(first["position"], 1)
+        self.assertEqual(second["position"], 2)
+        self.assertEqual(again["token"], first["token"])
+
+    def test_admits_at_configured_rate(self):
+        tokens = [self.room.join(1, user_id=uid)["token"] for uid in range(10)]
+        self.assertFalse(self.room.status(1, tokens[0])["admitted"])
+
+        self.clock.now += 1  # rate 2/s -> two positions admitted
+        self.assertTrue(self.room.is_admitted(1, tokens[1], 1))
+        self.assertFalse(self.room.is_admitted(1, tokens[2], 2))
+        self.assertEqual(self.room.status(1, tokens[9])["ahead"], 7)
+
+    def test_idle_time_does_not_bank_admissions(self):
+        self.clock.now += 100
+        tokens = [self.room.join(1, user_id=uid)["token"] for uid in range(5)]
+        self.assertFalse(self.room.is_admitted(1, tokens[0], 0))
+
+    def test_token_bound_to_user(self):
+        token = self.room.join(1, user_id=10)["token"]
+        self.clock.now += 1
+        self.assertFalse(self.room.is_admitted(1, token, 99))
+        self.assertTrue(self.room.is_admitted(1, token, 10))
+
+    def test_admission_expires(self):
+        token = self.room.join(1, user_id=10)["token"]
+        self.clock.now += 1
+        self.assertTrue(self.room.is_admitted(1, token, 10))
+        self.clock.now += 61
+        self.assertFalse(self.room.is_admitted(1, token, 10))
+        self.assertNotEqual(self.room.join(1, user_id=10)["token"], token)
+
+    def test_close(self):
+        self.assertTrue(self.room.close(1))
+        self.assertFalse(self.room.is_active(1))
+        self.assertFalse(self.room.close(1))
+
+    def test_rejects_non_finite_rate(self):
+        for rate in (0, -1, float("nan"), float("inf")):
+            with self.assertRaises(ValueError):
+                self.room.open(2, rate)
+        self.assertFalse(self.room.is_active(2))
+
+
+@unittest.skipUnless(DB_CONFIGURED, SKIP_REASON)
+class TestSharedWaitingRoom(unittest.TestCase):
+    """Two WaitingRoom instances on the MySQL store behave like two worker processes"""
+
+    EVENT_ID = 2 ** 31 - 7  # no real event needs to exist
+
+    def setUp(self):
+        from helper.db_helper import get_connection
+        self.clock = FakeClock()
+        self.first = WaitingRoom(MySQLQueueStore(get_connection), admission_ttl=60, clock=self.clock)
+        self.second = WaitingRoom(MySQLQueueStore(get_connection), admission_ttl=60, clock=self.clock)
+        self.first.open(self.EVENT_ID, rate=2)
+
+    def tearDown(self):
+        self.first.close(self.EVENT_ID)
+
+    def test_room_is_seen_by_every_worker(self):
+        self.assertTrue(self.second.is_active(self.EVENT_ID))
+        tokens = [room.join(self.EVENT_ID, user_id=uid)["token"]
+                  for uid, room in enumerate([self.first, self.second, self.first])]
+        self.assertEqual(self.second.status(self.EVENT_ID, tokens[2])["position"], 3)
+        self.assertEqual(self.second.join(self.EVENT_ID, user_id=0)["token"], tokens[0])
+
+        self.assertFalse(self.second.is_admitted(self.EVENT_ID, tokens[0], 0))
+        self.clock.now += 1
+        self.assertTrue(self.second.is_admitted(self.EVENT_ID, tokens[1], 1))
+        self.assertFalse(self.first.is_admitted(self.EVENT_ID, tokens[2], 2))
+
+        self.assertTrue(self.second.close(self.EVENT_ID))
+        self.assertFalse(self.first.is_active(self.EVENT_ID))
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)